@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial vs. process-pool page extraction
+"""
+
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from services.pdf_extraction import extract_page, extract_pages_parallel
+
+PAGE_COUNTS = [10, 100, 1000]
+LINES_PER_PAGE = 40
+
+def build_pdf(page_count: int) -> bytes:
+    """Build a text-heavy PDF with the given number of pages"""
+    pdf_doc = fitz.open()
+    for page_num in range(page_count):
+        page = pdf_doc.new_page()
+        for line in range(LINES_PER_PAGE):
+            page.insert_text(
+                (50, 60 + line * 18),
+                f"Page {page_num} line {line}: the quick brown fox jumps over the lazy dog",
+                fontsize=10
+            )
+    data = pdf_doc.tobytes()
+    pdf_doc.close()
+    return data
+
+def bench_serial(pdf_data: bytes, page_count: int) -> float:
+    """Time serial extraction of every page"""
+    start = time.perf_counter()
+    pdf_doc = fitz.open(stream=pdf_data, filetype="pdf")
+    results = [extract_page(pdf_doc, page_num) for page_num in range(page_count)]
+    pdf_doc.close()
+    elapsed = time.perf_counter() - start
+    assert len(results) == page_count
+    return elapsed
+
+def bench_parallel(pdf_data: bytes, page_count: int, workers: int) -> float:
+    """Time process-pool extraction of every page"""
+    start = time.perf_counter()
+    results = extract_pages_parallel(pdf_data, range(page_count), workers)
+    elapsed = time.perf_counter() - start
+    assert [r['page_num'] for r in results] == list(range(page_count))
+    return elapsed
+
+def main():
+    """Run the benchmark for each document size"""
+    workers = Config.PDF_EXTRACT_WORKERS
+    print("PDF Extraction Benchmark")
+    print("=" * 60)
+    print(f"Workers: {workers}, lines per page: {LINES_PER_PAGE}")
+    print(f"Parallel threshold in production: {Config.PDF_PARALLEL_EXTRACT_MIN_PAGES} pages")
+    print("-" * 60)
+    print(f"{'pages':>6} {'serial s':>10} {'parallel s':>11} {'serial p/s':>11} {'parallel p/s':>13} {'speedup':>8}")
+
+    # Warm the process pool so worker start-up is not billed to the first run
+    bench_parallel(build_pdf(workers), workers, workers)
+
+    for page_count in PAGE_COUNTS:
+        pdf_data = build_pdf(page_count)
+        serial = bench_serial(pdf_data, page_count)
+        parallel = bench_parallel(pdf_data, page_count, workers)
+        print(f"{page_count:>6} {serial:>10.3f} {parallel:>11.3f} "
+              f"{page_count / serial:>11.1f} {page_count / parallel:>13.1f} {serial / parallel:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
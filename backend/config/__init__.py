@@ -40,7 +40,44 @@ class Config:
     
     # OCR settings
     TESSERACT_CMD = os.environ.get('TESSERACT_CMD') or '/usr/bin/tesseract'
-    
+    OCR_LANG = os.environ.get('OCR_LANG') or 'eng'
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS') or max(1, (os.cpu_count() or 2) // 2))  # concurrent Tesseract processes
+    OCR_CACHE_ENTRIES = int(os.environ.get('OCR_CACHE_ENTRIES') or 2048)
+    OCR_MAX_DIMENSION = int(os.environ.get('OCR_MAX_DIMENSION') or 2000)  # larger images are downscaled first
+    OCR_PAGE_DPI = int(os.environ.get('OCR_PAGE_DPI') or 300)  # rasterization resolution for full-page OCR
+    OCR_PAGE_BATCH = int(os.environ.get('OCR_PAGE_BATCH') or 8)  # pages rasterized and OCRed per batch
+
+    # PDF caching settings
+    PDF_DOCUMENT_CACHE_BYTES = int(os.environ.get('PDF_DOCUMENT_CACHE_BYTES') or 256 * 1024 * 1024)  # 256MB
+    PDF_DOCUMENT_CACHE_ENTRIES = int(os.environ.get('PDF_DOCUMENT_CACHE_ENTRIES') or 64)
+    PDF_RENDER_CACHE_BYTES = int(os.environ.get('PDF_RENDER_CACHE_BYTES') or 128 * 1024 * 1024)  # 128MB
+    PDF_RENDER_DISK_CACHE = os.environ.get('PDF_RENDER_DISK_CACHE', 'false').lower() == 'true'
+    PDF_RENDER_DISK_CACHE_BYTES = int(os.environ.get('PDF_RENDER_DISK_CACHE_BYTES') or 1024 * 1024 * 1024)  # 1GB
+    PDF_TILE_SIZE = int(os.environ.get('PDF_TILE_SIZE') or 256)  # tile edge in pixels
+    PDF_TILE_MAX_ZOOM = float(os.environ.get('PDF_TILE_MAX_ZOOM') or 16.0)
+    PDF_THUMBNAIL_ZOOM = float(os.environ.get('PDF_THUMBNAIL_ZOOM') or 0.2)
+    PDF_THUMBNAIL_COLUMNS = int(os.environ.get('PDF_THUMBNAIL_COLUMNS') or 10)  # pages per sprite sheet row
+    PDF_POOL_MAX_BYTES = int(os.environ.get('PDF_POOL_MAX_BYTES') or 256 * 1024 * 1024)  # 256MB
+    PDF_POOL_MAX_DOCUMENTS = int(os.environ.get('PDF_POOL_MAX_DOCUMENTS') or 32)
+    PDF_POOL_IDLE_SECONDS = int(os.environ.get('PDF_POOL_IDLE_SECONDS') or 300)
+    PDF_SAVE_COMPACT_EVERY = int(os.environ.get('PDF_SAVE_COMPACT_EVERY') or 20)  # full rewrite every N edit saves
+    PDF_SAVE_MAX_GROWTH = float(os.environ.get('PDF_SAVE_MAX_GROWTH') or 1.5)  # or once the file grew by this factor
+    PDF_JOURNAL_IDLE_SECONDS = float(os.environ.get('PDF_JOURNAL_IDLE_SECONDS') or 30)  # compact after this long without edits
+    PDF_JOURNAL_COMPACT_INTERVAL = float(os.environ.get('PDF_JOURNAL_COMPACT_INTERVAL') or 15)  # seconds between compactions
+    PDF_VERSION_KEEP = int(os.environ.get('PDF_VERSION_KEEP') or 10)  # superseded versions kept per document
+    PDF_VERSION_MAX_AGE = float(os.environ.get('PDF_VERSION_MAX_AGE') or 7 * 24 * 3600)  # 7 days
+    PDF_VERSION_GC_INTERVAL = float(os.environ.get('PDF_VERSION_GC_INTERVAL') or 300)  # seconds between collections
+    PDF_LOCK_TIMEOUT = float(os.environ.get('PDF_LOCK_TIMEOUT') or 30)  # seconds to wait for a document lock
+
+    # PDF extraction settings
+    PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS') or os.cpu_count() or 1)
+    PDF_PARALLEL_EXTRACT_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_EXTRACT_MIN_PAGES') or 50)  # serial below this
+
+    # Background ingestion settings
+    PDF_INGEST_WORKERS = int(os.environ.get('PDF_INGEST_WORKERS') or 2)
+    PDF_INGEST_QUEUE_SIZE = int(os.environ.get('PDF_INGEST_QUEUE_SIZE') or 32)  # uploads are rejected beyond this
+    PDF_INGEST_BATCH_PAGES = int(os.environ.get('PDF_INGEST_BATCH_PAGES') or 50)
+
     # Security settings
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hour
@@ -1,14 +1,16 @@
 """
 Data models for the PDF Editor API
 """
-from .pdf_models import TextElement, ImageElement, PDFDocument
+from .pdf_models import TextElement, TextElementStore, ImageElement, PDFDocument, IngestJob
 from .resume_models import Resume, Experience, Education, Skill
 from .user_models import User
 
 __all__ = [
     'TextElement',
+    'TextElementStore',
     'ImageElement', 
     'PDFDocument',
+    'IngestJob',
     'Resume',
     'Experience',
     'Education',
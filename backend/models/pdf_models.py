@@ -1,11 +1,17 @@
 """
 PDF-related data models
 """
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Tuple, Optional, Any
+from dataclasses import dataclass, asdict, field
+from typing import List, Dict, Tuple, Optional, Any, Iterable, Union
+from array import array
 import json
+import sys
 from datetime import datetime
 
+def _as_datetime(value: Union[str, datetime]) -> datetime:
+    """Timestamps come back from MongoDB as datetimes and from JSON as ISO strings"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
 @dataclass
 class TextElement:
     """Represents a text element with all its formatting properties"""
@@ -47,6 +53,279 @@ class ImageElement:
     def from_dict(cls, data):
         return cls(**data)
 
+class TextElementView:
+    """Lazy, TextElement-compatible view of one row of a TextElementStore"""
+    __slots__ = ('_store', '_row')
+    
+    def __init__(self, store: 'TextElementStore', row: int):
+        self._store = store
+        self._row = row
+    
+    @property
+    def text(self) -> str:
+        return self._store.texts[self._row]
+    
+    @text.setter
+    def text(self, value: str):
+        self._store.texts[self._row] = value
+    
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        i = self._row * 4
+        return tuple(self._store.bboxes[i:i + 4])
+    
+    @property
+    def font_name(self) -> str:
+        return self._store.font_names[self._store.font_ids[self._row]]
+    
+    @property
+    def font_size(self) -> float:
+        return self._store.font_sizes[self._row]
+    
+    @font_size.setter
+    def font_size(self, value: float):
+        self._store.font_sizes[self._row] = value
+    
+    @property
+    def font_flags(self) -> int:
+        return self._store.font_flags[self._row]
+    
+    @property
+    def color(self) -> Tuple[int, int, int]:
+        return unpack_rgb(self._store.colors[self._row])
+    
+    @color.setter
+    def color(self, value):
+        self._store.colors[self._row] = pack_rgb(value)
+    
+    @property
+    def page_num(self) -> int:
+        return self._store.page_nums[self._row]
+    
+    @property
+    def block_num(self) -> int:
+        return self._store.block_nums[self._row]
+    
+    @property
+    def line_num(self) -> int:
+        return self._store.line_nums[self._row]
+    
+    @property
+    def word_num(self) -> int:
+        return self._store.word_nums[self._row]
+    
+    @property
+    def element_id(self) -> str:
+        return f"p{self.page_num}_b{self.block_num}_l{self.line_num}_w{self.word_num}"
+    
+    def to_dict(self):
+        return self._store.to_dicts(self._row, self._row + 1)[0]
+
+def pack_rgb(color) -> int:
+    """Pack an (r, g, b) tuple into one integer"""
+    return (int(color[0]) << 16) | (int(color[1]) << 8) | int(color[2])
+
+def unpack_rgb(value: int) -> Tuple[int, int, int]:
+    """Unpack an integer into an (r, g, b) tuple"""
+    return ((value >> 16) & 255, (value >> 8) & 255, value & 255)
+
+class TextElementStore:
+    """Columnar storage for the text elements of a document.
+    
+    Each span is one row across parallel arrays (bbox, font size, flags,
+    packed RGB color, page/block/line/word indices) plus an interned font
+    name table, instead of one dataclass instance per span. Iterating or
+    indexing yields TextElementView objects, which behave like TextElement.
+    
+    An element_id -> row index and a page -> rows index are maintained on
+    every append, so lookups cost O(1) and page reads are proportional to the
+    page. A page's rows are normally contiguous and kept as a range.
+    """
+    
+    def __init__(self, elements: Iterable[Union[TextElement, Dict[str, Any]]] = ()):
+        self.texts: List[str] = []
+        self.bboxes = array('d')  # x0, y0, x1, y1 per row
+        self.font_sizes = array('d')
+        self.font_flags = array('l')
+        self.colors = array('L')  # packed RGB
+        self.font_ids = array('L')  # index into font_names
+        self.page_nums = array('l')
+        self.block_nums = array('l')
+        self.line_nums = array('l')
+        self.word_nums = array('l')
+        self.font_names: List[str] = []
+        self._font_index: Dict[str, int] = {}
+        self._id_index: Dict[str, int] = {}
+        self._page_rows: Dict[int, Union[range, List[int]]] = {}
+        self.extend(elements)
+    
+    def append_span(self, text: str, bbox, font_name: str, font_size: float, font_flags: int,
+                    color: int, page_num: int, block_num: int, line_num: int, word_num: int) -> None:
+        """Append one span; color is a packed RGB integer"""
+        font_id = self._font_index.get(font_name)
+        if font_id is None:
+            font_id = len(self.font_names)
+            self.font_names.append(sys.intern(font_name))
+            self._font_index[font_name] = font_id
+        
+        row = len(self.texts)
+        self._index_row(row, page_num, block_num, line_num, word_num)
+        
+        self.texts.append(text)
+        self.bboxes.extend(bbox)
+        self.font_sizes.append(font_size)
+        self.font_flags.append(font_flags)
+        self.colors.append(color)
+        self.font_ids.append(font_id)
+        self.page_nums.append(page_num)
+        self.block_nums.append(block_num)
+        self.line_nums.append(line_num)
+        self.word_nums.append(word_num)
+    
+    def append(self, element: Union[TextElement, TextElementView, Dict[str, Any]]) -> None:
+        """Append a TextElement, a view or a TextElement-shaped dict"""
+        if isinstance(element, dict):
+            element = TextElement.from_dict(element)
+        self.append_span(element.text, element.bbox, element.font_name, element.font_size,
+                         element.font_flags, pack_rgb(element.color), element.page_num,
+                         element.block_num, element.line_num, element.word_num)
+    
+    def extend(self, elements: Iterable[Union[TextElement, TextElementView, Dict[str, Any]]]) -> None:
+        if isinstance(elements, TextElementStore):
+            self._extend_store(elements)
+            return
+        for element in elements:
+            self.append(element)
+    
+    def replace_page(self, page_num: int, page_store: 'TextElementStore') -> None:
+        """Replace the elements of one page with those of page_store.
+        
+        The new rows take the place of the old ones and the other rows are
+        copied over as column slices, so the cost is one pass over the
+        columns. Row numbers change, so views taken before are invalid.
+        """
+        page_rows = list(self.page_rows(page_num))
+        insert_at = page_rows[0] if page_rows else len(self.texts)
+        
+        rebuilt = TextElementStore()
+        rebuilt._extend_rows(self, 0, insert_at)
+        rebuilt._extend_rows(page_store, 0, len(page_store))
+        start = insert_at
+        for stop in page_rows + [len(self.texts)]:
+            rebuilt._extend_rows(self, start, stop)
+            start = stop + 1
+        vars(self).update(vars(rebuilt))
+    
+    def _extend_store(self, other: 'TextElementStore') -> None:
+        self._extend_rows(other, 0, len(other))
+    
+    def _extend_rows(self, other: 'TextElementStore', start: int, stop: int) -> None:
+        # Append rows [start, stop) column by column, remapping the other store's font ids onto ours
+        if start >= stop:
+            return
+        offset = len(self.texts) - start
+        for row in range(start, stop):
+            self._index_row(offset + row, other.page_nums[row], other.block_nums[row],
+                            other.line_nums[row], other.word_nums[row])
+        
+        font_map = []
+        for font_name in other.font_names:
+            font_id = self._font_index.get(font_name)
+            if font_id is None:
+                font_id = len(self.font_names)
+                self.font_names.append(font_name)
+                self._font_index[font_name] = font_id
+            font_map.append(font_id)
+        
+        self.texts.extend(other.texts[start:stop])
+        self.bboxes.extend(other.bboxes[start * 4:stop * 4])
+        self.font_sizes.extend(other.font_sizes[start:stop])
+        self.font_flags.extend(other.font_flags[start:stop])
+        self.colors.extend(other.colors[start:stop])
+        self.font_ids.extend(font_map[font_id] for font_id in other.font_ids[start:stop])
+        self.page_nums.extend(other.page_nums[start:stop])
+        self.block_nums.extend(other.block_nums[start:stop])
+        self.line_nums.extend(other.line_nums[start:stop])
+        self.word_nums.extend(other.word_nums[start:stop])
+    
+    def _index_row(self, row: int, page_num: int, block_num: int, line_num: int, word_num: int) -> None:
+        self._id_index[f"p{page_num}_b{block_num}_l{line_num}_w{word_num}"] = row
+        rows = self._page_rows.get(page_num)
+        if rows is None:
+            self._page_rows[page_num] = range(row, row + 1)
+        elif isinstance(rows, range) and rows.stop == row:
+            self._page_rows[page_num] = range(rows.start, row + 1)
+        else:
+            # The page is no longer contiguous; fall back to an explicit row list
+            rows = list(rows)
+            rows.append(row)
+            self._page_rows[page_num] = rows
+    
+    def find(self, element_id: str) -> Optional[TextElementView]:
+        """Look up an element by id"""
+        row = self._id_index.get(element_id)
+        return TextElementView(self, row) if row is not None else None
+    
+    def page_rows(self, page_num: int) -> Union[range, List[int]]:
+        """Rows holding the elements of one page"""
+        return self._page_rows.get(page_num, range(0))
+    
+    def page_to_dicts(self, page_num: int) -> List[Dict[str, Any]]:
+        """Serialize the elements of one page"""
+        rows = self.page_rows(page_num)
+        if isinstance(rows, range):
+            return self.to_dicts(rows.start, rows.stop) if rows else []
+        return [self.to_dicts(row, row + 1)[0] for row in rows]
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+    
+    def __iter__(self):
+        for row in range(len(self.texts)):
+            yield TextElementView(self, row)
+    
+    def __getitem__(self, row: int) -> TextElementView:
+        if row < 0:
+            row += len(self.texts)
+        if not 0 <= row < len(self.texts):
+            raise IndexError(row)
+        return TextElementView(self, row)
+    
+    def to_dicts(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Serialize rows [start, stop) in one pass over the column slices"""
+        stop = len(self.texts) if stop is None else stop
+        b = self.bboxes[start * 4:stop * 4]
+        bboxes = zip(b[0::4], b[1::4], b[2::4], b[3::4])
+        font_names = self.font_names
+        return [
+            {
+                'text': text,
+                'bbox': bbox,
+                'font_name': font_names[font_id],
+                'font_size': font_size,
+                'font_flags': flags,
+                'color': ((color >> 16) & 255, (color >> 8) & 255, color & 255),
+                'page_num': page_num,
+                'block_num': block_num,
+                'line_num': line_num,
+                'word_num': word_num,
+                'element_id': f"p{page_num}_b{block_num}_l{line_num}_w{word_num}"
+            }
+            for text, bbox, font_id, font_size, flags, color, page_num, block_num, line_num, word_num
+            in zip(self.texts[start:stop], bboxes, self.font_ids[start:stop],
+                   self.font_sizes[start:stop], self.font_flags[start:stop], self.colors[start:stop],
+                   self.page_nums[start:stop], self.block_nums[start:stop],
+                   self.line_nums[start:stop], self.word_nums[start:stop])
+        ]
+    
+    def estimate_size(self) -> int:
+        """Approximate memory held by the store in bytes"""
+        arrays = (self.bboxes, self.font_sizes, self.font_flags, self.colors, self.font_ids,
+                  self.page_nums, self.block_nums, self.line_nums, self.word_nums)
+        size = sum(a.buffer_info()[1] * a.itemsize for a in arrays)
+        size += sys.getsizeof(self.texts) + sum(sys.getsizeof(t) for t in self.texts)
+        return size
+
 @dataclass
 class PDFDocument:
     """Represents a complete PDF document with all its elements"""
@@ -55,23 +334,41 @@ class PDFDocument:
     file_path: str
     file_size: int
     page_count: int
-    text_elements: List[TextElement]
+    text_elements: TextElementStore
     images: List[ImageElement]
     fonts: List[str]
     colors: List[Dict[str, Any]]
     metadata: Dict[str, Any]
     created_at: datetime
     updated_at: datetime
+    extracted_pages: List[int] = field(default_factory=list)  # pages whose elements are loaded
     
-    def to_dict(self):
+    def __post_init__(self):
+        if not isinstance(self.text_elements, TextElementStore):
+            self.text_elements = TextElementStore(self.text_elements)
+        self._images_by_page: Dict[int, List[ImageElement]] = {}
+        self._indexed_images = 0
+    
+    def page_images(self, page_num: int) -> List[ImageElement]:
+        """Images on one page, indexed incrementally as images are added"""
+        if self._indexed_images != len(self.images):
+            if self._indexed_images > len(self.images):
+                # The list was replaced or shrunk; rebuild from scratch
+                self._images_by_page = {}
+                self._indexed_images = 0
+            for img in self.images[self._indexed_images:]:
+                self._images_by_page.setdefault(img.page, []).append(img)
+            self._indexed_images = len(self.images)
+        return self._images_by_page.get(page_num, [])
+    
+    def to_summary_dict(self):
+        """Document-level fields only, without elements or per-page state"""
         return {
             'document_id': self.document_id,
             'filename': self.filename,
             'file_path': self.file_path,
             'file_size': self.file_size,
             'page_count': self.page_count,
-            'text_elements': [elem.to_dict() for elem in self.text_elements],
-            'images': [img.to_dict() for img in self.images],
             'fonts': self.fonts,
             'colors': self.colors,
             'metadata': self.metadata,
@@ -79,6 +376,14 @@ class PDFDocument:
             'updated_at': self.updated_at.isoformat()
         }
     
+    def to_dict(self):
+        return dict(
+            self.to_summary_dict(),
+            text_elements=self.text_elements.to_dicts(),
+            images=[img.to_dict() for img in self.images],
+            extracted_pages=self.extracted_pages
+        )
+    
     @classmethod
     def from_dict(cls, data):
         return cls(
@@ -87,13 +392,56 @@ class PDFDocument:
             file_path=data['file_path'],
             file_size=data['file_size'],
             page_count=data['page_count'],
-            text_elements=[TextElement.from_dict(elem) for elem in data['text_elements']],
-            images=[ImageElement.from_dict(img) for img in data['images']],
+            text_elements=TextElementStore(data.get('text_elements', [])),
+            images=[ImageElement.from_dict(img) for img in data.get('images', [])],
             fonts=data['fonts'],
             colors=data['colors'],
             metadata=data['metadata'],
+            created_at=_as_datetime(data['created_at']),
+            updated_at=_as_datetime(data['updated_at']),
+            # Records stored before lazy extraction hold every page
+            extracted_pages=data.get('extracted_pages', list(range(data['page_count'])))
+        )
+
+@dataclass
+class IngestJob:
+    """Tracks the background processing of an uploaded PDF"""
+    job_id: str
+    document_id: str
+    status: str  # 'queued', 'running', 'completed', 'failed'
+    pages_total: int
+    pages_done: int
+    stages: Dict[str, Dict[str, Any]]  # stage name -> {'status', 'started_at', 'finished_at'}
+    created_at: datetime
+    updated_at: datetime
+    error: Optional[str] = None
+    
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'document_id': self.document_id,
+            'status': self.status,
+            'pages_total': self.pages_total,
+            'pages_done': self.pages_done,
+            'progress': (self.pages_done / self.pages_total) if self.pages_total else 1.0,
+            'stages': self.stages,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            job_id=data['job_id'],
+            document_id=data['document_id'],
+            status=data['status'],
+            pages_total=data['pages_total'],
+            pages_done=data['pages_done'],
+            stages=data['stages'],
             created_at=datetime.fromisoformat(data['created_at']),
-            updated_at=datetime.fromisoformat(data['updated_at'])
+            updated_at=datetime.fromisoformat(data['updated_at']),
+            error=data.get('error')
         )
 
 @dataclass
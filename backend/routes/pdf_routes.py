@@ -1,26 +1,36 @@
 """
 PDF processing API routes
 """
-from flask import Blueprint, request, jsonify, send_file
-import os
+from flask import Blueprint, request, jsonify, send_file, make_response, url_for, Response
 from datetime import datetime
 
-from services.pdf_service import PDFService
 from services.file_service import FileService
-from services.pdf_storage_service import PDFStorageService
+from services.pdf_storage_service import PDFStorageService, UPLOAD_CHUNK_SIZE
+from services.document_cache import get_document_cache
+from services.render_cache import get_render_cache, page_zoom, tile_zoom, IMAGE_MIMETYPES
+from services.document_pool import get_document_pool
+from services.pdf_writer import get_pdf_writer
+from services.ingest_service import get_ingestion_pipeline, IngestQueueFullError
+from services.ocr_service import get_ocr_engine
+from services.document_session import get_document_sessions
+from services.document_locks import get_document_locks, DocumentLockTimeout
+from services.version_collector import get_version_collector
+from services.journal_compactor import get_journal_compactor
 from utils.file_utils import FileHandler, FileValidator
 from utils.database import get_database
 
 pdf_bp = Blueprint('pdf', __name__, url_prefix='/api/pdf')
 
-# Initialize services
+# Initialize services; documents are opened per request through get_document_sessions()
 file_handler = FileHandler('uploads', 'temp')
-pdf_service = PDFService(file_handler)
 file_service = FileService(file_handler)
 storage_service = None  # Initialize lazily
 
-# Global variable to store current PDF document ID
-current_pdf_document_id = None
+@pdf_bp.record_once
+def start_background_workers(state):
+    """Compact edit journals and reclaim superseded PDF versions once the app is set up"""
+    get_journal_compactor().start()
+    get_version_collector().start()
 
 def get_storage_service():
     """Get storage service instance (lazy initialization)"""
@@ -33,6 +43,118 @@ def get_storage_service():
         storage_service = PDFStorageService()
     return storage_service
 
+def _zoom_arg() -> float:
+    """Parse the zoom query parameter, defaulting to 1.0"""
+    try:
+        return float(request.args.get('zoom', 1))
+    except ValueError:
+        return 1.0
+
+def _image_format_arg():
+    """Parse the format query parameter; None if unsupported"""
+    image_format = request.args.get('format', 'png').lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    return image_format if image_format in IMAGE_MIMETYPES else None
+
+def _busy_response(error: Exception):
+    """503 for a request that timed out waiting on a document lock"""
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def _image_response(pdf_service, render_key: str, image_format: str, render):
+    """Build a cacheable image response for the session's document version.
+    
+    A render is fully determined by the document version and render_key,
+    which makes that pair the ETag; If-None-Match hits skip rendering, and
+    folding journaled edits into the file, entirely.
+    """
+    version = pdf_service.get_document_version()
+    if not version:
+        return jsonify({'error': 'Failed to resolve PDF version'}), 500
+    
+    etag = f"{version}-{render_key}"
+    if request.args.get('v') == version:
+        cache_control = 'private, max-age=31536000, immutable'
+    else:
+        cache_control = 'private, no-cache'
+    
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        img_data = render(pdf_service.materialize())
+        if not img_data:
+            return jsonify({'error': 'Failed to render image'}), 404
+        response = make_response(img_data)
+        response.mimetype = IMAGE_MIMETYPES[image_format]
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def _stream_pdf(document_id: str, as_attachment: bool = False, download_name: str = None):
+    """Stream a document's current GridFS file chunk by chunk.
+    
+    The GridFS file_id is the ETag; a single byte range is answered with 206
+    so viewers such as PDF.js can fetch only what they display. Memory use
+    is one chunk regardless of the file size.
+    """
+    # Journaled edits are written into the file before it is served
+    journal_state = get_storage_service().get_journal_state(document_id)
+    if journal_state and journal_state['pending_edits']:
+        get_document_sessions().open(document_id).materialize()
+    
+    grid_out = get_storage_service().open_pdf_file(document_id)
+    if grid_out is None:
+        return jsonify({'error': 'PDF not found'}), 404
+    
+    etag = str(grid_out._id)
+    length = grid_out.length
+    headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'private, no-cache'}
+    
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers.update(headers)
+        return response
+    
+    start, stop, status = 0, length, 200
+    byte_range = request.range
+    # Werkzeug always supplies an IfRange; it only holds a validator when the
+    # header was sent. Files carry no Last-Modified, so a date never matches.
+    if_range = request.if_range
+    range_fresh = not (if_range.etag or if_range.date) or if_range.etag == etag
+    # Multi-range requests and stale If-Range validators get the whole file
+    if byte_range is not None and len(byte_range.ranges) == 1 and range_fresh:
+        bounds = byte_range.range_for_length(length)
+        if bounds is None:
+            headers['Content-Range'] = f'bytes */{length}'
+            return Response(status=416, headers=headers)
+        start, stop = bounds
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+    
+    def generate():
+        grid_out.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = grid_out.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    
+    download_name = download_name or grid_out.filename or f'{document_id}.pdf'
+    disposition = 'attachment' if as_attachment else 'inline'
+    headers['Content-Disposition'] = f'{disposition}; filename="{download_name}"'
+    headers['Content-Length'] = str(stop - start)
+    
+    response = Response(generate(), status=status, mimetype='application/pdf',
+                        headers=headers, direct_passthrough=True)
+    response.set_etag(etag)
+    return response
+
 @pdf_bp.route('/upload', methods=['POST'])
 def upload_pdf():
     """Upload and process PDF file"""
@@ -56,34 +178,78 @@ def upload_pdf():
         if not FileValidator.validate_file_size(file_size, 'pdf'):
             return jsonify({'error': 'File too large. Maximum size is 16MB.'}), 400
         
-        # Read file data
-        file_data = file.read()
-        file.seek(0)  # Reset file pointer
+        # Refuse early rather than store a file nobody will process soon
+        ingestion_pipeline = get_ingestion_pipeline()
+        if not ingestion_pipeline.has_capacity():
+            response = jsonify({'error': 'Server is busy processing uploads, please retry shortly'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
         
-        # Store PDF in MongoDB
+        # Stream the upload into MongoDB, keeping the single in-memory copy
+        # the document is opened from
         storage_service = get_storage_service()
-        storage_result = storage_service.store_pdf(file_data, file.filename)
+        user_id = request.headers.get('X-User-ID')
+        storage_result = storage_service.store_pdf_stream(file.stream, file.filename, user_id, keep_data=True)
         if not storage_result['success']:
             return jsonify({'error': f"Failed to store PDF: {storage_result['error']}"}), 500
         
         document_id = storage_result['document_id']
-        
-        # Process PDF from file data
-        if pdf_service.load_pdf_from_bytes(file_data, file.filename):
-            global current_pdf_document_id
-            current_pdf_document_id = document_id  # Store the current PDF document ID
+        file_id = storage_result['file_id']
+        pdf_service = get_document_sessions().create()
+        try:
+            pdf_service.document_pool.adopt(file_id, storage_result.pop('file_data'))
+        except Exception as open_err:
+            print(f"⚠️ Could not open uploaded PDF: {open_err}")
+        
+        # Identical bytes were uploaded before: reuse that document's elements
+        source_document_id = storage_result.get('source_document_id')
+        if (source_document_id
+                and storage_service.clone_document(source_document_id, document_id, file.filename)
+                and pdf_service.load_pdf_from_mongodb(document_id)):
+            pdf_document = pdf_service.current_document
             
+            job_id = None
+            summary = storage_service.get_document_summary(document_id) or {}
+            if summary.get('extracted_pages', 0) < pdf_document.page_count:
+                try:
+                    job_id = ingestion_pipeline.submit(document_id, pdf_document.page_count).job_id
+                except IngestQueueFullError as queue_err:
+                    print(f"⚠️ {queue_err}; document {document_id} will be extracted on demand")
+            
+            document_info = pdf_service.get_document_info()
+            return jsonify({
+                'success': True,
+                'message': 'PDF uploaded successfully, reused previously processed content',
+                'document_info': document_info,
+                'document_id': document_id,
+                'job_id': job_id,
+                'deduplicated': True,
+                'page_count': document_info.get('page_count', 1),
+                'pages': document_info.get('page_count', 1)
+            })
+        
+        # Process PDF from the pooled upload
+        if pdf_service.load_stored_pdf(document_id, file.filename, storage_result['file_size'], file_id):
             # Store processed document in MongoDB
             pdf_document = pdf_service.current_document
-            pdf_document.document_id = document_id  # Use the same document ID
-            storage_service.store_pdf_document(pdf_document)
+            storage_service.store_pdf_document(pdf_document, user_id)
+            pdf_service.cache_current_document()
+            
+            # Extract elements in the background; pages requested meanwhile are extracted on demand
+            job_id = None
+            try:
+                job_id = ingestion_pipeline.submit(document_id, pdf_document.page_count).job_id
+            except IngestQueueFullError as queue_err:
+                print(f"⚠️ {queue_err}; document {document_id} will be extracted on demand")
             
             document_info = pdf_service.get_document_info()
             return jsonify({
                 'success': True,
-                'message': 'PDF uploaded and processed successfully',
+                'message': 'PDF uploaded successfully, processing in background',
                 'document_info': document_info,
                 'document_id': document_id,
+                'job_id': job_id,
+                'deduplicated': False,
                 'page_count': document_info.get('page_count', 1),
                 'pages': document_info.get('page_count', 1)
             })
@@ -95,29 +261,45 @@ def upload_pdf():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@pdf_bp.route('/list', methods=['GET'])
+def list_pdfs():
+    """List the PDFs of a user with their summaries"""
+    try:
+        # Get user ID (in a real app, this would come from authentication)
+        user_id = request.headers.get('X-User-ID')
+        
+        return jsonify({
+            'success': True,
+            'documents': get_storage_service().list_user_pdfs(user_id)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Get the processing status of an uploaded PDF"""
+    try:
+        job = get_ingestion_pipeline().get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @pdf_bp.route('/info', methods=['GET'])
 def get_pdf_info():
     """Get PDF information"""
     try:
-        # Get document_id from query parameter or use global
         document_id = request.args.get('document_id')
-        if not document_id:
-            global current_pdf_document_id
-            document_id = current_pdf_document_id
-        
         if not document_id:
             return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
         
-        # Reload PDF from MongoDB if needed
-        if not pdf_service.current_document or pdf_service.current_document.document_id != document_id:
-            if not pdf_service.load_pdf_from_mongodb(document_id):
-                return jsonify({'error': 'Failed to reload PDF from MongoDB'}), 500
-        
-        document_info = pdf_service.get_document_info()
+        # Summary fields and counts come from one projected query; no elements are loaded
+        document_info = get_storage_service().get_document_summary(document_id)
         if document_info:
             return jsonify(document_info)
         else:
-            return jsonify({'error': 'Failed to get document info'}), 500
+            return jsonify({'error': 'Failed to get document info'}), 404
     except Exception as e:
         print(f"Error in get_pdf_info: {e}")
         import traceback
@@ -128,19 +310,11 @@ def get_pdf_info():
 def get_page(page_num):
     """Get specific page with all elements"""
     try:
-        # Get document_id from query parameter or use global
         document_id = request.args.get('document_id')
-        if not document_id:
-            global current_pdf_document_id
-            document_id = current_pdf_document_id
-        
         if not document_id:
             return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
         
-        # Reload PDF from MongoDB if needed
-        if not pdf_service.current_document or pdf_service.current_document.document_id != document_id:
-            if not pdf_service.load_pdf_from_mongodb(document_id):
-                return jsonify({'error': 'Failed to reload PDF from MongoDB'}), 500
+        pdf_service = get_document_sessions().open(document_id)
         
         # Parse zoom from query param; default 1.0
         try:
@@ -159,29 +333,17 @@ def get_page(page_num):
         if page_num < 0 or page_num >= total_pages:
             return jsonify({'error': f'Invalid page index. Must be 0 to {max(total_pages-1, 0)}'}), 400
 
-        # Get page image with zoom
-        page_image = pdf_service.get_page_image(page_num, zoom=zoom)
-        if not page_image:
-            # Extra diagnostics to help identify root cause
-            try:
-                raw_len = 0
-                try:
-                    raw = pdf_service._get_storage_service().retrieve_pdf(current_pdf_document_id)
-                    raw_len = len(raw) if raw else 0
-                except Exception:
-                    raw_len = -1
-                return jsonify({
-                    'error': f'Failed to get page image for page {page_num}',
-                    'page_num': page_num,
-                    'page_count': total_pages,
-                    'zoom': zoom,
-                    'pdf_bytes': raw_len
-                }), 500
-            except Exception:
-                return jsonify({'error': f'Failed to get page image for page {page_num}'}), 500
-        
-        # Get page elements
-        page_elements = pdf_service.get_page_elements(page_num)
+        # The image itself is served by get_page_image_file so browsers can cache it
+        page_image = url_for('pdf.get_page_image_file', page_num=page_num, zoom=page_zoom(zoom),
+                             document_id=document_id, v=pdf_service.get_document_version(),
+                             _external=True)
+        
+        # Get page elements, optionally warming neighbouring pages
+        try:
+            prefetch = max(0, min(int(request.args.get('prefetch', 0)), 5))
+        except ValueError:
+            prefetch = 0
+        page_elements = pdf_service.get_page_elements(page_num, prefetch=prefetch)
         
         return jsonify({
             'page_image': page_image,
@@ -191,12 +353,131 @@ def get_page(page_num):
             'page_count': total_pages,
             'zoom': zoom
         })
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
     except Exception as e:
         print(f"Error in get_page: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@pdf_bp.route('/page/<int:page_num>/image', methods=['GET'])
+def get_page_image_file(page_num):
+    """Get a rendered page as raw PNG, JPEG or WebP bytes"""
+    try:
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        
+        image_format = _image_format_arg()
+        if not image_format:
+            return jsonify({'error': f'Unsupported format. Use one of {sorted(IMAGE_MIMETYPES)}'}), 400
+        
+        zoom = page_zoom(_zoom_arg())
+        return _image_response(
+            pdf_service, f"{page_num}-{zoom:g}-{image_format}", image_format,
+            lambda file_id: pdf_service.render_page(page_num, zoom, image_format, file_id)
+        )
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/page/<int:page_num>/tiles', methods=['GET'])
+def get_page_tiles(page_num):
+    """Get the tile grid of a page at a zoom level"""
+    try:
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        
+        grid = pdf_service.get_tile_grid(page_num, _zoom_arg())
+        if not grid:
+            return jsonify({'error': f'Invalid page index: {page_num}'}), 400
+        
+        # Placeholders are filled in by the client for each visible tile
+        grid['tile_url'] = url_for('pdf.get_page_tile', page_num=page_num, x=0, y=0, zoom=grid['zoom'],
+                                   document_id=document_id, v=pdf_service.get_document_version(),
+                                   _external=True).replace('/tile/0/0', '/tile/{x}/{y}')
+        return jsonify(grid)
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/page/<int:page_num>/tile/<int:x>/<int:y>', methods=['GET'])
+def get_page_tile(page_num, x, y):
+    """Get one deep-zoom tile of a page as raw image bytes"""
+    try:
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        
+        image_format = _image_format_arg()
+        if not image_format:
+            return jsonify({'error': f'Unsupported format. Use one of {sorted(IMAGE_MIMETYPES)}'}), 400
+        
+        zoom = tile_zoom(_zoom_arg())
+        return _image_response(
+            pdf_service, f"{page_num}-{zoom:g}-{x}-{y}-{image_format}", image_format,
+            lambda file_id: pdf_service.render_tile(page_num, zoom, x, y, image_format, file_id)
+        )
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/thumbnails', methods=['GET'])
+def get_thumbnails():
+    """Get the layout of the page thumbnail sprite sheet"""
+    try:
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        
+        # The layout is read from the sprite, so journaled edits are written in first
+        file_id = pdf_service.materialize()
+        thumbnails = pdf_service.get_thumbnail_sprite(file_id)
+        if not thumbnails:
+            return jsonify({'error': 'Failed to render thumbnails'}), 500
+        
+        _, layout = thumbnails
+        return jsonify(dict(layout, sprite_url=url_for(
+            'pdf.get_thumbnail_sprite', document_id=document_id, v=file_id, _external=True
+        )))
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/thumbnails/sprite', methods=['GET'])
+def get_thumbnail_sprite():
+    """Get the page thumbnail sprite sheet as a JPEG"""
+    try:
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        
+        def render(file_id):
+            thumbnails = pdf_service.get_thumbnail_sprite(file_id)
+            return thumbnails[0] if thumbnails else None
+        
+        return _image_response(pdf_service, 'thumbnails', 'jpeg', render)
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @pdf_bp.route('/update-text', methods=['POST'])
 def update_text():
     """Update text element"""
@@ -212,18 +493,10 @@ def update_text():
         if not element_id or new_text is None:
             return jsonify({'error': 'Missing required parameters'}), 400
         
-        # Get document_id from request or use global
-        if not document_id:
-            global current_pdf_document_id
-            document_id = current_pdf_document_id
-        
         if not document_id:
             return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
         
-        # Reload PDF from MongoDB if needed
-        if not pdf_service.current_document or pdf_service.current_document.document_id != document_id:
-            if not pdf_service.load_pdf_from_mongodb(document_id):
-                return jsonify({'error': 'Failed to reload PDF from MongoDB'}), 500
+        pdf_service = get_document_sessions().open(document_id)
         
         print(f"🔧 update-text apply: id={element_id} size={new_font_size} color={new_color}")
 
@@ -236,6 +509,96 @@ def update_text():
             print("❌ update-text failed in service")
             return jsonify({'error': 'Failed to update text'}), 500
         
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/edits', methods=['POST'])
+def apply_edits():
+    """Apply a batch of text edits with a single save"""
+    try:
+        data = request.json or {}
+        edits = data.get('edits')
+        document_id = data.get('document_id')
+        
+        if not isinstance(edits, list) or not edits:
+            return jsonify({'error': 'A non-empty list of edits is required'}), 400
+        
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        
+        print(f"🔧 edits apply: {len(edits)} edits on {document_id}")
+        results = pdf_service.apply_text_edits(edits)
+        applied = sum(1 for result in results if result['success'])
+        
+        return jsonify({
+            'success': applied > 0,
+            'applied': applied,
+            'failed': len(results) - applied,
+            'results': results
+        })
+        
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/edits/undo', methods=['POST'])
+def undo_edit():
+    """Undo the newest text edit that has not been written into the PDF yet"""
+    try:
+        data = request.json or {}
+        document_id = data.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        element_id = pdf_service.undo_last_edit()
+        if not element_id:
+            return jsonify({'error': 'No pending edits to undo; restore an earlier version instead'}), 404
+        
+        return jsonify({'success': True, 'element_id': element_id})
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/versions', methods=['GET'])
+def list_versions():
+    """List the current and retained earlier versions of a PDF"""
+    try:
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        return jsonify({'versions': get_storage_service().list_versions(document_id)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/versions/restore', methods=['POST'])
+def restore_version():
+    """Undo edits by making an earlier version current again"""
+    try:
+        data = request.json or {}
+        document_id = data.get('document_id')
+        version = data.get('version')
+        
+        if not isinstance(version, int):
+            return jsonify({'error': 'version must be an integer'}), 400
+        
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        if not pdf_service.restore_version(version):
+            return jsonify({'error': f'Version {version} is not available'}), 404
+        
+        return jsonify({'success': True, 'version': pdf_service.get_document_version()})
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -247,10 +610,15 @@ def search_replace():
         print(f"📝 search-replace payload: {data}")
         search_term = data.get('search_term', '')
         replace_with = data.get('replace_with', '')
+        document_id = data.get('document_id')
         
         if not search_term:
             return jsonify({'error': 'Search term required'}), 400
         
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
         replacements = pdf_service.search_and_replace(search_term, replace_with)
         print(f"🔁 search-replace result: {replacements} replacements")
 
@@ -260,6 +628,8 @@ def search_replace():
             'message': f'Replaced {replacements} occurrences'
         })
         
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -267,8 +637,59 @@ def search_replace():
 def extract_image_text():
     """Extract text from images using OCR"""
     try:
-        ocr_results = pdf_service.extract_text_from_images()
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        ocr_results = pdf_service.extract_text_from_images(request.args.get('lang'))
         return jsonify({'ocr_results': ocr_results})
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/ocr/pages', methods=['POST'])
+def ocr_pages():
+    """OCR whole pages of a scanned PDF"""
+    try:
+        data = request.json or {}
+        pages = data.get('pages')
+        if pages is not None and not (isinstance(pages, list) and all(
+                isinstance(p, int) and not isinstance(p, bool) for p in pages)):
+            return jsonify({'error': 'pages must be a list of page numbers'}), 400
+        
+        dpi = data.get('dpi')
+        if dpi is not None:
+            try:
+                dpi = max(72, min(int(dpi), 600))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'dpi must be a number'}), 400
+        
+        document_id = data.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        results = pdf_service.ocr_pages(pages, dpi, data.get('lang'))
+        return jsonify({'pages': results})
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/download', methods=['GET'])
+def download_pdf():
+    """Stream the current version of a PDF, with Range and ETag support"""
+    try:
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
+        
+        as_attachment = request.args.get('download', 'false').lower() == 'true'
+        return _stream_pdf(document_id, as_attachment=as_attachment)
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -276,14 +697,15 @@ def extract_image_text():
 def save_pdf():
     """Save modified PDF"""
     try:
-        output_filename = f'edited_document_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        output_path = os.path.join(file_handler.temp_folder, output_filename)
+        document_id = request.args.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded. Please upload a PDF first.'}), 400
         
-        if pdf_service.save_pdf(output_path):
-            return send_file(output_path, as_attachment=True, download_name=output_filename)
-        else:
-            return jsonify({'error': 'Failed to save PDF'}), 500
+        output_filename = f'edited_document_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+        return _stream_pdf(document_id, as_attachment=True, download_name=output_filename)
         
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -331,13 +753,21 @@ def add_image():
 def convert_to_word():
     """Convert PDF to Word document"""
     try:
-        output_path = file_service.convert_pdf_to_word(pdf_service.current_document.file_path)
+        document_id = request.args.get('document_id') or request.form.get('document_id')
+        if not document_id:
+            return jsonify({'error': 'No PDF loaded'}), 400
+        
+        pdf_service = get_document_sessions().open(document_id)
+        with pdf_service.open_document() as pdf_doc:
+            output_path = file_service.convert_document_to_word(pdf_doc)
         
         if output_path:
             return send_file(output_path, as_attachment=True, download_name='converted_document.docx')
         else:
             return jsonify({'error': 'Failed to convert PDF to Word'}), 500
         
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -370,11 +800,35 @@ def convert_from_word():
 def extract_text():
     """Extract all text from PDF"""
     try:
-        if not pdf_service.current_document:
+        document_id = request.args.get('document_id') or request.form.get('document_id')
+        if not document_id:
             return jsonify({'error': 'No PDF loaded'}), 400
         
-        text = file_service.extract_text_from_pdf(pdf_service.current_document.file_path)
+        pdf_service = get_document_sessions().open(document_id)
+        with pdf_service.open_document() as pdf_doc:
+            text = file_service.extract_text_from_document(pdf_doc)
         return jsonify({'text': text})
         
+    except DocumentLockTimeout as e:
+        return _busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pdf_bp.route('/stats', methods=['GET'])
+def get_pdf_stats():
+    """Get PDF cache statistics"""
+    try:
+        return jsonify({
+            'document_cache': get_document_cache().stats(),
+            'render_cache': get_render_cache().stats(),
+            'document_pool': get_document_pool().stats(),
+            'pdf_writer': get_pdf_writer().stats(),
+            'ingestion': get_ingestion_pipeline().stats(),
+            'ocr': get_ocr_engine().stats(),
+            'sessions': get_document_sessions().stats(),
+            'locks': get_document_locks().stats(),
+            'journal': get_journal_compactor().stats(),
+            'versions': get_version_collector().stats()
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,113 @@
+"""
+In-memory cache of parsed PDF documents
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from config import Config
+from models.pdf_models import PDFDocument
+
+# Rough per-element overhead of a dataclass instance, its dict and tuples
+_ELEMENT_OVERHEAD = 400
+
+def estimate_document_size(pdf_document: PDFDocument) -> int:
+    """Estimate the in-memory footprint of a parsed PDF document in bytes"""
+    size = sys.getsizeof(pdf_document) + pdf_document.text_elements.estimate_size()
+    for image in pdf_document.images:
+        size += _ELEMENT_OVERHEAD + len(image.data or '')
+    return size
+
+class DocumentCache:
+    """Thread-safe LRU cache of parsed PDFDocument objects.
+
+    Entries are keyed by (document_id, version) where the version is the
+    GridFS file_id of the stored PDF, so an edit that writes a new file never
+    serves stale elements. Eviction is driven by the estimated memory used by
+    all entries rather than by entry count.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int = 64):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[PDFDocument, int]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, document_id: str, version: str) -> Optional[PDFDocument]:
+        """Return the cached document for this version, or None"""
+        key = (document_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, pdf_document: PDFDocument, version: str) -> None:
+        """Insert or refresh a document, dropping older versions of it"""
+        size = estimate_document_size(pdf_document)
+        with self._lock:
+            self._remove_document(pdf_document.document_id)
+            if size > self.max_bytes:
+                # Too large to ever fit; caching it would flush everything else
+                return
+            self._entries[(pdf_document.document_id, version)] = (pdf_document, size)
+            self._current_bytes += size
+            self._evict()
+
+    def invalidate(self, document_id: str) -> None:
+        """Drop every cached version of a document"""
+        with self._lock:
+            self._remove_document(document_id)
+
+    def clear(self) -> None:
+        """Drop all cached documents"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
+
+    def _remove_document(self, document_id: str) -> None:
+        for key in [k for k in self._entries if k[0] == document_id]:
+            _, size = self._entries.pop(key)
+            self._current_bytes -= size
+
+    def _evict(self) -> None:
+        while self._entries and (self._current_bytes > self.max_bytes
+                                 or len(self._entries) > self.max_entries):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._current_bytes -= size
+            self.evictions += 1
+
+# Global document cache shared by all PDFService instances
+document_cache: Optional[DocumentCache] = None
+
+def get_document_cache() -> DocumentCache:
+    """Get the global document cache (lazy initialization)"""
+    global document_cache
+    if document_cache is None:
+        document_cache = DocumentCache(
+            Config.PDF_DOCUMENT_CACHE_BYTES,
+            Config.PDF_DOCUMENT_CACHE_ENTRIES
+        )
+    return document_cache
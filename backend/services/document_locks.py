@@ -0,0 +1,157 @@
+"""
+Per-document reader/writer locks
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+from config import Config
+
+class DocumentLockTimeout(Exception):
+    """Raised when a document lock could not be acquired in time"""
+
+class _DocumentLock:
+    """Holders and waiters of one document's lock"""
+    __slots__ = ('condition', 'readers', 'writer', 'write_depth', 'waiting_writers', 'users')
+
+    def __init__(self, condition: threading.Condition):
+        self.condition = condition
+        self.readers: Dict[int, int] = {}  # thread id -> hold count
+        self.writer: Optional[int] = None
+        self.write_depth = 0
+        self.waiting_writers = 0
+        self.users = 0  # holders plus waiters; the entry is dropped at zero
+
+class DocumentLockManager:
+    """Reader/writer locks keyed by document_id.
+
+    Renders, page reads and extraction share a document; edits take it
+    exclusively, so concurrent edit cycles on one document are applied one
+    after the other while different documents never wait on each other.
+    Waiting writers block new readers so a stream of renders cannot starve
+    an edit. Locks are reentrant per thread, and every wait is bounded by
+    timeout seconds, after which DocumentLockTimeout is raised.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._entries: Dict[str, _DocumentLock] = {}
+        self._lock = threading.Lock()
+        self.acquired = {'read': 0, 'write': 0}
+        self.contended = {'read': 0, 'write': 0}
+        self.timeouts = {'read': 0, 'write': 0}
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @contextmanager
+    def read(self, document_id: str, timeout: Optional[float] = None):
+        """Hold a shared lock on a document"""
+        self._acquire(document_id, False, timeout)
+        try:
+            yield
+        finally:
+            self._release(document_id, False)
+
+    @contextmanager
+    def write(self, document_id: str, timeout: Optional[float] = None):
+        """Hold an exclusive lock on a document"""
+        self._acquire(document_id, True, timeout)
+        try:
+            yield
+        finally:
+            self._release(document_id, True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lock counters"""
+        with self._lock:
+            return {
+                'documents': len(self._entries),
+                'acquired': dict(self.acquired),
+                'contended': dict(self.contended),
+                'timeouts': dict(self.timeouts),
+                'wait_seconds': round(self.wait_seconds, 3),
+                'max_wait_seconds': round(self.max_wait_seconds, 3),
+                'timeout': self.timeout
+            }
+
+    def _acquire(self, document_id: str, write: bool, timeout: Optional[float]) -> None:
+        kind = 'write' if write else 'read'
+        timeout = self.timeout if timeout is None else timeout
+        thread_id = threading.get_ident()
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry is None:
+                entry = self._entries[document_id] = _DocumentLock(threading.Condition(self._lock))
+            entry.users += 1
+
+            if not self._can_acquire(entry, thread_id, write):
+                self.contended[kind] += 1
+                start = time.monotonic()
+                if write:
+                    entry.waiting_writers += 1
+                try:
+                    while not self._can_acquire(entry, thread_id, write):
+                        remaining = timeout - (time.monotonic() - start)
+                        if remaining <= 0:
+                            self.timeouts[kind] += 1
+                            self._leave(document_id, entry)
+                            raise DocumentLockTimeout(
+                                f'Timed out after {timeout:g}s waiting for a {kind} lock on document {document_id}'
+                            )
+                        entry.condition.wait(remaining)
+                finally:
+                    if write:
+                        entry.waiting_writers -= 1
+                waited = time.monotonic() - start
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+            if write:
+                entry.writer = thread_id
+                entry.write_depth += 1
+            else:
+                entry.readers[thread_id] = entry.readers.get(thread_id, 0) + 1
+            self.acquired[kind] += 1
+
+    def _release(self, document_id: str, write: bool) -> None:
+        thread_id = threading.get_ident()
+        with self._lock:
+            entry = self._entries[document_id]
+            if write:
+                entry.write_depth -= 1
+                if entry.write_depth == 0:
+                    entry.writer = None
+            else:
+                entry.readers[thread_id] -= 1
+                if entry.readers[thread_id] == 0:
+                    del entry.readers[thread_id]
+            self._leave(document_id, entry)
+
+    def _leave(self, document_id: str, entry: _DocumentLock) -> None:
+        entry.users -= 1
+        if entry.users == 0:
+            del self._entries[document_id]
+        else:
+            entry.condition.notify_all()
+
+    @staticmethod
+    def _can_acquire(entry: _DocumentLock, thread_id: int, write: bool) -> bool:
+        if entry.writer == thread_id:
+            return True
+        if entry.writer is not None:
+            return False
+        if write:
+            # Only the caller's own shared holds may remain
+            return all(reader == thread_id for reader in entry.readers)
+        return thread_id in entry.readers or entry.waiting_writers == 0
+
+# Global lock manager shared by all PDFService instances
+document_locks: Optional[DocumentLockManager] = None
+
+def get_document_locks() -> DocumentLockManager:
+    """Get the global document lock manager (lazy initialization)"""
+    global document_locks
+    if document_locks is None:
+        document_locks = DocumentLockManager(Config.PDF_LOCK_TIMEOUT)
+    return document_locks
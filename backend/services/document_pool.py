@@ -0,0 +1,213 @@
+"""
+Pool of open PyMuPDF documents shared across requests
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Optional, Dict, Any
+
+import fitz  # PyMuPDF
+
+from config import Config
+
+class _PooledDocument:
+    """An open fitz.Document and its bookkeeping"""
+    __slots__ = ('file_id', 'document', 'data', 'size', 'refcount', 'last_used', 'lock', 'discarded')
+
+    def __init__(self, file_id: str, document, data):
+        self.file_id = file_id
+        self.document = document
+        # The buffer the document was opened from; fitz keeps it alive anyway
+        self.data = data
+        self.size = len(data)
+        self.refcount = 0
+        self.last_used = time.monotonic()
+        # fitz documents are not thread-safe; holders take turns
+        self.lock = threading.Lock()
+        self.discarded = False
+
+class DocumentPool:
+    """Keeps recently used fitz documents open, keyed by GridFS file_id.
+
+    Borrowers get exclusive use of a document for the duration of acquire().
+    Handles are reference counted so they are only closed once nobody holds
+    them, and idle handles are closed after idle_timeout seconds or when the
+    total size of open files exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int, idle_timeout: float, max_documents: int = 32):
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.max_documents = max_documents
+        self._handles: "OrderedDict[str, _PooledDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._open_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.closed = 0
+
+    @contextmanager
+    def acquire(self, file_id: str, loader: Callable[[], Optional[bytes]]):
+        """Borrow the open document for file_id, loading its bytes on a miss"""
+        while True:
+            handle = self._checkout(file_id, loader)
+            handle.lock.acquire()
+            if not handle.discarded and handle.file_id == file_id:
+                break
+            # The previous holder dropped the handle or saved it as another file
+            handle.lock.release()
+            self._checkin(handle)
+        try:
+            yield handle.document
+        finally:
+            handle.lock.release()
+            self._checkin(handle)
+
+    def adopt(self, file_id: str, data) -> None:
+        """Open a document from bytes the caller already holds, e.g. a fresh upload,
+        so the first borrower does not read the file back from storage.
+        """
+        with self._lock:
+            if file_id in self._handles:
+                return
+        handle = self._register(file_id, fitz.open(stream=data, filetype="pdf"), data)
+        self._checkin(handle)
+
+    def get_bytes(self, file_id: str):
+        """The buffer an open document was loaded from, or None"""
+        with self._lock:
+            handle = self._handles.get(file_id)
+            return handle.data if handle is not None else None
+
+    def rekey(self, old_file_id: str, new_file_id: str) -> None:
+        """Re-register a handle after its document was saved as a new file.
+
+        Used by edits: the modified in-memory document already matches the
+        new GridFS file, so it can be reused without reopening.
+        """
+        with self._lock:
+            handle = self._handles.pop(old_file_id, None)
+            if handle is None:
+                return
+            replaced = self._handles.pop(new_file_id, None)
+            if replaced is not None:
+                self._retire(replaced)
+            # The edited document no longer matches the bytes it was opened from
+            handle.data = None
+            handle.file_id = new_file_id
+            self._handles[new_file_id] = handle
+
+    def discard(self, file_id: str) -> None:
+        """Drop a handle whose in-memory state no longer matches its file"""
+        with self._lock:
+            handle = self._handles.pop(file_id, None)
+            if handle is not None:
+                self._retire(handle)
+
+    def close_idle(self) -> int:
+        """Close handles that have not been used within idle_timeout"""
+        with self._lock:
+            return self._close_idle(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters"""
+        with self._lock:
+            return {
+                'open_documents': len(self._handles),
+                'open_bytes': self._open_bytes,
+                'max_bytes': self.max_bytes,
+                'in_use': sum(1 for h in self._handles.values() if h.refcount),
+                'hits': self.hits,
+                'misses': self.misses,
+                'closed': self.closed
+            }
+
+    def _checkout(self, file_id: str, loader: Callable[[], Optional[bytes]]) -> _PooledDocument:
+        with self._lock:
+            self._close_idle(time.monotonic())
+            handle = self._handles.get(file_id)
+            if handle is not None:
+                handle.refcount += 1
+                self._handles.move_to_end(file_id)
+                self.hits += 1
+                return handle
+            self.misses += 1
+
+        # Fetch and parse outside the pool lock so other documents are not blocked
+        data = loader()
+        if not data:
+            raise Exception(f"PDF file not found: {file_id}")
+        return self._register(file_id, fitz.open(stream=data, filetype="pdf"), data)
+
+    def _register(self, file_id: str, document, data) -> _PooledDocument:
+        with self._lock:
+            handle = self._handles.get(file_id)
+            if handle is not None:
+                # Another thread opened the same file meanwhile; use theirs
+                document.close()
+            else:
+                handle = _PooledDocument(file_id, document, data)
+                self._handles[file_id] = handle
+                self._open_bytes += handle.size
+            handle.refcount += 1
+            self._handles.move_to_end(file_id)
+            self._shrink()
+            return handle
+
+    def _checkin(self, handle: _PooledDocument) -> None:
+        with self._lock:
+            handle.refcount -= 1
+            handle.last_used = time.monotonic()
+            if handle.discarded and handle.refcount == 0:
+                self._close(handle)
+            else:
+                self._shrink()
+
+    def _retire(self, handle: _PooledDocument) -> None:
+        self._open_bytes -= handle.size
+        handle.discarded = True
+        if handle.refcount == 0:
+            self._close(handle)
+        else:
+            # Counted as closed once the last holder checks it back in
+            handle.size = 0
+
+    def _close(self, handle: _PooledDocument) -> None:
+        try:
+            handle.document.close()
+        except Exception as e:
+            print(f"⚠️ Error closing pooled document: {e}")
+        self.closed += 1
+
+    def _close_idle(self, now: float) -> int:
+        expired = [file_id for file_id, handle in self._handles.items()
+                   if handle.refcount == 0 and now - handle.last_used > self.idle_timeout]
+        for file_id in expired:
+            self._retire(self._handles.pop(file_id))
+        return len(expired)
+
+    def _shrink(self) -> None:
+        # Close least recently used idle handles until within budget; handles in
+        # use are never closed, so the pool may briefly exceed its limits
+        for file_id in list(self._handles):
+            if self._open_bytes <= self.max_bytes and len(self._handles) <= self.max_documents:
+                break
+            handle = self._handles[file_id]
+            if handle.refcount == 0:
+                del self._handles[file_id]
+                self._retire(handle)
+
+# Global document pool shared by all PDFService instances
+document_pool: Optional[DocumentPool] = None
+
+def get_document_pool() -> DocumentPool:
+    """Get the global document pool (lazy initialization)"""
+    global document_pool
+    if document_pool is None:
+        document_pool = DocumentPool(
+            Config.PDF_POOL_MAX_BYTES,
+            Config.PDF_POOL_IDLE_SECONDS,
+            Config.PDF_POOL_MAX_DOCUMENTS
+        )
+    return document_pool
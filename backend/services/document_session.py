@@ -0,0 +1,66 @@
+"""
+Per-request document sessions backed by the shared caches
+"""
+import threading
+from typing import Optional, Dict, Any
+
+from config import Config
+from services.pdf_service import PDFService
+from services.pdf_storage_service import PDFStorageService
+from utils.file_utils import FileHandler
+
+class DocumentSessionError(Exception):
+    """Raised when the document a request names cannot be opened"""
+
+class DocumentSessionManager:
+    """Hands every request its own PDFService bound to the document it names.
+
+    A session only holds the request's current document; parsed documents,
+    open fitz handles, renders and the MongoDB client all live in the shared
+    document cache, document pool, render cache and storage service. Opening
+    a session is therefore a version lookup plus a cache hit, and waitress
+    worker threads never share a mutable service or overwrite each other's
+    current document.
+    """
+
+    def __init__(self, file_handler: FileHandler):
+        self.file_handler = file_handler
+        self.storage_service = PDFStorageService()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.failed = 0
+
+    def create(self) -> PDFService:
+        """A session not yet bound to a document, e.g. for an upload"""
+        return PDFService(self.file_handler, self.storage_service)
+
+    def open(self, document_id: str) -> PDFService:
+        """A session with document_id loaded; raises DocumentSessionError"""
+        pdf_service = self.create()
+        if not pdf_service.load_pdf_from_mongodb(document_id):
+            with self._lock:
+                self.failed += 1
+            raise DocumentSessionError(f'Failed to load PDF document: {document_id}')
+        with self._lock:
+            self.opened += 1
+        return pdf_service
+
+    def stats(self) -> Dict[str, Any]:
+        """Return session counters"""
+        with self._lock:
+            return {
+                'opened': self.opened,
+                'failed': self.failed
+            }
+
+# Global session manager (lazy initialization)
+document_sessions: Optional[DocumentSessionManager] = None
+
+def get_document_sessions() -> DocumentSessionManager:
+    """Get the global document session manager"""
+    global document_sessions
+    if document_sessions is None:
+        document_sessions = DocumentSessionManager(
+            FileHandler(Config.UPLOAD_FOLDER, Config.TEMP_FOLDER)
+        )
+    return document_sessions
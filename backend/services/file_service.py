@@ -158,6 +158,17 @@ class FileService:
         """Convert PDF to Word document"""
         try:
             pdf_doc = fitz.open(pdf_path)
+            try:
+                return self.convert_document_to_word(pdf_doc)
+            finally:
+                pdf_doc.close()
+        except Exception as e:
+            print(f"Error converting PDF to Word: {e}")
+            return None
+    
+    def convert_document_to_word(self, pdf_doc) -> Optional[str]:
+        """Convert an already open PDF document to Word; the caller owns pdf_doc"""
+        try:
             doc = Document()
             
             for page_num in range(len(pdf_doc)):
@@ -173,7 +184,6 @@ class FileService:
             # Save converted document
             output_path = self.file_handler.temp_folder / f'converted_{uuid.uuid4()}.docx'
             doc.save(str(output_path))
-            pdf_doc.close()
             
             return str(output_path)
             
@@ -251,6 +261,17 @@ class FileService:
         """Extract all text from PDF"""
         try:
             pdf_doc = fitz.open(pdf_path)
+            try:
+                return self.extract_text_from_document(pdf_doc)
+            finally:
+                pdf_doc.close()
+        except Exception as e:
+            print(f"Error extracting text from PDF: {e}")
+            return ""
+    
+    def extract_text_from_document(self, pdf_doc) -> str:
+        """Extract all text from an already open PDF document; the caller owns pdf_doc"""
+        try:
             text_content = []
             
             for page_num in range(len(pdf_doc)):
@@ -259,7 +280,6 @@ class FileService:
                 if text.strip():
                     text_content.append(text)
             
-            pdf_doc.close()
             return '\n\n'.join(text_content)
             
         except Exception as e:
@@ -0,0 +1,199 @@
+"""
+Background ingestion of uploaded PDFs
+"""
+import queue
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from config import Config
+from models.pdf_models import IngestJob
+from services.document_session import get_document_sessions
+from services.document_locks import DocumentLockTimeout
+from services.pdf_storage_service import PDFStorageService
+
+# Stages run by the pipeline after the upload request has stored the file
+INGEST_STAGES = ['upload', 'thumbnails', 'extraction', 'persistence']
+
+class IngestQueueFullError(Exception):
+    """Raised when the ingestion queue cannot accept more work"""
+
+class IngestionPipeline:
+    """Bounded worker pool that processes uploads after the bytes are in GridFS.
+
+    The upload request only stores the file and enqueues a job. Workers then
+    pre-render the page thumbnail sprite so the editor sidebar is ready first,
+    extract text and images (encoded as PNG) page batch by page batch,
+    appending each batch to the stored document, and finally persist the
+    document summary. Job state is kept in memory and mirrored to the
+    pdf_jobs collection so any worker can answer status requests.
+    """
+
+    def __init__(self, workers: int, queue_size: int, batch_pages: int):
+        self.workers = workers
+        self.batch_pages = batch_pages
+        self._queue: "queue.Queue[IngestJob]" = queue.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._storage_service = PDFStorageService()
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def has_capacity(self) -> bool:
+        """Whether a new job would currently be accepted"""
+        return not self._queue.full()
+
+    def submit(self, document_id: str, page_count: int) -> IngestJob:
+        """Queue a stored document for processing; raises IngestQueueFullError"""
+        self._start()
+        now = datetime.now()
+        job = IngestJob(
+            job_id=str(uuid.uuid4()),
+            document_id=document_id,
+            status='queued',
+            pages_total=page_count,
+            pages_done=0,
+            stages={name: {'status': 'pending'} for name in INGEST_STAGES},
+            created_at=now,
+            updated_at=now
+        )
+        job.stages['upload'] = {'status': 'done', 'finished_at': now.isoformat()}
+
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise IngestQueueFullError('Ingestion queue is full, please retry shortly')
+            self._jobs[job.job_id] = job
+        self._save(job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's status, from memory or from MongoDB"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        return self._storage_service.get_ingest_job(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue and worker counters"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'workers': self.workers,
+                'active': self.active,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'pdf-ingest-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self.active += 1
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    # Finished jobs are answered from MongoDB from now on
+                    self._jobs.pop(job.job_id, None)
+                self._queue.task_done()
+
+    def _run(self, job: IngestJob) -> None:
+        print(f"⚙️ Ingesting document {job.document_id} (job {job.job_id})")
+        job.status = 'running'
+        try:
+            self._begin_stage(job, 'thumbnails')
+            pdf_service = get_document_sessions().open(job.document_id)
+            pdf_document = pdf_service.current_document
+            
+            try:
+                thumbnails = pdf_service.get_thumbnail_sprite()
+            except DocumentLockTimeout as e:
+                print(f"⚠️ {e}")
+                thumbnails = None
+            
+            if thumbnails:
+                self._end_stage(job, 'thumbnails')
+            else:
+                # The sidebar falls back to rendering on request; keep ingesting
+                job.stages['thumbnails']['status'] = 'failed'
+            
+            self._begin_stage(job, 'extraction')
+
+            for start in range(0, pdf_document.page_count, self.batch_pages):
+                pages = range(start, min(start + self.batch_pages, pdf_document.page_count))
+                with pdf_service.document_locks.read(job.document_id):
+                    extracted = pdf_service.ensure_pages_extracted(pages, pdf_document)
+                if not extracted:
+                    raise Exception(f'Failed to extract pages {pages.start}-{pages.stop - 1}')
+                job.pages_done = pages.stop
+                self._save(job)
+            self._end_stage(job, 'extraction')
+
+            self._begin_stage(job, 'persistence')
+            self._storage_service.update_pdf_document(job.document_id, {
+                'status': 'ready',
+                'fonts': pdf_document.fonts,
+                'colors': pdf_document.colors
+            })
+            self._end_stage(job, 'persistence')
+
+            job.status = 'completed'
+            with self._lock:
+                self.completed += 1
+            print(f"✅ Ingestion completed for {job.document_id}")
+        except Exception as e:
+            print(f"❌ Ingestion failed for {job.document_id}: {e}")
+            for stage in job.stages.values():
+                if stage['status'] == 'running':
+                    stage['status'] = 'failed'
+            job.status = 'failed'
+            job.error = str(e)
+            with self._lock:
+                self.failed += 1
+        self._save(job)
+
+    def _begin_stage(self, job: IngestJob, name: str) -> None:
+        job.stages[name] = {'status': 'running', 'started_at': datetime.now().isoformat()}
+        self._save(job)
+
+    def _end_stage(self, job: IngestJob, name: str) -> None:
+        job.stages[name]['status'] = 'done'
+        job.stages[name]['finished_at'] = datetime.now().isoformat()
+
+    def _save(self, job: IngestJob) -> None:
+        job.updated_at = datetime.now()
+        self._storage_service.save_ingest_job(job.to_dict())
+
+# Global ingestion pipeline (lazy initialization)
+ingestion_pipeline: Optional[IngestionPipeline] = None
+
+def get_ingestion_pipeline() -> IngestionPipeline:
+    """Get the global ingestion pipeline"""
+    global ingestion_pipeline
+    if ingestion_pipeline is None:
+        ingestion_pipeline = IngestionPipeline(
+            Config.PDF_INGEST_WORKERS,
+            Config.PDF_INGEST_QUEUE_SIZE,
+            Config.PDF_INGEST_BATCH_PAGES
+        )
+    return ingestion_pipeline
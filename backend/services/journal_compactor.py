@@ -0,0 +1,99 @@
+"""
+Background compaction of journaled PDF edits
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from config import Config
+from services.document_session import get_document_sessions
+from services.document_pool import get_document_pool
+from services.pdf_storage_service import PDFStorageService
+
+class JournalCompactor:
+    """Folds edit journals into new PDF versions off the request path.
+
+    Edits are only journaled; a document's pending edits are written into
+    the PDF when it is next read, or here, every interval seconds, once the
+    document has not been edited for idle_seconds. Documents that are never
+    looked at again therefore still end up with their edits in the file.
+    Each pass also closes pooled documents that have sat idle, which the
+    pool otherwise only does when it is next used.
+    """
+
+    def __init__(self, interval: float, idle_seconds: float):
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self._storage_service = PDFStorageService()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.compacted = 0
+        self.failed = 0
+        self.last_run: Optional[datetime] = None
+
+    def start(self) -> None:
+        """Start the compactor thread if it is not running yet"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='pdf-journal-compactor', daemon=True)
+            self._thread.start()
+
+    def compact(self) -> int:
+        """Fold the journals of idle documents; returns the number of documents compacted"""
+        compacted = failed = 0
+        for document_id in self._storage_service.find_pending_journals(self.idle_seconds):
+            try:
+                get_document_sessions().open(document_id).materialize()
+                compacted += 1
+            except Exception as e:
+                print(f"❌ Could not compact edit journal of {document_id}: {e}")
+                failed += 1
+        with self._lock:
+            self.runs += 1
+            self.compacted += compacted
+            self.failed += failed
+            self.last_run = datetime.now()
+        return compacted
+
+    def stats(self) -> Dict[str, Any]:
+        """Return compactor counters"""
+        with self._lock:
+            return {
+                'running': self._thread is not None,
+                'interval': self.interval,
+                'idle_seconds': self.idle_seconds,
+                'runs': self.runs,
+                'compacted': self.compacted,
+                'failed': self.failed,
+                'last_run': self.last_run.isoformat() if self.last_run else None
+            }
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"❌ Journal compaction failed: {e}")
+            try:
+                closed = get_document_pool().close_idle()
+                if closed:
+                    print(f"🧹 Closed {closed} idle pooled documents")
+            except Exception as e:
+                print(f"❌ Closing idle pooled documents failed: {e}")
+
+# Global journal compactor (lazy initialization)
+journal_compactor: Optional[JournalCompactor] = None
+
+def get_journal_compactor() -> JournalCompactor:
+    """Get the global journal compactor"""
+    global journal_compactor
+    if journal_compactor is None:
+        journal_compactor = JournalCompactor(
+            Config.PDF_JOURNAL_COMPACT_INTERVAL,
+            Config.PDF_JOURNAL_IDLE_SECONDS
+        )
+    return journal_compactor
@@ -0,0 +1,229 @@
+"""
+OCR engine running Tesseract in worker processes
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import cv2
+import numpy as np
+import pytesseract
+
+from config import Config
+
+DEFAULT_OCR_SETTINGS = {
+    'lang': 'eng',
+    'psm': 3,  # Tesseract page segmentation mode: fully automatic
+    'preprocess': True,
+    'max_dimension': 2000
+}
+
+def preprocess_image(img_array: np.ndarray, max_dimension: int) -> np.ndarray:
+    """Grayscale, downscale and binarize an image for OCR"""
+    if img_array.ndim == 3:
+        code = cv2.COLOR_BGRA2GRAY if img_array.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        img_array = cv2.cvtColor(img_array, code)
+
+    height, width = img_array.shape[:2]
+    scale = max_dimension / max(height, width)
+    if max_dimension and scale < 1:
+        img_array = cv2.resize(img_array, (int(width * scale), int(height * scale)),
+                               interpolation=cv2.INTER_AREA)
+
+    # Otsu picks the threshold that best separates ink from background
+    _, img_array = cv2.threshold(img_array, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return img_array
+
+def _decode(image_data: bytes, settings: Dict[str, Any]) -> np.ndarray:
+    img_array = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if img_array is None:
+        raise ValueError('Unsupported image data')
+    if settings['preprocess']:
+        img_array = preprocess_image(img_array, settings['max_dimension'])
+    return img_array
+
+def _tesseract_config(settings: Dict[str, Any]) -> str:
+    return f"--psm {settings['psm']}"
+
+def _init_worker(tesseract_cmd: str) -> None:
+    if tesseract_cmd and os.path.exists(tesseract_cmd):
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+def ocr_image(image_data: bytes, settings: Dict[str, Any]) -> str:
+    """Worker entry point: OCR one encoded image"""
+    img_array = _decode(image_data, settings)
+    return pytesseract.image_to_string(img_array, lang=settings['lang'],
+                                       config=_tesseract_config(settings)).strip()
+
+def ocr_page_words(image_data: bytes, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker entry point: OCR a rasterized page into word boxes.
+
+    Returns the image size and (text, bbox, confidence, block_num, line_num,
+    word_num) tuples with bboxes in pixels of the input image. Lines are
+    numbered per block, across Tesseract paragraphs.
+    """
+    original = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if original is None:
+        raise ValueError('Unsupported image data')
+    height, width = original.shape[:2]
+    img_array = _decode(image_data, settings)
+    scale = width / img_array.shape[1]
+
+    data = pytesseract.image_to_data(img_array, lang=settings['lang'],
+                                     config=_tesseract_config(settings),
+                                     output_type=pytesseract.Output.DICT)
+    words = []
+    line_numbers: Dict[tuple, int] = {}
+    block_lines: Dict[int, int] = {}
+    for i, text in enumerate(data['text']):
+        text = text.strip()
+        confidence = float(data['conf'][i])
+        if not text or confidence < 0:
+            continue
+
+        block_num = data['block_num'][i]
+        line_key = (block_num, data['par_num'][i], data['line_num'][i])
+        if line_key not in line_numbers:
+            line_numbers[line_key] = block_lines.get(block_num, 0)
+            block_lines[block_num] = line_numbers[line_key] + 1
+
+        x0 = data['left'][i] * scale
+        y0 = data['top'][i] * scale
+        bbox = (x0, y0, x0 + data['width'][i] * scale, y0 + data['height'][i] * scale)
+        words.append((text, bbox, confidence, block_num, line_numbers[line_key], data['word_num'][i]))
+
+    return {'width': width, 'height': height, 'words': words}
+
+class OCREngine:
+    """Runs Tesseract on a process pool and caches results.
+
+    Results are keyed by the SHA-256 of the image bytes together with the OCR
+    settings, kept in an in-memory LRU and mirrored to MongoDB, so OCRing the
+    same images again costs a lookup instead of a Tesseract run.
+    """
+
+    def __init__(self, workers: int, cache_entries: int, storage_service=None):
+        self.workers = workers
+        self.cache_entries = cache_entries
+        self.storage_service = storage_service
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def settings(self, **overrides) -> Dict[str, Any]:
+        """Default OCR settings with any non-None overrides applied"""
+        settings = dict(DEFAULT_OCR_SETTINGS, lang=Config.OCR_LANG,
+                        max_dimension=Config.OCR_MAX_DIMENSION)
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        return settings
+
+    @staticmethod
+    def settings_key(settings: Dict[str, Any]) -> str:
+        """Stable key for a set of OCR settings"""
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+    @classmethod
+    def cache_key(cls, data: bytes, settings: Dict[str, Any]) -> str:
+        """Key combining the content hash and the settings that affect the result"""
+        digest = hashlib.sha256(data)
+        digest.update(cls.settings_key(settings).encode())
+        return digest.hexdigest()
+
+    def run(self, func, items: List[bytes], settings: Dict[str, Any], cache: bool = True) -> List[Any]:
+        """Apply a picklable worker function to each item, serving cached results.
+        Results are returned in input order; a failed item yields None. With
+        cache=False the caller persists results itself and nothing is cached.
+        """
+        keys = [f"{func.__name__}:{self.cache_key(data, settings)}" for data in items]
+        results: List[Any] = [None] * len(items)
+        pending: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if cache and key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[i] = self._cache[key]
+                    self.hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+
+        if cache and pending and self.storage_service is not None:
+            for key, value in self.storage_service.get_ocr_results(list(pending)).items():
+                for i in pending.pop(key):
+                    results[i] = value
+                self._remember(key, value, persist=False)
+                with self._lock:
+                    self.hits += 1
+
+        if pending:
+            with self._lock:
+                self.misses += len(pending)
+            pool = self._get_pool()
+            futures = {key: pool.submit(func, items[indexes[0]], settings)
+                       for key, indexes in pending.items()}
+            for key, future in futures.items():
+                try:
+                    value = future.result()
+                except Exception as e:
+                    print(f"OCR error: {e}")
+                    continue
+                for i in pending[key]:
+                    results[i] = value
+                if cache:
+                    self._remember(key, value)
+
+        return results
+
+    def ocr_images(self, images: List[bytes], **overrides) -> List[Optional[str]]:
+        """OCR encoded images in parallel; returns text per image in input order"""
+        return self.run(ocr_image, images, self.settings(**overrides))
+
+    def ocr_page_images(self, images: List[bytes], settings: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+        """OCR rasterized pages in parallel into word boxes, without caching"""
+        return self.run(ocr_page_words, images, settings, cache=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return engine counters"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'cache_entries': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _remember(self, key: str, value: Any, persist: bool = True) -> None:
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        if persist and self.storage_service is not None:
+            self.storage_service.save_ocr_result(key, value)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(Config.TESSERACT_CMD,)
+                )
+            return self._pool
+
+# Global OCR engine (lazy initialization)
+ocr_engine: Optional[OCREngine] = None
+
+def get_ocr_engine() -> OCREngine:
+    """Get the global OCR engine"""
+    global ocr_engine
+    if ocr_engine is None:
+        from services.pdf_storage_service import PDFStorageService
+        ocr_engine = OCREngine(Config.OCR_WORKERS, Config.OCR_CACHE_ENTRIES, PDFStorageService())
+    return ocr_engine
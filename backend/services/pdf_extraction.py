@@ -0,0 +1,147 @@
+"""
+Page-level element extraction, serial or across worker processes
+"""
+import base64
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional, Iterable
+
+import fitz  # PyMuPDF
+
+from config import Config
+from models.pdf_models import TextElementStore, ImageElement
+
+# Compact per-page results are plain tuples so they pickle cheaply between processes:
+#   span:  (text, bbox, font_name, font_size, font_flags, color_int, block_num, line_num, word_num)
+#   image: (img_index, bbox, png_base64, xref, width, height)
+
+def extract_page(pdf_doc, page_num: int, include_images: bool = True) -> Dict[str, Any]:
+    """Extract the compact text spans and, unless include_images is False, images of one page"""
+    page = pdf_doc[page_num]
+    spans = []
+    blocks = page.get_text("dict")
+
+    for block_num, block in enumerate(blocks["blocks"]):
+        if "lines" not in block:
+            continue
+
+        for line_num, line in enumerate(block["lines"]):
+            for word_num, word in enumerate(line["spans"]):
+                # Ensure bbox is a tuple of floats, not a Rect object
+                bbox = word["bbox"]
+                if hasattr(bbox, '__iter__') and not isinstance(bbox, (str, bytes)):
+                    bbox = tuple(float(v) for v in bbox)
+                else:
+                    bbox = (0.0, 0.0, 0.0, 0.0)  # fallback
+
+                spans.append((word["text"], bbox, word["font"], word["size"], word["flags"],
+                              word.get("color", 0), block_num, line_num, word_num))
+
+    images = []
+    for img_index, img in enumerate(page.get_images() if include_images else []):
+        xref = img[0]
+        pix = fitz.Pixmap(pdf_doc, xref)
+
+        if pix.n - pix.alpha >= 4:  # CMYK: convert before PNG encoding
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        img_b64 = base64.b64encode(pix.tobytes("png")).decode()
+
+        # Get image rectangle and normalize to tuple[float, float, float, float]
+        rects = page.get_image_rects(xref)
+        if rects:
+            r = rects[0]
+            bbox = (float(r.x0), float(r.y0), float(r.x1), float(r.y1))
+        else:
+            bbox = (0.0, 0.0, 100.0, 100.0)
+
+        images.append((img_index, bbox, img_b64, xref, pix.width, pix.height))
+        pix = None
+
+    return {'page_num': page_num, 'spans': spans, 'images': images}
+
+def build_elements(page_result: Dict[str, Any], text_elements: TextElementStore) -> List[ImageElement]:
+    """Append a compact page result's spans to text_elements and return its images"""
+    page_num = page_result['page_num']
+    for text, bbox, font_name, font_size, font_flags, color, block_num, line_num, word_num in page_result['spans']:
+        # PyMuPDF span colors are already packed sRGB integers
+        text_elements.append_span(text, bbox, font_name, font_size, font_flags, color & 0xFFFFFF,
+                                  page_num, block_num, line_num, word_num)
+
+    return [
+        ImageElement(
+            image_id=f"img_{page_num}_{img_index}",
+            page=page_num,
+            bbox=bbox,
+            data=img_b64,
+            xref=xref,
+            width=width,
+            height=height
+        )
+        for img_index, bbox, img_b64, xref, width, height in page_result['images']
+    ]
+
+def _extract_range_from_shared(shm_name: str, size: int, page_nums: List[int]) -> List[Dict[str, Any]]:
+    """Worker entry point: open the PDF from shared memory and extract a page range"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        pdf_doc = fitz.open(stream=bytes(shm.buf[:size]), filetype="pdf")
+    finally:
+        shm.close()
+    try:
+        return [extract_page(pdf_doc, page_num) for page_num in page_nums]
+    finally:
+        pdf_doc.close()
+
+# Process pool shared by all extractions (lazy initialization)
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the extraction process pool"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=Config.PDF_EXTRACT_WORKERS)
+    return _process_pool
+
+def extract_pages_parallel(pdf_data: bytes, page_nums: Iterable[int],
+                           workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Extract pages across worker processes, returning results in page order.
+
+    The PDF bytes are placed in shared memory once; each worker opens the
+    document a single time and extracts one contiguous slice of the pages.
+    """
+    page_nums = sorted(page_nums)
+    workers = max(1, min(workers or Config.PDF_EXTRACT_WORKERS, len(page_nums)))
+    chunk_size = -(-len(page_nums) // workers)
+    chunks = [page_nums[i:i + chunk_size] for i in range(0, len(page_nums), chunk_size)]
+
+    shm = shared_memory.SharedMemory(create=True, size=len(pdf_data))
+    try:
+        shm.buf[:len(pdf_data)] = pdf_data
+        pool = get_process_pool()
+        futures = [pool.submit(_extract_range_from_shared, shm.name, len(pdf_data), chunk)
+                   for chunk in chunks]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+def extract_pages(pdf_doc, page_nums: Iterable[int],
+                  pdf_data_loader=None) -> List[Dict[str, Any]]:
+    """Extract pages serially, or in parallel once there are enough of them.
+
+    pdf_data_loader returns the raw PDF bytes for the worker processes; it is
+    only called when the parallel path is taken.
+    """
+    page_nums = sorted(page_nums)
+    if (pdf_data_loader is not None and Config.PDF_EXTRACT_WORKERS > 1
+            and len(page_nums) >= Config.PDF_PARALLEL_EXTRACT_MIN_PAGES):
+        pdf_data = pdf_data_loader()
+        if pdf_data:
+            try:
+                return extract_pages_parallel(pdf_data, page_nums)
+            except Exception as e:
+                print(f"⚠️ Parallel extraction failed, falling back to serial: {e}")
+    return [extract_page(pdf_doc, page_num) for page_num in page_nums]
@@ -4,26 +4,65 @@ PDF processing service
 import fitz  # PyMuPDF
 import base64
 import io
+import math
 import os
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from contextlib import contextmanager
 from datetime import datetime
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-import pytesseract
-import cv2
-import numpy as np
 
-from models.pdf_models import TextElement, ImageElement, PDFDocument
+from models.pdf_models import TextElement, TextElementStore, ImageElement, PDFDocument
 from utils.file_utils import FileHandler, FileValidator
 from services.pdf_storage_service import PDFStorageService
+from services.document_cache import get_document_cache
+from services.render_cache import get_render_cache, page_zoom, tile_zoom
+from services.document_pool import get_document_pool
+from services.pdf_writer import get_pdf_writer
+from services.document_locks import get_document_locks, DocumentLockTimeout
+from services.pdf_extraction import extract_page, extract_pages, build_elements
+from services.ocr_service import get_ocr_engine
+from config import Config
+
+# Per-document locks serializing page extraction, so two requests never
+# extract the same page twice; entries are dropped once nobody holds or waits
+_extraction_locks: Dict[str, List[Any]] = {}  # document_id -> [lock, users]
+_extraction_locks_guard = threading.Lock()
+
+@contextmanager
+def _extraction_lock(document_id: str):
+    """Hold the extraction lock of one document"""
+    with _extraction_locks_guard:
+        entry = _extraction_locks.get(document_id)
+        if entry is None:
+            entry = _extraction_locks[document_id] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _extraction_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _extraction_locks[document_id]
+
+# Background workers for neighbouring-page prefetch
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pdf-prefetch')
 
 class PDFService:
     """Service for PDF processing operations"""
     
-    def __init__(self, file_handler: FileHandler):
+    def __init__(self, file_handler: FileHandler, storage_service: Optional[PDFStorageService] = None):
         self.file_handler = file_handler
         self.current_document: Optional[PDFDocument] = None
-        self.storage_service = None  # Initialize lazily
+        self.storage_service = storage_service  # Initialize lazily unless shared
+        self.document_cache = get_document_cache()
+        self.render_cache = get_render_cache()
+        self.document_pool = get_document_pool()
+        self.pdf_writer = get_pdf_writer()
+        self.document_locks = get_document_locks()
     
     def _get_storage_service(self):
         """Get storage service instance (lazy initialization)"""
@@ -31,38 +70,54 @@ class PDFService:
             self.storage_service = PDFStorageService()
         return self.storage_service
     
+    @contextmanager
+    def _borrow_document(self, document_id: str, file_id: Optional[str] = None):
+        """Borrow the pooled fitz document for a document's current file version.
+        Yields (pdf_doc, file_id); the document must not be closed by the caller.
+        """
+        storage_service = self._get_storage_service()
+        if not file_id:
+            file_id = storage_service.get_file_version(document_id)
+        if not file_id:
+            raise Exception(f"No stored PDF file for document: {document_id}")
+        
+        with self.document_pool.acquire(file_id, lambda: storage_service.retrieve_pdf_file(file_id)) as pdf_doc:
+            yield pdf_doc, file_id
+    
+    @contextmanager
+    def open_document(self):
+        """Borrow an open fitz document for the current document"""
+        if not self.current_document:
+            raise Exception("No PDF loaded")
+        
+        self.materialize()
+        document_id = self.current_document.document_id
+        with self.document_locks.read(document_id), self._borrow_document(document_id) as (pdf_doc, _):
+            yield pdf_doc
+    
     def load_pdf_from_bytes(self, file_data: bytes, filename: str) -> bool:
         """Load and process a PDF from bytes data"""
         try:
             print(f"📖 Loading PDF from bytes: {filename}")
             
-            # Create a temporary file-like object
-            import io
-            file_obj = io.BytesIO(file_data)
-            
             # Open PDF document from bytes
             pdf_doc = fitz.open(stream=file_data, filetype="pdf")
             
-            # Extract elements
-            text_elements = self._extract_text_elements(pdf_doc)
-            images = self._extract_images(pdf_doc)
-            fonts = self._extract_fonts(text_elements)
-            colors = self._extract_colors(text_elements)
-            
-            # Create PDF document model
+            # Elements are extracted per page on first access (see ensure_pages_extracted)
             self.current_document = PDFDocument(
                 document_id=str(uuid.uuid4()),
                 filename=filename,
                 file_path=f"mongodb://{filename}",  # Placeholder for MongoDB storage
                 file_size=len(file_data),
                 page_count=len(pdf_doc),
-                text_elements=text_elements,
-                images=images,
-                fonts=fonts,
-                colors=colors,
+                text_elements=[],
+                images=[],
+                fonts=[],
+                colors=[],
                 metadata=self._extract_metadata(pdf_doc),
                 created_at=datetime.now(),
-                updated_at=datetime.now()
+                updated_at=datetime.now(),
+                extracted_pages=[]
             )
             
             pdf_doc.close()
@@ -73,18 +128,72 @@ class PDFService:
             print(f"❌ Error loading PDF from bytes: {e}")
             return False
     
+    def load_stored_pdf(self, document_id: str, filename: str, file_size: int,
+                        file_id: Optional[str] = None) -> bool:
+        """Load a PDF that was just stored, reading only what the pooled document already has.
+        
+        Used after streaming uploads: the caller adopts the upload buffer into the
+        document pool, so no further copy of the file is made here.
+        """
+        try:
+            print(f"📖 Loading stored PDF: {filename}")
+            
+            with self._borrow_document(document_id, file_id) as (pdf_doc, _):
+                page_count = pdf_doc.page_count
+                metadata = self._extract_metadata(pdf_doc)
+            
+            # Elements are extracted per page on first access (see ensure_pages_extracted)
+            self.current_document = PDFDocument(
+                document_id=document_id,
+                filename=filename,
+                file_path=f"mongodb://{filename}",  # Placeholder for MongoDB storage
+                file_size=file_size,
+                page_count=page_count,
+                text_elements=[],
+                images=[],
+                fonts=[],
+                colors=[],
+                metadata=metadata,
+                created_at=datetime.now(),
+                updated_at=datetime.now(),
+                extracted_pages=[]
+            )
+            
+            print(f"✅ Stored PDF loaded successfully")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error loading stored PDF: {e}")
+            return False
+    
     def load_pdf_from_mongodb(self, document_id: str) -> bool:
         """Load and process a PDF from MongoDB"""
         try:
             print(f"📖 Loading PDF from MongoDB: {document_id}")
             
-            # Retrieve PDF document from MongoDB
             storage_service = self._get_storage_service()
+            
+            # Serve parsed elements from the cache when the stored file is unchanged
+            version = storage_service.get_file_version(document_id)
+            if version:
+                cached_document = self.document_cache.get(document_id, version)
+                if cached_document:
+                    self.current_document = cached_document
+                    print(f"✅ PDF served from document cache")
+                    return True
+            
+            # Retrieve PDF document from MongoDB
             pdf_document = storage_service.get_pdf_document(document_id)
             if not pdf_document:
                 print(f"❌ Failed to retrieve PDF document from MongoDB")
                 return False
             
+            # Records that still embed their elements need the pending edits on top
+            self._replay_edit_journal(pdf_document, pdf_document.extracted_pages)
+            
+            if version:
+                self.document_cache.put(pdf_document, version)
+            
             # Set as current document
             self.current_document = pdf_document
             print(f"✅ PDF loaded from MongoDB successfully")
@@ -94,6 +203,117 @@ class PDFService:
             print(f"❌ Error loading PDF from MongoDB: {e}")
             return False
     
+    def cache_current_document(self) -> None:
+        """Cache the current document under the version currently stored in GridFS"""
+        if not self.current_document:
+            return
+        
+        document_id = self.current_document.document_id
+        version = self._get_storage_service().get_file_version(document_id)
+        if version:
+            self.document_cache.put(self.current_document, version)
+        else:
+            self.document_cache.invalidate(document_id)
+    
+    def ensure_pages_extracted(self, page_nums: Iterable[int],
+                               pdf_document: Optional[PDFDocument] = None) -> bool:
+        """Extract elements for any of the given pages not extracted yet.
+        
+        Extracted pages are memoized on the PDFDocument, which the document
+        cache keeps per file version, and stored as per-page documents so
+        other workers and later loads only read them back.
+        """
+        pdf_document = pdf_document or self.current_document
+        if not pdf_document:
+            return False
+        
+        wanted = sorted({p for p in page_nums if 0 <= p < pdf_document.page_count})
+        if not all(p in pdf_document.extracted_pages for p in wanted):
+            with _extraction_lock(pdf_document.document_id):
+                missing = [p for p in wanted if p not in pdf_document.extracted_pages]
+                if missing:
+                    try:
+                        self._extract_pages(pdf_document, missing)
+                    except Exception as e:
+                        print(f"❌ Error extracting pages {missing}: {e}")
+                        return False
+        return True
+    
+    def _extract_pages(self, pdf_document: PDFDocument, page_nums: List[int]) -> None:
+        """Load stored page elements, or extract, memoize and persist pages not stored yet"""
+        storage_service = self._get_storage_service()
+        wanted = page_nums
+        
+        text_elements, images, loaded = storage_service.get_page_elements(pdf_document.document_id, page_nums)
+        if loaded:
+            self._add_page_elements(pdf_document, loaded, text_elements, images)
+            page_nums = [p for p in page_nums if p not in loaded]
+        
+        if page_nums:
+            print(f"📄 Extracting pages {page_nums} of {pdf_document.document_id}")
+            with self._borrow_document(pdf_document.document_id) as (pdf_doc, file_id):
+                # Parallel workers share the buffer the pooled document was opened from
+                text_elements, images = self._extract_elements(
+                    pdf_doc, page_nums,
+                    lambda: self.document_pool.get_bytes(file_id) or storage_service.retrieve_pdf_file(file_id)
+                )
+            self._add_page_elements(pdf_document, page_nums, text_elements, images)
+            storage_service.append_page_elements(pdf_document, page_nums, text_elements, images)
+        
+        self._replay_edit_journal(pdf_document, wanted)
+        
+        if pdf_document is self.current_document:
+            # Re-measure the cached entry now that it holds more elements
+            self.cache_current_document()
+    
+    def _add_page_elements(self, pdf_document: PDFDocument, page_nums: List[int],
+                           text_elements: TextElementStore, images: List[ImageElement]) -> None:
+        """Memoize the elements of pages on the in-memory document"""
+        pdf_document.text_elements.extend(text_elements)
+        pdf_document.images.extend(images)
+        pdf_document.fonts = sorted(set(pdf_document.fonts) | set(self._extract_fonts(text_elements)))
+        known_colors = {tuple(c['rgb']) for c in pdf_document.colors}
+        pdf_document.colors = pdf_document.colors + [
+            c for c in self._extract_colors(text_elements) if tuple(c['rgb']) not in known_colors
+        ]
+        pdf_document.extracted_pages = sorted(set(pdf_document.extracted_pages) | set(page_nums))
+    
+    def _replay_edit_journal(self, pdf_document: PDFDocument, page_nums: Iterable[int]) -> None:
+        """Apply pending journaled edits to the freshly loaded elements of some pages.
+        
+        Stored and extracted elements reflect the current PDF file only; edits
+        not yet folded into it live in the journal, which is shared by every
+        worker, so they are laid on top whenever pages come into memory.
+        """
+        pages = set(page_nums)
+        if not pages:
+            return
+        
+        for entry in self._get_storage_service().get_edit_journal(pdf_document.document_id):
+            if self._page_of_element_id(entry['element_id']) not in pages:
+                continue
+            element = pdf_document.text_elements.find(entry['element_id'])
+            if element:
+                self._update_element(element, entry['new_text'], entry['new_font_size'], entry['new_color'])
+    
+    def prefetch_pages(self, page_nums: Iterable[int]) -> None:
+        """Extract pages in the background so later page requests find them ready"""
+        pdf_document = self.current_document
+        if not pdf_document:
+            return
+        
+        pending = [p for p in page_nums
+                   if 0 <= p < pdf_document.page_count and p not in pdf_document.extracted_pages]
+        if pending:
+            _prefetch_executor.submit(self._prefetch, pending, pdf_document)
+    
+    def _prefetch(self, page_nums: List[int], pdf_document: PDFDocument) -> None:
+        try:
+            with self.document_locks.read(pdf_document.document_id):
+                self.ensure_pages_extracted(page_nums, pdf_document)
+        except DocumentLockTimeout as e:
+            print(f"⚠️ Skipping prefetch: {e}")
+    
     def load_pdf(self, file_path: str) -> bool:
         """Load and process a PDF file from local filesystem"""
         try:
@@ -105,8 +325,7 @@ class PDFService:
             pdf_doc = fitz.open(file_path)
             
             # Extract elements
-            text_elements = self._extract_text_elements(pdf_doc)
-            images = self._extract_images(pdf_doc)
+            text_elements, images = self._extract_elements(pdf_doc)
             fonts = self._extract_fonts(text_elements)
             colors = self._extract_colors(text_elements)
             
@@ -126,7 +345,8 @@ class PDFService:
                 colors=colors,
                 metadata=self._extract_metadata(pdf_doc),
                 created_at=datetime.now(),
-                updated_at=datetime.now()
+                updated_at=datetime.now(),
+                extracted_pages=list(range(len(pdf_doc)))
             )
             
             pdf_doc.close()
@@ -136,99 +356,22 @@ class PDFService:
             print(f"Error loading PDF: {e}")
             return False
     
-    def _extract_text_elements(self, pdf_doc) -> List[TextElement]:
-        """Extract all text elements from PDF"""
-        text_elements = []
-        
-        for page_num in range(len(pdf_doc)):
-            page = pdf_doc[page_num]
-            blocks = page.get_text("dict")
-            
-            for block_num, block in enumerate(blocks["blocks"]):
-                if "lines" not in block:
-                    continue
-                
-                for line_num, line in enumerate(block["lines"]):
-                    for word_num, word in enumerate(line["spans"]):
-                        color = word.get("color", 0)
-                        rgb_color = (
-                            (color >> 16) & 255,
-                            (color >> 8) & 255,
-                            color & 255
-                        )
-                        
-                        element_id = f"p{page_num}_b{block_num}_l{line_num}_w{word_num}"
-                        
-                        # Ensure bbox is a list, not a Rect object
-                        bbox = word["bbox"]
-                        if hasattr(bbox, '__iter__') and not isinstance(bbox, (str, bytes)):
-                            bbox = list(bbox)
-                        else:
-                            bbox = [0, 0, 0, 0]  # fallback
-                        
-                        text_element = TextElement(
-                            text=word["text"],
-                            bbox=tuple(bbox),
-                            font_name=word["font"],
-                            font_size=word["size"],
-                            font_flags=word["flags"],
-                            color=rgb_color,
-                            page_num=page_num,
-                            block_num=block_num,
-                            line_num=line_num,
-                            word_num=word_num,
-                            element_id=element_id
-                        )
-                        
-                        text_elements.append(text_element)
+    def _extract_elements(self, pdf_doc, page_nums: Optional[Iterable[int]] = None,
+                          pdf_data_loader=None) -> Tuple[TextElementStore, List[ImageElement]]:
+        """Extract text elements and images from the given pages (all pages by default).
+        Large page sets are spread over worker processes when pdf_data_loader is given.
+        """
+        if page_nums is None:
+            page_nums = range(len(pdf_doc))
         
-        return text_elements
-    
-    def _extract_images(self, pdf_doc) -> List[ImageElement]:
-        """Extract all images from PDF"""
+        text_elements = TextElementStore()
         images = []
+        for page_result in extract_pages(pdf_doc, page_nums, pdf_data_loader):
+            images.extend(build_elements(page_result, text_elements))
         
-        for page_num in range(len(pdf_doc)):
-            page = pdf_doc[page_num]
-            image_list = page.get_images()
-            
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                pix = fitz.Pixmap(pdf_doc, xref)
-                
-                if pix.n - pix.alpha < 4:  # GRAY or RGB
-                    img_data = pix.tobytes("png")
-                    img_b64 = base64.b64encode(img_data).decode()
-                    
-                # Get image rectangle and normalize to tuple[float, float, float, float]
-                rects = page.get_image_rects(xref)
-                if rects:
-                    r = rects[0]
-                    try:
-                        bbox = (float(r.x0), float(r.y0), float(r.x1), float(r.y1))
-                    except Exception:
-                        # Fallback if attributes unavailable
-                        bbox = tuple(map(float, list(r))) if hasattr(r, '__iter__') else (0.0, 0.0, 100.0, 100.0)
-                else:
-                    bbox = (0.0, 0.0, 100.0, 100.0)
-                    
-                    image_element = ImageElement(
-                        image_id=f"img_{page_num}_{img_index}",
-                        page=page_num,
-                        bbox=bbox,
-                        data=img_b64,
-                        xref=xref,
-                        width=pix.width,
-                        height=pix.height
-                    )
-                    
-                    images.append(image_element)
-                
-                pix = None
-        
-        return images
+        return text_elements, images
     
-    def _extract_fonts(self, text_elements: List[TextElement]) -> List[str]:
+    def _extract_fonts(self, text_elements: TextElementStore) -> List[str]:
         """Extract unique fonts from text elements"""
         fonts = set()
         
@@ -243,7 +386,7 @@ class PDFService:
         
         return list(fonts)
     
-    def _extract_colors(self, text_elements: List[TextElement]) -> List[Dict[str, Any]]:
+    def _extract_colors(self, text_elements: TextElementStore) -> List[Dict[str, Any]]:
         """Extract unique colors from text elements"""
         colors = set()
         
@@ -266,184 +409,559 @@ class PDFService:
             'modification_date': metadata.get('modDate', '')
         }
     
-    def get_page_image(self, page_num: int, zoom: float = 1.5) -> Optional[str]:
-        """Get page as base64 encoded image"""
+    def update_text_element(self, element_id: str, new_text: str, 
+                          new_font_size: Optional[float] = None, 
+                          new_color: Optional[Tuple[int, int, int]] = None) -> bool:
+        """Update a text element in the PDF"""
+        results = self.apply_text_edits([{
+            'element_id': element_id,
+            'new_text': new_text,
+            'new_font_size': new_font_size,
+            'new_color': new_color
+        }])
+        return bool(results) and results[0]['success']
+    
+    def apply_text_edits(self, edits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Record several text edits in the document's edit journal.
+        
+        Each edit is a dict with element_id, new_text and optional new_font_size
+        and new_color. Edits are checked against the extracted elements,
+        applied to them in memory and appended to the journal with one small
+        write; the PDF is rewritten later, once for all pending edits, when it
+        is next read (see materialize) or by the journal compactor. Returns
+        one result dict per edit, in input order. Holds the document's write
+        lock, so concurrent edits on one document are journaled in turn;
+        raises DocumentLockTimeout.
+        """
         if not self.current_document:
-            return None
+            return [{'element_id': edit.get('element_id'), 'success': False,
+                     'error': 'No PDF loaded'} for edit in edits]
         
+        with self.document_locks.write(self.current_document.document_id):
+            return self._journal_text_edits(edits)
+    
+    def _journal_text_edits(self, edits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = []
+        entries = []
+        applied = []
         try:
-            pdf_doc = fitz.open(self.current_document.file_path)
-            page = pdf_doc[page_num]
-            mat = fitz.Matrix(zoom, zoom)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            pdf_doc.close()
-            return base64.b64encode(img_data).decode()
+            self.ensure_pages_extracted(
+                page for page in map(self._page_of_element_id, (e.get('element_id') for e in edits))
+                if page is not None
+            )
+            text_elements = self.current_document.text_elements
+            
+            for edit in edits:
+                element_id = edit.get('element_id')
+                element = text_elements.find(element_id)
+                if not element or edit.get('new_text') is None:
+                    print(f"[PDFService] element not found: {element_id}")
+                    results.append({'element_id': element_id, 'success': False,
+                                    'error': 'Element not found' if not element else 'Missing new_text'})
+                    continue
+                
+                # Previous values make the entry undoable until it is folded into the PDF
+                entry = {
+                    'element_id': element_id,
+                    'new_text': edit['new_text'],
+                    'new_font_size': edit.get('new_font_size'),
+                    'new_color': list(edit['new_color']) if edit.get('new_color') else None,
+                    'old_text': element.text,
+                    'old_font_size': element.font_size,
+                    'old_color': list(element.color)
+                }
+                self._update_element(element, entry['new_text'], entry['new_font_size'], entry['new_color'])
+                entries.append(entry)
+                applied.append(element)
+                results.append({'element_id': element_id, 'success': True})
+            
+            if entries and not self._get_storage_service().append_edit_journal(
+                    self.current_document.document_id, entries):
+                raise Exception('Failed to record edits')
+            
+            print(f"📝 Journaled {len(entries)}/{len(edits)} text edits")
+            return results
+        
         except Exception as e:
-            print(f"Error getting page image: {e}")
+            print(f"❌ Error updating text: {e}")
+            # Put the in-memory elements back the way the journal has them
+            for element, entry in reversed(list(zip(applied, entries))):
+                self._update_element(element, entry['old_text'], entry['old_font_size'], entry['old_color'])
+            return self._fail_results(edits, str(e))
+    
+    def undo_last_edit(self) -> Optional[str]:
+        """Drop the newest journaled edit not yet written into the PDF; returns its element_id"""
+        if not self.current_document:
             return None
+        
+        with self.document_locks.write(self.current_document.document_id):
+            entry = self._get_storage_service().pop_edit_journal(self.current_document.document_id)
+            if not entry:
+                return None
+            element = self.current_document.text_elements.find(entry['element_id'])
+            if element:
+                self._update_element(element, entry['old_text'], entry['old_font_size'], entry['old_color'])
+            return entry['element_id']
     
-    def update_text_element(self, element_id: str, new_text: str, 
-                          new_font_size: Optional[float] = None, 
-                          new_color: Optional[Tuple[int, int, int]] = None) -> bool:
-        """Update a text element in the PDF"""
+    def materialize(self) -> Optional[str]:
+        """Write pending journaled edits into a new PDF version; returns the current file_id.
+        
+        Everything that reads the PDF bytes calls this first, so a burst of
+        edits costs one rewrite when the result is next looked at. Without
+        pending edits it is a single read of the document record.
+        """
         if not self.current_document:
-            return False
+            return None
         
-        try:
-            print(f"[PDFService] update_text_element start element_id={element_id}")
-            # Find the element
-            element = None
-            for el in self.current_document.text_elements:
-                if el.element_id == element_id:
-                    element = el
-                    break
-            
-            if not element:
-                print(f"[PDFService] element not found: {element_id}")
+        document_id = self.current_document.document_id
+        storage_service = self._get_storage_service()
+        state = storage_service.get_journal_state(document_id)
+        if not state:
+            return None
+        if not state['pending_edits']:
+            return state['file_id']
+        
+        with self.document_locks.write(document_id):
+            self._fold_journal()
+        return storage_service.get_file_version(document_id)
+    
+    def _fold_journal(self) -> bool:
+        """Write the pending journal into a new version and drop the folded entries"""
+        storage_service = self._get_storage_service()
+        document_id = self.current_document.document_id
+        entries = storage_service.get_edit_journal(document_id)
+        
+        if entries:
+            # Repeated edits of one element collapse into a single redraw
+            collapsed: Dict[str, Dict[str, Any]] = {}
+            for entry in entries:
+                edit = collapsed.setdefault(entry['element_id'], {
+                    'element_id': entry['element_id'], 'new_font_size': None, 'new_color': None
+                })
+                edit['new_text'] = entry['new_text']
+                if entry['new_font_size']:
+                    edit['new_font_size'] = entry['new_font_size']
+                if entry['new_color']:
+                    edit['new_color'] = entry['new_color']
+            edits = list(collapsed.values())
+            print(f"🗜️ Folding {len(entries)} journaled edits of {len(edits)} elements into {document_id}")
+            _, settled = self._write_text_edits(edits)
+            if not settled:
                 return False
+        
+        storage_service.fold_edit_journal(document_id, entries[-1]['seq'] if entries else 0)
+        return True
+    
+    def _write_text_edits(self, edits: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """Redraw edits on the pooled document and save it as a new version in one cycle.
+        Returns the per-edit results and whether the edits are settled: saved,
+        or impossible to apply. An edit that fails may have drawn part of
+        itself, so the pooled document is then dropped and only the edits that
+        went through are redrawn on a fresh copy and saved. Callers hold the
+        write lock.
+        """
+        # Another worker may have saved a newer version in the meantime
+        if not self.load_pdf_from_mongodb(self.current_document.document_id):
+            return self._fail_results(edits, 'Failed to load PDF'), False
+        
+        results = []
+        try:
+            print(f"[PDFService] write_text_edits start count={len(edits)}")
+            self.ensure_pages_extracted(
+                page for page in map(self._page_of_element_id, (e.get('element_id') for e in edits))
+                if page is not None
+            )
+            text_elements = self.current_document.text_elements
             
-            # Get PDF data from MongoDB
             storage_service = self._get_storage_service()
-            pdf_data = storage_service.retrieve_pdf(self.current_document.document_id)
-            if not pdf_data:
-                print("[PDFService] Failed to retrieve PDF data from MongoDB")
-                return False
+            document_id = self.current_document.document_id
             
-            # Open PDF from bytes
-            pdf_doc = fitz.open(stream=pdf_data, filetype="pdf")
-            page = pdf_doc[element.page_num]
-            
-            # Remove old text by drawing white rectangle
-            rect = fitz.Rect(element.bbox)
-            page.draw_rect(rect, color=(1, 1, 1), fill=(1, 1, 1))
-            
-            # Insert new text
-            font_size = new_font_size if new_font_size else element.font_size
-            color = new_color if new_color else element.color
-            color_fitz = (color[0]/255, color[1]/255, color[2]/255)
-            
-            # Use a built-in font to avoid "need font file or buffer" errors for custom fonts
-            # Common built-ins: "helv" (Helvetica), "tiro", "cour"
-            safe_font = "helv"
-            try:
-                page.insert_text(
-                    (element.bbox[0], element.bbox[1] + font_size),
-                    new_text,
-                    fontsize=font_size,
-                    color=color_fitz,
-                    fontname=safe_font
-                )
-            except Exception:
-                # Fallback: try without specifying fontname (use document default)
-                page.insert_text(
-                    (element.bbox[0], element.bbox[1] + font_size),
-                    new_text,
-                    fontsize=font_size,
-                    color=color_fitz
-                )
+            # Resolve every edit first so rejected ones never touch the document
+            targets = []
+            for edit in edits:
+                element_id = edit.get('element_id')
+                element = text_elements.find(element_id)
+                if not element or edit.get('new_text') is None:
+                    print(f"[PDFService] element not found: {element_id}")
+                    results.append({'element_id': element_id, 'success': False,
+                                    'error': 'Element not found' if not element else 'Missing new_text'})
+                    continue
+                results.append({'element_id': element_id, 'success': True})
+                targets.append((len(results) - 1, element, edit))
             
-            # Update element data in memory
-            element.text = new_text
-            if new_font_size:
-                element.font_size = new_font_size
-            if new_color:
-                element.color = new_color
-            
-            # Save to temporary file (Windows-safe): use mkstemp, close handle before writing
-            import tempfile
-            fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-            try:
-                # Close the low-level FD immediately so PyMuPDF can write the file
-                os.close(fd)
-                pdf_doc.save(temp_path)
-                pdf_doc.close()
-
-                # Read updated PDF data
-                with open(temp_path, 'rb') as f:
-                    updated_pdf_data = f.read()
-            finally:
-                # Clean up temp file if it exists
-                try:
-                    if os.path.exists(temp_path):
-                        os.unlink(temp_path)
-                except Exception:
-                    pass
-            
-            # Update in MongoDB GridFS (replace file and update metadata)
-            if not storage_service.replace_pdf_file(self.current_document.document_id, updated_pdf_data):
-                print("[PDFService] Failed to replace PDF in GridFS")
-                return False
-            storage_service.update_pdf_document(self.current_document.document_id, {'updated_at': datetime.now()})
+            edited_pages = set()
+            while targets:
+                with self._borrow_document(document_id) as (pdf_doc, file_id):
+                    try:
+                        failed = False
+                        for index, element, edit in targets:
+                            try:
+                                self._apply_text_edit(pdf_doc, element, edit['new_text'],
+                                                      edit.get('new_font_size'), edit.get('new_color'))
+                                edited_pages.add(element.page_num)
+                            except Exception as edit_err:
+                                print(f"[PDFService] edit failed for {element.element_id}: {edit_err}")
+                                results[index] = {'element_id': element.element_id, 'success': False,
+                                                  'error': str(edit_err)}
+                                failed = True
+                        
+                        if failed:
+                            # A failed edit may have left marks on the pooled document; drop
+                            # it and redraw only the edits that went through on a fresh copy
+                            self.document_pool.discard(file_id)
+                            targets = [target for target in targets if results[target[0]]['success']]
+                            edited_pages = set()
+                            continue
+                        
+                        # Serialize straight to memory; the writer decides when to compact
+                        updated_pdf_data = self.pdf_writer.serialize(document_id, pdf_doc)
+                        
+                        # Store as a new version, flipped in only if file_id is still current
+                        if not storage_service.replace_pdf_file(document_id, updated_pdf_data, base_file_id=file_id):
+                            print("[PDFService] Failed to replace PDF in GridFS")
+                            # The in-memory elements and pooled document no longer match the stored file
+                            self.document_cache.invalidate(document_id)
+                            self.document_pool.discard(file_id)
+                            return self._fail_results(edits, 'Failed to save PDF'), False
+                        
+                        # The open document already holds the new content; keep it for the next request
+                        new_file_id = storage_service.get_file_version(document_id)
+                        if new_file_id:
+                            self.document_pool.rekey(file_id, new_file_id)
+                        else:
+                            self.document_pool.discard(file_id)
+                    except Exception:
+                        # The pooled document holds edits its file does not
+                        self.document_pool.discard(file_id)
+                        raise
+                break
             
-            print(f"✅ Text element updated successfully: {element_id}")
-            return True
+            if not edited_pages:
+                return results, True
+            
+            self._reextract_pages(sorted(edited_pages))
+            storage_service.update_pdf_document(document_id, {'updated_at': datetime.now()})
+            self.cache_current_document()
+            
+            applied = sum(1 for result in results if result['success'])
+            print(f"✅ Text edits written: {applied}/{len(edits)}")
+            return results, True
             
         except Exception as e:
             print(f"❌ Error updating text: {e}")
             import traceback
             traceback.print_exc()
-            return False
+            if self.current_document:
+                self.document_cache.invalidate(self.current_document.document_id)
+            return self._fail_results(edits, str(e)), False
+    
+    def _reextract_pages(self, page_nums: List[int]) -> List[int]:
+        """Re-read the text layout of edited pages, storing only the pages that changed.
+        
+        Redrawn text is laid out by PyMuPDF, so neighbouring spans can move
+        and merge in ways the in-memory patch does not reflect. Only the given
+        pages are extracted again from the pooled document; a page whose
+        elements differ from those held for it is replaced in memory and its
+        pdf_pages document is rewritten. Element ids are carried over (see
+        _carry_element_ids). Images are untouched by text edits and are not
+        re-read. Returns the pages that changed.
+        
+        The pooled document is returned before the extraction lock is taken:
+        extraction holds that lock while it borrows documents, so taking them
+        in the other order could deadlock.
+        """
+        pdf_document = self.current_document
+        try:
+            text_elements = pdf_document.text_elements
+            changed: Dict[int, TextElementStore] = {}
+            with self._borrow_document(pdf_document.document_id) as (pdf_doc, _):
+                for page_num in page_nums:
+                    if page_num not in pdf_document.extracted_pages:
+                        continue
+                    current = text_elements.page_to_dicts(page_num)
+                    if any(element['font_name'] == 'OCR' for element in current):
+                        # OCR words are not in the text layer; re-reading it would drop them
+                        continue
+                    page_store = TextElementStore()
+                    build_elements(extract_page(pdf_doc, page_num, include_images=False), page_store)
+                    page_store = self._carry_element_ids(current, page_store)
+                    if page_store.to_dicts() != current:
+                        changed[page_num] = page_store
+            if not changed:
+                return []
+            
+            with _extraction_lock(pdf_document.document_id):
+                count_delta = 0
+                for page_num, page_store in changed.items():
+                    count_delta += len(page_store) - len(text_elements.page_rows(page_num))
+                    text_elements.replace_page(page_num, page_store)
+                    pdf_document.fonts = sorted(set(pdf_document.fonts) | set(self._extract_fonts(page_store)))
+                    known_colors = {tuple(c['rgb']) for c in pdf_document.colors}
+                    pdf_document.colors = pdf_document.colors + [
+                        c for c in self._extract_colors(page_store) if tuple(c['rgb']) not in known_colors
+                    ]
+            
+            self._get_storage_service().replace_page_text_elements(pdf_document, changed, count_delta)
+            print(f"🔁 Re-extracted pages {sorted(changed)} of {pdf_document.document_id}")
+            return sorted(changed)
+        except Exception as e:
+            # The file is saved either way; the stored elements just keep their old layout
+            print(f"⚠️ Could not re-extract pages {page_nums}: {e}")
+            return []
+    
+    @staticmethod
+    def _carry_element_ids(previous: List[Dict[str, Any]], page_store: TextElementStore) -> TextElementStore:
+        """Number re-extracted spans so they keep the ids of the elements they continue.
+        
+        A span takes the block/line/word numbers of a held element with the
+        same text whose box it overlaps (edited elements already hold their
+        new text), so ids held by clients survive the new layout. Other spans
+        keep their extracted numbers unless those are taken, and then move to
+        the next free word number on their line.
+        """
+        unclaimed = list(previous)
+        spans = page_store.to_dicts()
+        numbers = []
+        for span in spans:
+            rect = fitz.Rect(span['bbox'])
+            match = next((element for element in unclaimed
+                          if element['text'] == span['text'] and rect.intersects(element['bbox'])), None)
+            if match:
+                unclaimed.remove(match)
+                numbers.append((match['block_num'], match['line_num'], match['word_num']))
+            else:
+                numbers.append(None)
+        
+        taken = {number for number in numbers if number}
+        carried = TextElementStore()
+        for span, number in zip(spans, numbers):
+            if number is None:
+                block_num, line_num, word_num = span['block_num'], span['line_num'], span['word_num']
+                while (block_num, line_num, word_num) in taken:
+                    word_num += 1
+                number = (block_num, line_num, word_num)
+                taken.add(number)
+            span['block_num'], span['line_num'], span['word_num'] = number
+            carried.append(span)
+        return carried
+    
+    def _apply_text_edit(self, pdf_doc, element: TextElement, new_text: str,
+                         new_font_size: Optional[float] = None,
+                         new_color: Optional[Tuple[int, int, int]] = None) -> None:
+        """Redraw one text element on an open document and update it in memory"""
+        page = pdf_doc[element.page_num]
+        
+        # Remove the old glyphs from the content stream. Any glyph touching the
+        # redacted area goes, and span boxes of neighbouring lines overlap, so
+        # only the middle of the span is redacted; images and drawings stay.
+        rect = fitz.Rect(element.bbox)
+        inset = rect.height / 4
+        page.add_redact_annot(fitz.Rect(rect.x0 + 0.5, rect.y0 + inset, rect.x1 - 0.5, rect.y1 - inset),
+                              fill=False)
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE, graphics=fitz.PDF_REDACT_LINE_ART_NONE)
+        
+        # Insert new text
+        font_size = new_font_size if new_font_size else element.font_size
+        color = new_color if new_color else element.color
+        color_fitz = (color[0]/255, color[1]/255, color[2]/255)
+        
+        # Use a built-in font to avoid "need font file or buffer" errors for custom fonts
+        # Common built-ins: "helv" (Helvetica), "tiro", "cour"
+        safe_font = "helv"
+        try:
+            page.insert_text(
+                (element.bbox[0], element.bbox[1] + font_size),
+                new_text,
+                fontsize=font_size,
+                color=color_fitz,
+                fontname=safe_font
+            )
+        except Exception:
+            # Fallback: try without specifying fontname (use document default)
+            page.insert_text(
+                (element.bbox[0], element.bbox[1] + font_size),
+                new_text,
+                fontsize=font_size,
+                color=color_fitz
+            )
+        
+        self._update_element(element, new_text, new_font_size, new_color)
+    
+    @staticmethod
+    def _update_element(element: TextElement, new_text: str, new_font_size: Optional[float] = None,
+                        new_color: Optional[Tuple[int, int, int]] = None) -> None:
+        """Update element data in memory"""
+        element.text = new_text
+        if new_font_size:
+            element.font_size = new_font_size
+        if new_color:
+            element.color = tuple(new_color)
+    
+    @staticmethod
+    def _page_of_element_id(element_id: Optional[str]) -> Optional[int]:
+        """Parse the page number out of an element id like p3_b0_l1_w2"""
+        try:
+            return int(element_id.split('_', 1)[0][1:])
+        except (AttributeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _fail_results(edits: List[Dict[str, Any]], error: str) -> List[Dict[str, Any]]:
+        """Mark every edit in a batch as failed"""
+        return [{'element_id': edit.get('element_id'), 'success': False, 'error': error}
+                for edit in edits]
     
     def search_and_replace(self, search_term: str, replace_with: str) -> int:
         """Search and replace text across the document"""
         if not self.current_document:
             return 0
         
-        replacements = 0
+        # Hold the write lock from matching to saving so no edit slips in between
+        with self.document_locks.write(self.current_document.document_id):
+            return self._search_and_replace(search_term, replace_with)
+    
+    def _search_and_replace(self, search_term: str, replace_with: str) -> int:
+        self.ensure_pages_extracted(range(self.current_document.page_count))
+        edits = [
+            {'element_id': element.element_id,
+             'new_text': element.text.replace(search_term, replace_with)}
+            for element in self.current_document.text_elements
+            if search_term in element.text
+        ]
+        if not edits:
+            return 0
         
-        for element in self.current_document.text_elements:
-            if search_term in element.text:
-                new_text = element.text.replace(search_term, replace_with)
-                if self.update_text_element(element.element_id, new_text):
-                    replacements += 1
+        results = self.apply_text_edits(edits)
+        return sum(1 for result in results if result['success'])
+    
+    def restore_version(self, version: int) -> bool:
+        """Make a retained earlier version of the current document current again"""
+        if not self.current_document:
+            return False
         
-        return replacements
+        document_id = self.current_document.document_id
+        with self.document_locks.write(document_id):
+            # Pending edits become a version of their own rather than being lost
+            if not self._fold_journal():
+                return False
+            if not self._get_storage_service().restore_version(document_id, version):
+                return False
+            # Elements memoized for the replaced version no longer describe the file
+            self.document_cache.invalidate(document_id)
+            if not self.load_pdf_from_mongodb(document_id):
+                return False
+            
+            # Stored pages follow the edited layout; re-read them from the restored file
+            self._reextract_pages(list(self.current_document.extracted_pages))
+            self.cache_current_document()
+            return True
     
-    def extract_text_from_images(self) -> List[Dict[str, Any]]:
+    def extract_text_from_images(self, lang: Optional[str] = None) -> List[Dict[str, Any]]:
         """Extract text from images using OCR"""
         if not self.current_document:
             return []
         
-        ocr_results = []
+        with self.document_locks.read(self.current_document.document_id):
+            self.ensure_pages_extracted(range(self.current_document.page_count))
+            images = [img for img in self.current_document.images if img.data]
         
-        for img in self.current_document.images:
-            try:
-                # Decode base64 image
-                img_data = base64.b64decode(img.data)
-                pil_img = Image.open(io.BytesIO(img_data))
-                
-                # Convert to numpy array for OCR
-                img_array = np.array(pil_img)
-                
-                # Extract text using Tesseract
-                text = pytesseract.image_to_string(img_array)
-                
-                ocr_results.append({
-                    'image_id': img.image_id,
-                    'page': img.page,
-                    'bbox': img.bbox,
-                    'extracted_text': text.strip()
-                })
-            except Exception as e:
-                print(f"OCR error for image {img.image_id}: {e}")
-                continue
+        # Images are OCRed in parallel; repeated images are served from the OCR cache
+        texts = get_ocr_engine().ocr_images([base64.b64decode(img.data) for img in images], lang=lang)
         
-        return ocr_results
+        return [
+            {
+                'image_id': img.image_id,
+                'page': img.page,
+                'bbox': img.bbox,
+                'extracted_text': text
+            }
+            for img, text in zip(images, texts)
+            if text is not None
+        ]
     
-    def save_pdf(self, output_path: str) -> bool:
-        """Save the current PDF document"""
+    def ocr_pages(self, page_nums: Optional[Iterable[int]] = None, dpi: Optional[int] = None,
+                  lang: Optional[str] = None) -> List[Dict[str, Any]]:
+        """OCR whole pages of a scanned document.
+        
+        Pages are rasterized once at the given DPI and recognized in batches
+        across the OCR worker processes. Results are stored per page, so a
+        page is only OCRed once per document and settings. Recognized words
+        are added as text elements to pages that have no text layer.
+        """
         if not self.current_document:
-            return False
+            return []
         
-        try:
-            # Copy current file to output path
-            import shutil
-            shutil.copy2(self.current_document.file_path, output_path)
-            return True
-        except Exception as e:
-            print(f"Error saving PDF: {e}")
-            return False
+        # Rasterize the PDF with any journaled edits written in
+        self.materialize()
+        pdf_document = self.current_document
+        document_id = pdf_document.document_id
+        if page_nums is None:
+            page_nums = range(pdf_document.page_count)
+        pages = sorted({p for p in page_nums if 0 <= p < pdf_document.page_count})
+        with self.document_locks.read(document_id):
+            if not pages or not self.ensure_pages_extracted(pages, pdf_document):
+                return []
+        
+        dpi = dpi or Config.OCR_PAGE_DPI
+        engine = get_ocr_engine()
+        # The DPI already fixes the resolution, so pages are not downscaled again
+        settings = engine.settings(lang=lang, max_dimension=0, dpi=dpi)
+        settings_key = engine.settings_key(settings)
+        storage_service = self._get_storage_service()
+        
+        ocr_results = storage_service.get_page_ocr(document_id, pages, settings_key)
+        missing = [p for p in pages if p not in ocr_results]
+        if missing:
+            print(f"🔤 OCRing {len(missing)} pages of {document_id} at {dpi} DPI")
+        
+        for start in range(0, len(missing), Config.OCR_PAGE_BATCH):
+            batch = missing[start:start + Config.OCR_PAGE_BATCH]
+            matrix = fitz.Matrix(dpi / 72, dpi / 72)
+            with self.document_locks.read(document_id), self._borrow_document(document_id) as (pdf_doc, _):
+                images = [pdf_doc[p].get_pixmap(matrix=matrix, colorspace=fitz.csGRAY).tobytes("png")
+                          for p in batch]
+            
+            for page_num, result in zip(batch, engine.ocr_page_images(images, settings)):
+                if result is None:
+                    continue
+                ocr_results[page_num] = result
+                storage_service.save_page_ocr(document_id, page_num, settings_key, settings, result)
+        
+        page_results = []
+        merged = TextElementStore()
+        merged_pages = []
+        with self.document_locks.write(document_id), _extraction_lock(document_id):
+            for page_num in pages:
+                if page_num not in ocr_results:
+                    continue
+                page_elements = self._ocr_words_to_elements(ocr_results[page_num], page_num, dpi)
+                if not pdf_document.text_elements.page_rows(page_num):
+                    merged.extend(page_elements)
+                    merged_pages.append(page_num)
+                page_results.append({
+                    'page_num': page_num,
+                    'text': ' '.join(page_elements.texts),
+                    'text_elements': page_elements.to_dicts()
+                })
+            
+            if len(merged):
+                pdf_document.text_elements.extend(merged)
+                pdf_document.fonts = sorted(set(pdf_document.fonts) | set(merged.font_names))
+                storage_service.append_page_elements(pdf_document, merged_pages, merged, [], merge_text=True)
+                self.cache_current_document()
+        
+        return page_results
+    
+    @staticmethod
+    def _ocr_words_to_elements(result: Dict[str, Any], page_num: int, dpi: int) -> TextElementStore:
+        """Convert OCR word boxes in page pixels to text elements in PDF points"""
+        scale = 72 / dpi
+        page_elements = TextElementStore()
+        for text, bbox, _, block_num, line_num, word_num in result['words']:
+            x0, y0, x1, y1 = (v * scale for v in bbox)
+            page_elements.append_span(text, (x0, y0, x1, y1), 'OCR', round(y1 - y0, 1), 0, 0,
+                                      page_num, block_num, line_num, word_num)
+        return page_elements
     
     def get_document_info(self) -> Optional[Dict[str, Any]]:
         """Get information about the current document"""
@@ -457,68 +975,251 @@ class PDFService:
             'colors': self.current_document.colors,
             'text_elements_count': len(self.current_document.text_elements),
             'images_count': len(self.current_document.images),
+            'extracted_pages': len(self.current_document.extracted_pages),
             'metadata': self.current_document.metadata,
             'filename': self.current_document.filename,
             'file_size': self.current_document.file_size
         }
     
-    def get_page_image(self, page_num: int, zoom: float = 1.0) -> Optional[str]:
-        """Get a page rendered as a base64 image using data from MongoDB.
-        Expects 0-based page indexes.
+    def get_document_version(self) -> Optional[str]:
+        """Version of the current document's content, journaled edits included.
+        
+        The GridFS file_id, suffixed with the journal position while edits are
+        pending. Nothing is written, so page reads can version their image URLs
+        without folding the journal; whatever serves the bytes materializes.
         """
         if not self.current_document:
             return None
-
-        # Normalize and validate inputs
-        try:
-            if page_num is None or page_num < 0:
-                return None
-            # Sanitize zoom to a reasonable range
-            if zoom is None or zoom <= 0:
-                zoom = 1.0
-            if zoom > 4.0:
-                zoom = 4.0
-        except Exception:
+        
+        state = self._get_storage_service().get_journal_state(self.current_document.document_id)
+        if not state:
             return None
-
+        if not state['pending_edits']:
+            return state['file_id']
+        return f"{state['file_id']}.{state['journal_seq']}"
+    
+    def render_page(self, page_num: int, zoom: float = 1.0, image_format: str = 'png',
+                    file_id: Optional[str] = None) -> Optional[bytes]:
+        """Render a page to PNG, JPEG or WebP bytes, serving repeats from the render cache.
+        Expects 0-based page indexes; file_id pins the version to render.
+        """
+        if not self.current_document or page_num is None or page_num < 0:
+            return None
+        
+        zoom = page_zoom(zoom)
+        document_id = self.current_document.document_id
+        
         try:
-            # Always retrieve fresh PDF bytes from MongoDB GridFS
-            storage_service = self._get_storage_service()
-            pdf_data = storage_service.retrieve_pdf(self.current_document.document_id)
-            if not pdf_data:
-                return None
-
-            pdf_doc = fitz.open(stream=pdf_data, filetype="pdf")
-
-            # Validate page bounds
-            if page_num >= pdf_doc.page_count:
-                pdf_doc.close()
-                return None
-
-            page = pdf_doc[page_num]
-            mat = fitz.Matrix(zoom, zoom)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            pdf_doc.close()
-
-            return f"data:image/png;base64,{base64.b64encode(img_data).decode()}"
-
+            # Serve an earlier render of the same file version if we have one
+            file_id = file_id or self.materialize()
+            if file_id:
+                img_data = self.render_cache.get(document_id, file_id, page_num, zoom, image_format)
+                if img_data:
+                    return img_data
+            
+            with self.document_locks.read(document_id), \
+                    self._borrow_document(document_id, file_id) as (pdf_doc, file_id):
+                # Validate page bounds
+                if page_num >= pdf_doc.page_count:
+                    return None
+                
+                pix = pdf_doc[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                img_data = self._encode_pixmap(pix, image_format)
+            
+            self.render_cache.put(document_id, file_id, page_num, zoom, img_data, image_format)
+            return img_data
+        
+        except DocumentLockTimeout:
+            raise
         except Exception as e:
             print(f"Error rendering page {page_num}: {e}")
             return None
     
-    def get_page_elements(self, page_num: int) -> Dict[str, Any]:
-        """Get all elements for a specific page"""
+    def get_tile_grid(self, page_num: int, zoom: float) -> Optional[Dict[str, Any]]:
+        """Describe the tiles covering a page at a zoom level"""
+        if not self.current_document or page_num is None or page_num < 0:
+            return None
+        
+        zoom = tile_zoom(zoom)
+        tile_size = Config.PDF_TILE_SIZE
+        try:
+            document_id = self.current_document.document_id
+            with self.document_locks.read(document_id), self._borrow_document(document_id) as (pdf_doc, _):
+                if page_num >= pdf_doc.page_count:
+                    return None
+                page_rect = pdf_doc[page_num].rect
+        except DocumentLockTimeout:
+            raise
+        except Exception as e:
+            print(f"Error reading page {page_num} size: {e}")
+            return None
+        
+        width = int(math.ceil(page_rect.width * zoom))
+        height = int(math.ceil(page_rect.height * zoom))
+        return {
+            'page_num': page_num,
+            'zoom': zoom,
+            'tile_size': tile_size,
+            'width': width,
+            'height': height,
+            'columns': -(-width // tile_size),
+            'rows': -(-height // tile_size)
+        }
+    
+    def render_tile(self, page_num: int, zoom: float, x: int, y: int, image_format: str = 'png',
+                    file_id: Optional[str] = None) -> Optional[bytes]:
+        """Render one fixed-size tile of a page at a zoom level.
+        
+        Only the clip rectangle of the tile is rasterized, so the cost of a
+        tile does not grow with the zoom. Tiles on the right and bottom edges
+        are cropped to the page.
+        """
+        if not self.current_document or page_num is None or page_num < 0 or x < 0 or y < 0:
+            return None
+        
+        zoom = tile_zoom(zoom)
+        document_id = self.current_document.document_id
+        
+        try:
+            file_id = file_id or self.materialize()
+            if file_id:
+                img_data = self.render_cache.get(document_id, file_id, page_num, zoom, image_format, (x, y))
+                if img_data:
+                    return img_data
+            
+            with self.document_locks.read(document_id), \
+                    self._borrow_document(document_id, file_id) as (pdf_doc, file_id):
+                if page_num >= pdf_doc.page_count:
+                    return None
+                
+                page = pdf_doc[page_num]
+                span = Config.PDF_TILE_SIZE / zoom  # tile edge in page points
+                page_rect = page.rect
+                clip = fitz.Rect(
+                    page_rect.x0 + x * span, page_rect.y0 + y * span,
+                    page_rect.x0 + (x + 1) * span, page_rect.y0 + (y + 1) * span
+                ) & page_rect
+                if clip.is_empty:
+                    return None
+                
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)
+                img_data = self._encode_pixmap(pix, image_format)
+            
+            self.render_cache.put(document_id, file_id, page_num, zoom, img_data, image_format, (x, y))
+            return img_data
+        
+        except DocumentLockTimeout:
+            raise
+        except Exception as e:
+            print(f"Error rendering tile ({x}, {y}) of page {page_num}: {e}")
+            return None
+    
+    def get_thumbnail_sprite(self, file_id: Optional[str] = None) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Get the JPEG sprite sheet of all page thumbnails and its layout.
+        
+        Sprites are stored per GridFS file, so they are rendered once (normally
+        by the ingestion pipeline right after upload) and then only read, also
+        by documents deduplicated onto the same file.
+        """
+        if not self.current_document:
+            return None
+        
+        document_id = self.current_document.document_id
+        storage_service = self._get_storage_service()
+        file_id = file_id or self.materialize()
+        if not file_id:
+            return None
+        
+        stored = storage_service.get_thumbnails(file_id)
+        if stored:
+            return stored
+        
+        try:
+            with self.document_locks.read(document_id):
+                sprite, layout = self._render_thumbnail_sprite(document_id, file_id)
+        except DocumentLockTimeout:
+            raise
+        except Exception as e:
+            print(f"Error rendering thumbnails: {e}")
+            return None
+        
+        storage_service.store_thumbnails(document_id, file_id, sprite, layout)
+        return sprite, layout
+    
+    def _render_thumbnail_sprite(self, document_id: str, file_id: str) -> Tuple[bytes, Dict[str, Any]]:
+        """Render every page at thumbnail zoom in one document open and pack them into a grid"""
+        zoom = Config.PDF_THUMBNAIL_ZOOM
+        matrix = fitz.Matrix(zoom, zoom)
+        thumbnails = []
+        with self._borrow_document(document_id, file_id) as (pdf_doc, _):
+            for page_num in range(pdf_doc.page_count):
+                pix = pdf_doc[page_num].get_pixmap(matrix=matrix, alpha=False)
+                thumbnails.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+        
+        columns = max(1, min(Config.PDF_THUMBNAIL_COLUMNS, len(thumbnails)))
+        rows = -(-len(thumbnails) // columns)
+        cell_width = max((img.width for img in thumbnails), default=1)
+        cell_height = max((img.height for img in thumbnails), default=1)
+        
+        sheet = Image.new("RGB", (columns * cell_width, rows * cell_height), "white")
+        pages = []
+        for page_num, img in enumerate(thumbnails):
+            x = (page_num % columns) * cell_width
+            y = (page_num // columns) * cell_height
+            sheet.paste(img, (x, y))
+            pages.append({'page_num': page_num, 'x': x, 'y': y, 'width': img.width, 'height': img.height})
+        
+        buffer = io.BytesIO()
+        sheet.save(buffer, format="JPEG", quality=75, optimize=True)
+        layout = {
+            'zoom': zoom,
+            'columns': columns,
+            'cell_width': cell_width,
+            'cell_height': cell_height,
+            'width': sheet.width,
+            'height': sheet.height,
+            'pages': pages
+        }
+        return buffer.getvalue(), layout
+    
+    @staticmethod
+    def _encode_pixmap(pix, image_format: str) -> bytes:
+        """Encode a pixmap; PyMuPDF writes PNG itself, Pillow handles JPEG and WebP"""
+        if image_format == 'png':
+            return pix.tobytes("png")
+        
+        mode = "RGBA" if pix.alpha else "RGB"
+        pil_img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+        if image_format == 'jpeg' and pix.alpha:
+            pil_img = pil_img.convert("RGB")
+        buffer = io.BytesIO()
+        pil_img.save(buffer, format=image_format.upper(), quality=85)
+        return buffer.getvalue()
+    
+    def get_page_image(self, page_num: int, zoom: float = 1.0) -> Optional[str]:
+        """Get a page rendered as a base64 PNG data URL"""
+        img_data = self.render_page(page_num, zoom)
+        if not img_data:
+            return None
+        return f"data:image/png;base64,{base64.b64encode(img_data).decode()}"
+    
+    def get_page_elements(self, page_num: int, prefetch: int = 0) -> Dict[str, Any]:
+        """Get all elements for a specific page, extracting it on first access.
+        With prefetch > 0, that many neighbouring pages on each side are
+        extracted in the background.
+        """
         if not self.current_document:
             return {}
         
-        # Get text elements for this page
-        page_elements = [el.to_dict() for el in self.current_document.text_elements 
-                        if el.page_num == page_num]
+        with self.document_locks.read(self.current_document.document_id):
+            self.ensure_pages_extracted([page_num])
+            
+            # Get text elements and images for this page from the per-page indexes
+            page_elements = self.current_document.text_elements.page_to_dicts(page_num)
+            page_images = [img.to_dict() for img in self.current_document.page_images(page_num)]
         
-        # Get images for this page
-        page_images = [img.to_dict() for img in self.current_document.images 
-                      if img.page == page_num]
+        if prefetch > 0:
+            self.prefetch_pages(range(page_num - prefetch, page_num + prefetch + 1))
         
         return {
             'text_elements': page_elements,
@@ -3,15 +3,43 @@ PDF Storage Service using MongoDB GridFS
 """
 import os
 import base64
+import hashlib
+import io
 import uuid
-from datetime import datetime
-from typing import Optional, Dict, Any, List
-from pymongo import MongoClient
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 import gridfs
 from bson import ObjectId
 
-from models.pdf_models import PDFDocument, TextElement, ImageElement
+from models.pdf_models import PDFDocument, TextElement, TextElementStore, ImageElement
 from utils.database import get_database
+from services.render_cache import get_render_cache
+from services.pdf_writer import get_pdf_writer
+
+# Bytes read from an upload stream per GridFS write (the GridFS chunk size)
+UPLOAD_CHUNK_SIZE = 255 * 1024
+
+# Summary fields computed by MongoDB. Element counts are maintained as pages
+# are stored; records that still embed their elements are counted in place.
+SUMMARY_PROJECTION = {
+    '_id': 0,
+    'document_id': 1,
+    'filename': 1,
+    'file_size': 1,
+    'page_count': 1,
+    'pages': '$page_count',
+    'fonts': 1,
+    'colors': 1,
+    'metadata': 1,
+    'status': 1,
+    'created_at': 1,
+    'updated_at': 1,
+    'text_elements_count': {'$ifNull': ['$text_element_count', {'$size': {'$ifNull': ['$text_elements', []]}}]},
+    'images_count': {'$ifNull': ['$image_count', {'$size': {'$ifNull': ['$images', []]}}]},
+    'extracted_pages': {'$size': {'$ifNull': ['$extracted_pages', []]}}
+}
 
 class PDFStorageService:
     """Service for storing and retrieving PDFs from MongoDB"""
@@ -20,6 +48,13 @@ class PDFStorageService:
         self.db_manager = None
         self.fs = None
         self.collection = None
+        self.jobs_collection = None
+        self.ocr_collection = None
+        self.page_ocr_collection = None
+        self.files_collection = None
+        self.pages_collection = None
+        self.versions_collection = None
+        self.journal_collection = None
         self._initialized = False
         # Don't initialize immediately - wait until first use
     
@@ -32,6 +67,13 @@ class PDFStorageService:
                 if self.db_manager is not None and self.db_manager.db is not None:
                     self.fs = gridfs.GridFS(self.db_manager.db)
                     self.collection = self.db_manager.get_collection('pdf_documents')
+                    self.jobs_collection = self.db_manager.get_collection('pdf_jobs')
+                    self.ocr_collection = self.db_manager.get_collection('pdf_ocr_cache')
+                    self.page_ocr_collection = self.db_manager.get_collection('pdf_page_ocr')
+                    self.files_collection = self.db_manager.get_collection('fs.files')
+                    self.pages_collection = self.db_manager.get_collection('pdf_pages')
+                    self.versions_collection = self.db_manager.get_collection('pdf_versions')
+                    self.journal_collection = self.db_manager.get_collection('pdf_edit_journal')
                     self._initialized = True
                     print("✅ PDFStorageService database initialized successfully")
                     return True
@@ -45,6 +87,21 @@ class PDFStorageService:
     
     def store_pdf(self, file_data: bytes, filename: str, user_id: str = None) -> Dict[str, Any]:
         """Store PDF file in MongoDB GridFS"""
+        return self.store_pdf_stream(io.BytesIO(file_data), filename, user_id)
+    
+    def store_pdf_stream(self, stream, filename: str, user_id: str = None,
+                         keep_data: bool = False) -> Dict[str, Any]:
+        """Stream a PDF into MongoDB GridFS chunk by chunk.
+        
+        The SHA-256 and size are computed while the chunks are written, so the
+        upload is never held in memory here. With keep_data the upload is
+        instead read once into a single bytes object, which is hashed, written
+        and returned as 'file_data', giving the caller that one copy to open
+        the document from. Files are content-addressed: when the same bytes are already
+        stored, that GridFS file is reused (reference counted), the new copy is
+        dropped, and the document it came from is reported so its extracted
+        elements can be reused too.
+        """
         try:
             if not self._ensure_database_initialized():
                 return {'success': False, 'error': 'Database not initialized'}
@@ -53,40 +110,74 @@ class PDFStorageService:
             
             # Generate unique document ID
             document_id = str(uuid.uuid4())
+            hasher = hashlib.sha256()
+            file_size = 0
+            file_data = None
             
-            # Store file in GridFS
-            file_id = self.fs.put(
-                file_data,
+            grid_in = self.fs.new_file(
                 filename=filename,
                 document_id=document_id,
                 user_id=user_id,
-                upload_date=datetime.now()
+                upload_date=datetime.now(),
+                ref_count=1
             )
+            try:
+                if keep_data:
+                    # GridFS reads bytes through a BytesIO sharing the buffer, so this stays one copy
+                    file_data = stream.read()
+                    hasher.update(file_data)
+                    grid_in.write(file_data)
+                    file_size = len(file_data)
+                else:
+                    for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                        hasher.update(chunk)
+                        grid_in.write(chunk)
+                        file_size += len(chunk)
+                file_hash = hasher.hexdigest()
+                grid_in.file_hash = file_hash
+            except Exception:
+                grid_in.abort()
+                raise
+            grid_in.close()
+            file_id = grid_in._id
             
-            print(f"✅ PDF stored in GridFS with ID: {file_id}")
+            source = self._find_document_by_hash(file_hash)
+            if source and self._retain_file(source['file_id']):
+                print(f"♻️ Reusing stored file {source['file_id']} of document {source['document_id']}")
+                self.fs.delete(file_id)
+                file_id = source['file_id']
+            else:
+                source = None
+                print(f"✅ PDF stored in GridFS with ID: {file_id}")
             
             # Store document metadata
             document_metadata = {
                 'document_id': document_id,
                 'file_id': file_id,
+                'file_hash': file_hash,
                 'filename': filename,
-                'file_size': len(file_data),
+                'file_size': file_size,
                 'user_id': user_id,
                 'created_at': datetime.now(),
                 'updated_at': datetime.now(),
                 'status': 'uploaded'
             }
             
-            result = self.collection.insert_one(document_metadata)
-            print(f"✅ Document metadata stored with ID: {result.inserted_id}")
+            inserted = self.collection.insert_one(document_metadata)
+            print(f"✅ Document metadata stored with ID: {inserted.inserted_id}")
             
-            return {
+            result = {
                 'success': True,
                 'document_id': document_id,
                 'file_id': str(file_id),
                 'filename': filename,
-                'file_size': len(file_data)
+                'file_size': file_size,
+                'source_document_id': source['document_id'] if source else None
             }
+            if keep_data:
+                # bytes rather than bytearray: PyMuPDF opens bytes without copying
+                result['file_data'] = file_data
+            return result
             
         except Exception as e:
             print(f"❌ Error storing PDF: {e}")
@@ -95,6 +186,74 @@ class PDFStorageService:
                 'error': str(e)
             }
     
+    def _find_document_by_hash(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """Find a document whose current file has this content hash, preferring processed ones"""
+        for query in ({'file_hash': file_hash, 'status': 'ready'}, {'file_hash': file_hash}):
+            doc = self.collection.find_one(
+                dict(query, file_id={'$exists': True}),
+                {'document_id': 1, 'file_id': 1}
+            )
+            if doc:
+                return doc
+        return None
+    
+    def _retain_file(self, file_id) -> bool:
+        """Take another reference on a stored GridFS file; False if it is gone"""
+        result = self.files_collection.update_one(
+            {'_id': file_id, 'ref_count': {'$gt': 0}},
+            {'$inc': {'ref_count': 1}}
+        )
+        return result.modified_count > 0
+    
+    def _release_file(self, file_id) -> None:
+        """Drop a reference on a GridFS file, deleting it and its thumbnails with the last one"""
+        remaining = self.files_collection.find_one_and_update(
+            {'_id': file_id},
+            {'$inc': {'ref_count': -1}},
+            projection={'ref_count': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if remaining is None or remaining['ref_count'] > 0:
+            return
+        # Files stored before reference counting start without ref_count and go negative here
+        self.fs.delete(file_id)
+        self.delete_thumbnails(str(file_id))
+        print(f"✅ File {file_id} deleted from GridFS")
+    
+    def clone_document(self, source_document_id: str, document_id: str, filename: str) -> bool:
+        """Copy the extracted elements of a document with identical content onto a new upload"""
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            source = self.collection.find_one({'document_id': source_document_id})
+            if not source:
+                return False
+            
+            # Everything describing the file content carries over; identity and history do not
+            skipped = {'_id', 'document_id', 'filename', 'user_id', 'file_id', 'file_hash',
+                       'version', 'journal_seq', 'pending_edits', 'journal_updated_at',
+                       'created_at', 'updated_at', 'stored_at'}
+            cloned = {k: v for k, v in source.items() if k not in skipped}
+            result = self.collection.update_one({'document_id': document_id}, {'$set': cloned})
+            
+            # Page documents are copied; their image blobs are shared by reference
+            pages = []
+            for page in self.pages_collection.find({'document_id': source_document_id}, {'_id': 0}):
+                for img in page['images']:
+                    self._retain_file(img['blob_id'])
+                page['document_id'] = document_id
+                pages.append(page)
+            if pages:
+                self.pages_collection.insert_many(pages)
+            
+            print(f"♻️ Reused elements of {source_document_id} for {document_id}")
+            return result.matched_count > 0
+            
+        except Exception as e:
+            print(f"❌ Error cloning PDF document: {e}")
+            return False
+    
     def retrieve_pdf(self, document_id: str) -> Optional[bytes]:
         """Retrieve PDF file from MongoDB GridFS"""
         try:
@@ -121,15 +280,67 @@ class PDFStorageService:
             print(f"❌ Error retrieving PDF: {e}")
             return None
     
+    def open_pdf_file(self, document_id: str):
+        """Open the current GridFS file of a document for streaming reads, or None"""
+        try:
+            if not self._ensure_database_initialized():
+                return None
+            
+            doc_metadata = self.collection.find_one(
+                {'document_id': document_id, 'file_id': {'$exists': True}},
+                {'file_id': 1}
+            )
+            if not doc_metadata:
+                return None
+            return self.fs.get(doc_metadata['file_id'])
+            
+        except Exception as e:
+            print(f"❌ Error opening PDF file: {e}")
+            return None
+    
+    def retrieve_pdf_file(self, file_id: str) -> Optional[bytes]:
+        """Retrieve a specific PDF file version from GridFS by its file_id"""
+        try:
+            if not self._ensure_database_initialized():
+                print("❌ Database not initialized in retrieve_pdf_file")
+                return None
+            
+            file_data = self.fs.get(ObjectId(file_id)).read()
+            print(f"✅ PDF file {file_id} retrieved, size: {len(file_data)} bytes")
+            return file_data
+            
+        except Exception as e:
+            print(f"❌ Error retrieving PDF file {file_id}: {e}")
+            return None
+    
+    def get_file_version(self, document_id: str) -> Optional[str]:
+        """Return the GridFS file_id currently backing a document, as a string"""
+        try:
+            if not self._ensure_database_initialized():
+                return None
+
+            doc_metadata = self.collection.find_one(
+                {'document_id': document_id, 'file_id': {'$exists': True}},
+                {'file_id': 1}
+            )
+            if not doc_metadata:
+                return None
+            return str(doc_metadata['file_id'])
+
+        except Exception as e:
+            print(f"❌ Error reading file version: {e}")
+            return None
+
     def store_pdf_document(self, pdf_document: PDFDocument, user_id: str = None) -> Dict[str, Any]:
-        """Store or update complete PDF document with all elements.
+        """Store or update the summary record of a PDF document.
         Use upsert to avoid creating a second document without file_id.
+        Elements live in per-page documents; loaded pages are written there.
         """
         try:
             print(f"📄 Storing PDF document in MongoDB: {pdf_document.document_id}")
             
             # Convert to dictionary
-            doc_dict = pdf_document.to_dict()
+            doc_dict = pdf_document.to_summary_dict()
             doc_dict['user_id'] = user_id
             doc_dict['stored_at'] = datetime.now()
             
@@ -141,6 +352,10 @@ class PDFStorageService:
             )
             print(f"✅ PDF document metadata upserted. matched={result.matched_count} upserted_id={result.upserted_id}")
             
+            if pdf_document.extracted_pages:
+                self.append_page_elements(pdf_document, pdf_document.extracted_pages,
+                                          pdf_document.text_elements, pdf_document.images)
+            
             return {
                 'success': True,
                 'document_id': pdf_document.document_id,
@@ -153,6 +368,172 @@ class PDFStorageService:
                 'error': str(e)
             }
     
+    def append_page_elements(self, pdf_document: PDFDocument, page_nums: List[int],
+                             text_elements: TextElementStore, images: List[ImageElement],
+                             merge_text: bool = False) -> bool:
+        """Store the elements of newly extracted pages, one document per page.
+        
+        Image data goes to GridFS and page documents keep its blob id. Pages
+        that already have a document were stored by another extraction and
+        are left alone, unless merge_text is set (OCR words added to a page
+        later): their text elements are then appended, while their images
+        were stored with them, so blobs are only written for pages inserted
+        here. Counts only grow by the elements actually written.
+        """
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            document_id = pdf_document.document_id
+            pages = {page_num: {'text_elements': [], 'images': []} for page_num in page_nums}
+            page_images: Dict[int, List[ImageElement]] = {}
+            for element in text_elements.to_dicts():
+                pages.setdefault(element['page_num'], {'text_elements': [], 'images': []})['text_elements'].append(element)
+            for img in images:
+                pages.setdefault(img.page, {'text_elements': [], 'images': []})
+                page_images.setdefault(img.page, []).append(img)
+            
+            existing = set(self.pages_collection.distinct(
+                'page_num', {'document_id': document_id, 'page_num': {'$in': list(pages)}}
+            ))
+            if not merge_text:
+                # Another extraction stored these pages already; theirs are equivalent
+                for page_num in existing:
+                    del pages[page_num]
+                existing = set()
+            new_pages = []
+            for page_num, elements in pages.items():
+                if page_num in existing:
+                    continue
+                elements['images'] = [self._store_image_blob(document_id, img)
+                                      for img in page_images.get(page_num, [])]
+                new_pages.append(dict(elements, document_id=document_id, page_num=page_num,
+                                      created_at=datetime.now()))
+            if new_pages:
+                try:
+                    self.pages_collection.insert_many(new_pages, ordered=False)
+                except BulkWriteError as bwe:
+                    # Another worker stored the same page first; theirs is equivalent
+                    errors = bwe.details.get('writeErrors', [])
+                    if any(err['code'] != 11000 for err in errors):
+                        raise
+                    for err in errors:
+                        duplicate = pages.pop(new_pages[err['index']]['page_num'])
+                        for entry in duplicate['images']:
+                            self._release_file(entry['blob_id'])
+            for page_num in existing:
+                elements = pages[page_num]
+                if elements['text_elements']:
+                    self.pages_collection.update_one(
+                        {'document_id': document_id, 'page_num': page_num},
+                        {'$push': {'text_elements': {'$each': elements['text_elements']}}}
+                    )
+            
+            self.collection.update_one(
+                {'document_id': document_id},
+                {
+                    '$addToSet': {'extracted_pages': {'$each': list(page_nums)}},
+                    '$set': {'fonts': pdf_document.fonts, 'colors': pdf_document.colors},
+                    '$inc': {
+                        'text_element_count': sum(len(e['text_elements']) for e in pages.values()),
+                        'image_count': sum(len(e['images']) for e in pages.values())
+                    }
+                }
+            )
+            print(f"✅ Stored elements for pages {page_nums} of {document_id}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error appending page elements: {e}")
+            return False
+    
+    def replace_page_text_elements(self, pdf_document: PDFDocument,
+                                   pages: Dict[int, TextElementStore], count_delta: int) -> bool:
+        """Overwrite the text elements of re-extracted pages, leaving their images alone"""
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            document_id = pdf_document.document_id
+            self.pages_collection.bulk_write([
+                UpdateOne({'document_id': document_id, 'page_num': page_num},
+                          {'$set': {'text_elements': page_store.to_dicts()}})
+                for page_num, page_store in pages.items()
+            ], ordered=False)
+            self.collection.update_one(
+                {'document_id': document_id},
+                {
+                    '$set': {'fonts': pdf_document.fonts, 'colors': pdf_document.colors},
+                    '$inc': {'text_element_count': count_delta}
+                }
+            )
+            print(f"✅ Stored re-extracted pages {sorted(pages)} of {document_id}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error replacing page elements: {e}")
+            return False
+    
+    def _store_image_blob(self, document_id: str, img: ImageElement) -> Dict[str, Any]:
+        """Move an image's data into GridFS, returning its page-document entry"""
+        blob_id = self.fs.put(
+            base64.b64decode(img.data),
+            filename=f"{img.image_id}.{img.format}",
+            kind='page_image',
+            document_id=document_id,
+            content_type=f"image/{img.format}",
+            ref_count=1
+        )
+        entry = img.to_dict()
+        del entry['data']
+        entry['blob_id'] = blob_id
+        return entry
+    
+    def get_page_elements(self, document_id: str,
+                          page_nums: List[int]) -> Tuple[TextElementStore, List[ImageElement], List[int]]:
+        """Load stored page documents; returns their elements and the pages found"""
+        text_elements = TextElementStore()
+        images = []
+        loaded = []
+        try:
+            if not page_nums or not self._ensure_database_initialized():
+                return text_elements, images, loaded
+            
+            cursor = self.pages_collection.find(
+                {'document_id': document_id, 'page_num': {'$in': list(page_nums)}},
+                {'_id': 0}
+            ).sort('page_num', 1)
+            for page in cursor:
+                text_elements.extend(page['text_elements'])
+                for entry in page['images']:
+                    blob_id = entry.pop('blob_id')
+                    entry['bbox'] = tuple(entry['bbox'])
+                    entry['data'] = base64.b64encode(self.fs.get(blob_id).read()).decode()
+                    images.append(ImageElement.from_dict(entry))
+                loaded.append(page['page_num'])
+            
+        except Exception as e:
+            print(f"❌ Error loading page elements: {e}")
+            return TextElementStore(), [], []
+        return text_elements, images, loaded
+    
+    def get_document_summary(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Read a document's summary and element counts without loading any elements"""
+        try:
+            if not self._ensure_database_initialized():
+                return None
+            
+            summaries = list(self.collection.aggregate([
+                {'$match': {'document_id': document_id, 'file_id': {'$exists': True}}},
+                {'$limit': 1},
+                {'$project': SUMMARY_PROJECTION}
+            ]))
+            return summaries[0] if summaries else None
+            
+        except Exception as e:
+            print(f"❌ Error reading document summary: {e}")
+            return None
+    
     def get_pdf_document(self, document_id: str) -> Optional[PDFDocument]:
         """Retrieve PDF document from MongoDB"""
         try:
@@ -171,6 +552,10 @@ class PDFStorageService:
             if '_id' in doc_data:
                 doc_data['_id'] = str(doc_data['_id'])
             
+            if 'text_elements' not in doc_data:
+                # Summary record: pages are loaded from pdf_pages as they are needed
+                doc_data['extracted_pages'] = []
+            
             # Convert to PDFDocument object
             pdf_document = PDFDocument.from_dict(doc_data)
             print(f"✅ PDF document retrieved successfully")
@@ -202,44 +587,44 @@ class PDFStorageService:
             print(f"❌ Error updating PDF document: {e}")
             return False
 
-    def replace_pdf_file(self, document_id: str, new_file_bytes: bytes) -> bool:
-        """Replace the PDF file in GridFS and update metadata with new file size and file_id."""
+    def replace_pdf_file(self, document_id: str, new_file_bytes: bytes,
+                         base_file_id: Optional[str] = None) -> bool:
+        """Store an edited PDF as a new version and make it current.
+        
+        Versions are copy-on-write: the new file is written first and the
+        document's file_id is then flipped in one update, so readers always
+        find a complete file. The superseded file is kept as a version for
+        undo and reclaimed later by the version collector. With base_file_id
+        the flip only happens if that file is still current, so concurrent
+        edits from other workers are never silently overwritten.
+        """
         try:
             if not self._ensure_database_initialized():
                 print("❌ Database not initialized in replace_pdf_file")
                 return False
 
-            doc = self.collection.find_one({'document_id': document_id})
+            doc = self.collection.find_one({'document_id': document_id}, {'filename': 1, 'user_id': 1})
             if not doc:
                 print(f"❌ Document metadata not found for replace: {document_id}")
                 return False
 
-            # Delete old file if exists
-            if 'file_id' in doc and doc['file_id']:
-                try:
-                    self.fs.delete(doc['file_id'])
-                except Exception as del_err:
-                    print(f"⚠️ Could not delete old GridFS file: {del_err}")
-
             # Store new file
+            file_hash = hashlib.sha256(new_file_bytes).hexdigest()
             new_file_id = self.fs.put(
                 new_file_bytes,
                 filename=doc.get('filename', f"{document_id}.pdf"),
                 document_id=document_id,
                 user_id=doc.get('user_id'),
-                upload_date=datetime.now()
+                upload_date=datetime.now(),
+                file_hash=file_hash,
+                ref_count=1
             )
 
-            # Update metadata
-            self.collection.update_one(
-                {'document_id': document_id},
-                {'$set': {
-                    'file_id': new_file_id,
-                    'file_size': len(new_file_bytes),
-                    'updated_at': datetime.now(),
-                    'status': 'updated'
-                }}
-            )
+            if not self._set_current_file(document_id, new_file_id, file_hash,
+                                          len(new_file_bytes), base_file_id):
+                self.fs.delete(new_file_id)
+                print(f"❌ {document_id} changed while it was being edited; new version dropped")
+                return False
 
             print(f"✅ Replaced PDF file in GridFS for {document_id}")
             return True
@@ -247,6 +632,385 @@ class PDFStorageService:
             print(f"❌ Error replacing PDF file: {e}")
             return False
     
+    def restore_version(self, document_id: str, version: int) -> bool:
+        """Make a retained version's file current again; the current file becomes a version"""
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            record = self.versions_collection.find_one({'document_id': document_id, 'version': version})
+            # The pointer takes its own reference, so collecting the record later is harmless
+            if not record or not self._retain_file(record['file_id']):
+                print(f"❌ Version {version} of {document_id} is not available")
+                return False
+            
+            if not self._set_current_file(document_id, record['file_id'], record.get('file_hash'),
+                                          record.get('file_size')):
+                self._release_file(record['file_id'])
+                return False
+            
+            print(f"↩️ Restored version {version} of {document_id}")
+            return True
+        except Exception as e:
+            print(f"❌ Error restoring version: {e}")
+            return False
+    
+    def _set_current_file(self, document_id: str, file_id, file_hash: Optional[str],
+                          file_size: Optional[int], base_file_id: Optional[str] = None) -> bool:
+        """Atomically point a document at a GridFS file, keeping the old one as a version"""
+        query = {'document_id': document_id}
+        if base_file_id:
+            query['file_id'] = ObjectId(base_file_id)
+        
+        now = datetime.now()
+        previous = self.collection.find_one_and_update(
+            query,
+            {'$set': {
+                'file_id': file_id,
+                'file_hash': file_hash,
+                'file_size': file_size,
+                'updated_at': now,
+                'status': 'updated'
+            }, '$inc': {'version': 1}},
+            projection={'file_id': 1, 'file_hash': 1, 'file_size': 1, 'version': 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous is None:
+            return False
+        
+        # The version record inherits the document's reference on the old file
+        if previous.get('file_id'):
+            try:
+                self.versions_collection.insert_one({
+                    'document_id': document_id,
+                    'version': previous.get('version', 0),
+                    'file_id': previous['file_id'],
+                    'file_hash': previous.get('file_hash'),
+                    'file_size': previous.get('file_size'),
+                    'superseded_at': now
+                })
+            except Exception as version_err:
+                print(f"⚠️ Could not keep previous version, releasing it: {version_err}")
+                self._release_file(previous['file_id'])
+        
+        # Renders of the previous file version can never be served again
+        get_render_cache().invalidate(document_id, keep_file_id=str(file_id))
+        return True
+    
+    def list_versions(self, document_id: str) -> List[Dict[str, Any]]:
+        """List the current and retained versions of a document, newest first"""
+        try:
+            if not self._ensure_database_initialized():
+                return []
+            
+            doc = self.collection.find_one(
+                {'document_id': document_id},
+                {'file_id': 1, 'file_size': 1, 'version': 1, 'updated_at': 1}
+            )
+            if not doc:
+                return []
+            
+            versions = [{
+                'version': doc.get('version', 0),
+                'file_id': str(doc.get('file_id')),
+                'file_size': doc.get('file_size'),
+                'current': True,
+                'updated_at': doc.get('updated_at')
+            }]
+            for record in self.versions_collection.find({'document_id': document_id}).sort('version', -1):
+                versions.append({
+                    'version': record['version'],
+                    'file_id': str(record['file_id']),
+                    'file_size': record.get('file_size'),
+                    'current': False,
+                    'superseded_at': record['superseded_at']
+                })
+            return versions
+        except Exception as e:
+            print(f"❌ Error listing versions: {e}")
+            return []
+    
+    def collect_versions(self, keep: int, max_age: float, min_age: float) -> int:
+        """Reclaim superseded versions outside the retention policy.
+        
+        Each document keeps its newest keep versions, and versions older than
+        max_age seconds are dropped regardless. Nothing younger than min_age
+        seconds is touched, so reads that resolved the old file_id just
+        before a flip can finish. Records are claimed with a delete before
+        their file is released, so concurrent collectors never double-release.
+        """
+        if not self._ensure_database_initialized():
+            return 0
+        
+        now = datetime.now()
+        collected = 0
+        rank: Dict[str, int] = {}
+        cursor = self.versions_collection.find(
+            {}, {'document_id': 1, 'file_id': 1, 'superseded_at': 1}
+        ).sort([('document_id', 1), ('version', -1)])
+        for record in cursor:
+            position = rank[record['document_id']] = rank.get(record['document_id'], 0) + 1
+            age = (now - record['superseded_at']).total_seconds()
+            if age < min_age or (position <= keep and age < max_age):
+                continue
+            if self.versions_collection.find_one_and_delete({'_id': record['_id']}) is None:
+                continue
+            try:
+                self._release_file(record['file_id'])
+            except Exception as release_err:
+                print(f"⚠️ Could not release version file {record['file_id']}: {release_err}")
+            collected += 1
+        
+        if collected:
+            print(f"🧹 Collected {collected} superseded PDF versions")
+        return collected
+    
+    def append_edit_journal(self, document_id: str, entries: List[Dict[str, Any]]) -> bool:
+        """Append text edits to a document's journal.
+        
+        A sequence range is reserved on the document record, which also
+        counts the pending edits so readers see them without querying the
+        journal, and the entries are written with one insert.
+        """
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            now = datetime.now()
+            state = self.collection.find_one_and_update(
+                {'document_id': document_id},
+                {'$inc': {'journal_seq': len(entries), 'pending_edits': len(entries)},
+                 '$set': {'journal_updated_at': now}},
+                projection={'journal_seq': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if state is None:
+                return False
+            
+            first_seq = state['journal_seq'] - len(entries) + 1
+            self.journal_collection.insert_many([
+                dict(entry, document_id=document_id, seq=first_seq + i, created_at=now)
+                for i, entry in enumerate(entries)
+            ])
+            return True
+        except Exception as e:
+            print(f"❌ Error appending to edit journal: {e}")
+            return False
+    
+    def get_journal_state(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Current file_id of a document, its journal position and the number of journaled edits not yet in it"""
+        try:
+            if not self._ensure_database_initialized():
+                return None
+            
+            doc = self.collection.find_one(
+                {'document_id': document_id, 'file_id': {'$exists': True}},
+                {'file_id': 1, 'pending_edits': 1, 'journal_seq': 1}
+            )
+            if not doc:
+                return None
+            return {'file_id': str(doc['file_id']), 'pending_edits': doc.get('pending_edits', 0),
+                    'journal_seq': doc.get('journal_seq', 0)}
+        except Exception as e:
+            print(f"❌ Error reading edit journal state: {e}")
+            return None
+    
+    def get_edit_journal(self, document_id: str) -> List[Dict[str, Any]]:
+        """Pending journaled edits of a document in the order they were made"""
+        try:
+            if not self._ensure_database_initialized():
+                return []
+            return list(self.journal_collection.find({'document_id': document_id}, {'_id': 0}).sort('seq', 1))
+        except Exception as e:
+            print(f"❌ Error reading edit journal: {e}")
+            return []
+    
+    def fold_edit_journal(self, document_id: str, upto_seq: int) -> None:
+        """Drop journal entries written into the current file.
+        
+        The pending count is decremented rather than recounted: an append
+        bumps it before inserting its entries, so a recount could miss them.
+        """
+        result = self.journal_collection.delete_many({'document_id': document_id, 'seq': {'$lte': upto_seq}})
+        if result.deleted_count:
+            self.collection.update_one({'document_id': document_id},
+                                       {'$inc': {'pending_edits': -result.deleted_count}})
+    
+    def pop_edit_journal(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Remove and return the newest pending journaled edit, or None.
+        
+        The journal position advances as for an append, so versions derived
+        from it (see PDFService.get_document_version) change on undo too.
+        """
+        try:
+            if not self._ensure_database_initialized():
+                return None
+            
+            entry = self.journal_collection.find_one_and_delete(
+                {'document_id': document_id}, sort=[('seq', -1)]
+            )
+            if entry:
+                entry.pop('_id', None)
+                self.collection.update_one({'document_id': document_id},
+                                           {'$inc': {'pending_edits': -1, 'journal_seq': 1}})
+            return entry
+        except Exception as e:
+            print(f"❌ Error undoing journaled edit: {e}")
+            return None
+    
+    def find_pending_journals(self, idle_seconds: float) -> List[str]:
+        """Documents with journaled edits that have not been edited for idle_seconds"""
+        if not self._ensure_database_initialized():
+            return []
+        
+        cutoff = datetime.now() - timedelta(seconds=idle_seconds)
+        return [doc['document_id'] for doc in self.collection.find(
+            {'pending_edits': {'$gt': 0}, 'journal_updated_at': {'$lt': cutoff}},
+            {'document_id': 1}
+        )]
+    
+    def store_thumbnails(self, document_id: str, file_id: str, sprite: bytes,
+                         layout: Dict[str, Any]) -> bool:
+        """Store the thumbnail sprite sheet rendered from one file version"""
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            self.fs.put(
+                sprite,
+                filename=f"{document_id}_thumbnails",
+                kind='thumbnails',
+                document_id=document_id,
+                source_file_id=file_id,
+                layout=layout,
+                upload_date=datetime.now()
+            )
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error storing thumbnails: {e}")
+            return False
+    
+    def get_thumbnails(self, file_id: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Retrieve the thumbnail sprite sheet and layout of a file version"""
+        try:
+            if not self._ensure_database_initialized():
+                return None
+            
+            grid_out = self.fs.find_one({'kind': 'thumbnails', 'source_file_id': file_id})
+            if grid_out is None:
+                return None
+            return grid_out.read(), grid_out.layout
+            
+        except Exception as e:
+            print(f"❌ Error retrieving thumbnails: {e}")
+            return None
+    
+    def delete_thumbnails(self, file_id: str) -> None:
+        """Delete the thumbnail sprite sheets rendered from a file version"""
+        try:
+            if not self._ensure_database_initialized():
+                return
+            
+            for grid_out in self.fs.find({'kind': 'thumbnails', 'source_file_id': file_id}):
+                self.fs.delete(grid_out._id)
+                    
+        except Exception as e:
+            print(f"⚠️ Could not delete thumbnails: {e}")
+    
+    def save_ingest_job(self, job_data: Dict[str, Any]) -> bool:
+        """Insert or update the status record of an ingestion job"""
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            self.jobs_collection.update_one(
+                {'job_id': job_data['job_id']},
+                {'$set': job_data},
+                upsert=True
+            )
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error saving ingest job: {e}")
+            return False
+    
+    def get_ingest_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the status record of an ingestion job"""
+        try:
+            if not self._ensure_database_initialized():
+                return None
+            
+            return self.jobs_collection.find_one({'job_id': job_id}, {'_id': 0})
+            
+        except Exception as e:
+            print(f"❌ Error retrieving ingest job: {e}")
+            return None
+    
+    def get_ocr_results(self, keys: List[str]) -> Dict[str, Any]:
+        """Retrieve cached OCR results for the given cache keys"""
+        try:
+            if not keys or not self._ensure_database_initialized():
+                return {}
+            
+            cursor = self.ocr_collection.find({'key': {'$in': keys}}, {'_id': 0, 'key': 1, 'result': 1})
+            return {doc['key']: doc['result'] for doc in cursor}
+            
+        except Exception as e:
+            print(f"❌ Error retrieving OCR results: {e}")
+            return {}
+    
+    def save_ocr_result(self, key: str, result: Any) -> bool:
+        """Store an OCR result under its cache key"""
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            self.ocr_collection.update_one(
+                {'key': key},
+                {'$set': {'key': key, 'result': result, 'created_at': datetime.now()}},
+                upsert=True
+            )
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error saving OCR result: {e}")
+            return False
+    
+    def get_page_ocr(self, document_id: str, page_nums: List[int], settings_key: str) -> Dict[int, Dict[str, Any]]:
+        """Retrieve stored full-page OCR results, keyed by page number"""
+        try:
+            if not page_nums or not self._ensure_database_initialized():
+                return {}
+            
+            cursor = self.page_ocr_collection.find(
+                {'document_id': document_id, 'settings_key': settings_key, 'page_num': {'$in': list(page_nums)}},
+                {'_id': 0, 'page_num': 1, 'result': 1}
+            )
+            return {doc['page_num']: doc['result'] for doc in cursor}
+            
+        except Exception as e:
+            print(f"❌ Error retrieving page OCR: {e}")
+            return {}
+    
+    def save_page_ocr(self, document_id: str, page_num: int, settings_key: str,
+                      settings: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """Store the full-page OCR result of one page"""
+        try:
+            if not self._ensure_database_initialized():
+                return False
+            
+            self.page_ocr_collection.update_one(
+                {'document_id': document_id, 'page_num': page_num, 'settings_key': settings_key},
+                {'$set': {'settings': settings, 'result': result, 'created_at': datetime.now()}},
+                upsert=True
+            )
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error saving page OCR: {e}")
+            return False
+    
     def delete_pdf_document(self, document_id: str) -> bool:
         """Delete PDF document from MongoDB"""
         try:
@@ -258,10 +1022,23 @@ class PDFStorageService:
                 print(f"❌ Document not found: {document_id}")
                 return False
             
-            # Delete from GridFS
+            # Release the GridFS file and retained versions; files are deleted once nothing uses them
             if 'file_id' in doc_metadata:
-                self.fs.delete(doc_metadata['file_id'])
-                print(f"✅ File deleted from GridFS")
+                self._release_file(doc_metadata['file_id'])
+            for record in self.versions_collection.find({'document_id': document_id}, {'file_id': 1}):
+                self._release_file(record['file_id'])
+            self.versions_collection.delete_many({'document_id': document_id})
+            self.journal_collection.delete_many({'document_id': document_id})
+            
+            # Page documents and their image blobs
+            for page in self.pages_collection.find({'document_id': document_id}, {'images.blob_id': 1}):
+                for img in page.get('images', []):
+                    self._release_file(img['blob_id'])
+            self.pages_collection.delete_many({'document_id': document_id})
+            
+            get_render_cache().invalidate(document_id)
+            get_pdf_writer().forget(document_id)
+            self.page_ocr_collection.delete_many({'document_id': document_id})
             
             # Delete metadata
             result = self.collection.delete_one({'document_id': document_id})
@@ -281,15 +1058,13 @@ class PDFStorageService:
         try:
             print(f"📋 Listing PDFs for user: {user_id}")
             
-            cursor = self.collection.find(
-                {'user_id': user_id},
-                {'document_id': 1, 'filename': 1, 'file_size': 1, 'created_at': 1, 'status': 1}
-            ).sort('created_at', -1)
+            cursor = self.collection.aggregate([
+                {'$match': {'user_id': user_id}},
+                {'$sort': {'created_at': -1}},
+                {'$project': SUMMARY_PROJECTION}
+            ])
             
-            pdfs = []
-            for doc in cursor:
-                doc['_id'] = str(doc['_id'])
-                pdfs.append(doc)
+            pdfs = list(cursor)
             
             print(f"✅ Found {len(pdfs)} PDFs for user")
             return pdfs
@@ -0,0 +1,77 @@
+"""
+Serialization of edited PDF documents
+"""
+import threading
+from typing import Optional, Dict, Any
+
+from config import Config
+
+class PDFWriter:
+    """Serializes open fitz documents to bytes after edits.
+
+    Most saves are light: the document is written straight to memory without
+    garbage collection or recompression, so unchanged objects are copied
+    verbatim and the work is dominated by the edited pages. Every
+    compact_every light saves, or once the file has grown past max_growth
+    times its size after the last full save, a full rewrite with garbage
+    collection and deflate reclaims the space left behind by replaced
+    content streams.
+    """
+
+    def __init__(self, compact_every: int, max_growth: float):
+        self.compact_every = compact_every
+        self.max_growth = max_growth
+        # document_id -> {'light_saves': int, 'compacted_size': int}
+        self._state: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self.light_saves = 0
+        self.full_saves = 0
+
+    def serialize(self, document_id: str, pdf_doc) -> bytes:
+        """Return the bytes of an edited document according to the save policy"""
+        with self._lock:
+            state = self._state.setdefault(document_id, {'light_saves': 0, 'compacted_size': 0})
+            full = state['light_saves'] + 1 >= self.compact_every
+
+        if not full:
+            data = pdf_doc.tobytes(garbage=0, deflate=False, clean=False)
+            with self._lock:
+                baseline = state['compacted_size'] or len(data)
+                full = len(data) > baseline * self.max_growth
+                if not full:
+                    state['light_saves'] += 1
+                    state['compacted_size'] = baseline
+                    self.light_saves += 1
+                    return data
+
+        data = pdf_doc.tobytes(garbage=3, deflate=True, clean=True)
+        with self._lock:
+            state['light_saves'] = 0
+            state['compacted_size'] = len(data)
+            self.full_saves += 1
+        return data
+
+    def forget(self, document_id: str) -> None:
+        """Drop save bookkeeping for a deleted document"""
+        with self._lock:
+            self._state.pop(document_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return save counters"""
+        with self._lock:
+            return {
+                'light_saves': self.light_saves,
+                'full_saves': self.full_saves,
+                'compact_every': self.compact_every,
+                'max_growth': self.max_growth
+            }
+
+# Global writer shared by all PDFService instances
+pdf_writer: Optional[PDFWriter] = None
+
+def get_pdf_writer() -> PDFWriter:
+    """Get the global PDF writer (lazy initialization)"""
+    global pdf_writer
+    if pdf_writer is None:
+        pdf_writer = PDFWriter(Config.PDF_SAVE_COMPACT_EVERY, Config.PDF_SAVE_MAX_GROWTH)
+    return pdf_writer
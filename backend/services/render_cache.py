@@ -0,0 +1,253 @@
+"""
+Cache of rendered page images
+"""
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+from config import Config
+
+# Zoom factors are rounded to this step so nearby zooms share one render
+ZOOM_STEP = 0.25
+
+# Largest zoom a full-page render is allowed to use
+MAX_PAGE_ZOOM = 4.0
+
+# A disk sweep deletes renders until the disk tier is this far below its budget,
+# so it does not run again on the very next write
+DISK_SWEEP_RATIO = 0.9
+
+# Encodings pages can be rendered to
+IMAGE_MIMETYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp'
+}
+
+def zoom_bucket(zoom: float) -> float:
+    """Round a zoom factor to its cache bucket"""
+    return max(ZOOM_STEP, round(zoom / ZOOM_STEP) * ZOOM_STEP)
+
+def page_zoom(zoom: Optional[float]) -> float:
+    """Sanitize a requested full-page zoom and round it to its bucket"""
+    if zoom is None or zoom <= 0:
+        zoom = 1.0
+    return zoom_bucket(min(zoom, MAX_PAGE_ZOOM))
+
+def tile_zoom(zoom: Optional[float]) -> float:
+    """Sanitize a requested tile zoom; tiles may zoom far beyond full pages"""
+    if zoom is None or zoom <= 0:
+        zoom = 1.0
+    return zoom_bucket(min(zoom, Config.PDF_TILE_MAX_ZOOM))
+
+class RenderCache:
+    """Byte-budget LRU of rendered page images with an optional disk tier.
+
+    Keys are (document_id, file_id, page_num, zoom_bucket, image_format, tile)
+    where tile is the (x, y) of a deep-zoom tile or None for the whole page.
+    Because the GridFS file_id is part of the key, a new file version never
+    hits an old render; invalidate() additionally frees the memory and disk
+    held by superseded versions. The disk tier has its own byte budget:
+    disk hits touch a file's mtime, and once the budget is exceeded the
+    files with the oldest mtime are deleted first.
+    """
+
+    def __init__(self, max_bytes: int, disk_folder: Optional[str] = None,
+                 disk_max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.disk_folder = Path(disk_folder) if disk_folder else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._current_bytes = 0
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_folder:
+            self.disk_folder.mkdir(parents=True, exist_ok=True)
+            # Renders left by earlier runs count against the budget too
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    def get(self, document_id: str, file_id: str, page_num: int, zoom: float,
+            image_format: str = 'png', tile: Optional[Tuple[int, int]] = None) -> Optional[bytes]:
+        """Return cached image bytes, promoting disk hits into memory"""
+        key = (document_id, file_id, page_num, zoom_bucket(zoom), image_format, tile)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, data)
+        return data
+
+    def put(self, document_id: str, file_id: str, page_num: int, zoom: float,
+            data: bytes, image_format: str = 'png', tile: Optional[Tuple[int, int]] = None) -> None:
+        """Store rendered image bytes in memory and on disk"""
+        key = (document_id, file_id, page_num, zoom_bucket(zoom), image_format, tile)
+        with self._lock:
+            self._insert(key, data)
+        self._write_disk(key, data)
+
+    def invalidate(self, document_id: str, keep_file_id: Optional[str] = None) -> None:
+        """Drop renders of a document, except those of keep_file_id"""
+        with self._lock:
+            for key in [k for k in self._entries
+                        if k[0] == document_id and k[1] != keep_file_id]:
+                self._current_bytes -= len(self._entries.pop(key))
+
+        if self.disk_folder:
+            document_dir = self.disk_folder / document_id
+            if not document_dir.is_dir():
+                return
+            for version_dir in document_dir.iterdir():
+                if version_dir.name != keep_file_id:
+                    freed = sum(size for _, size, _ in self._disk_files(version_dir))
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                    with self._lock:
+                        self._disk_bytes = max(0, self._disk_bytes - freed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_enabled': self.disk_folder is not None,
+                'disk_bytes': self._disk_bytes,
+                'disk_max_bytes': self.disk_max_bytes,
+                'disk_evictions': self.disk_evictions
+            }
+
+    def _insert(self, key: Tuple, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._current_bytes -= len(previous)
+        self._entries[key] = data
+        self._current_bytes += len(data)
+        while self._current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._current_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key: Tuple) -> Optional[Path]:
+        if not self.disk_folder:
+            return None
+        document_id, file_id, page_num, zoom, image_format, tile = key
+        name = f"p{page_num}_z{zoom:g}"
+        if tile is not None:
+            name += f"_t{tile[0]}_{tile[1]}"
+        return self.disk_folder / document_id / file_id / f"{name}.{image_format}"
+
+    def _read_disk(self, key: Tuple) -> Optional[bytes]:
+        path = self._disk_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Mark the render as recently used for the disk sweep
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key: Tuple, data: bytes) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a unique name first so readers never see a partial file
+            temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write render cache file: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data)
+            over_budget = self.disk_max_bytes is not None and self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._sweep_disk()
+
+    def _disk_files(self, folder: Optional[Path] = None):
+        # (mtime, size, path) of the finished render files under folder
+        for path in (folder or self.disk_folder).rglob('*'):
+            if path.suffix == '.tmp':
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.is_file():
+                yield stat.st_mtime, stat.st_size, path
+
+    def _sweep_disk(self) -> None:
+        # Delete the least recently used renders until the disk tier is within budget
+        if not self._sweep_lock.acquire(blocking=False):
+            return  # Another thread is already sweeping
+        try:
+            # Rescan rather than trust the running total: other processes may share the folder
+            files = sorted(self._disk_files())
+            total = sum(size for _, size, _ in files)
+            target = self.disk_max_bytes * DISK_SWEEP_RATIO
+            removed = 0
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"⚠️ Could not delete render cache file: {e}")
+                    continue
+                total -= size
+                removed += 1
+            with self._lock:
+                self._disk_bytes = total
+                self.disk_evictions += removed
+            if removed:
+                print(f"🧹 Deleted {removed} rendered pages from the disk cache")
+        finally:
+            self._sweep_lock.release()
+
+# Global render cache shared by all PDFService instances
+render_cache: Optional[RenderCache] = None
+
+def get_render_cache() -> RenderCache:
+    """Get the global render cache (lazy initialization)"""
+    global render_cache
+    if render_cache is None:
+        disk_folder = None
+        if Config.PDF_RENDER_DISK_CACHE:
+            disk_folder = os.path.join(Config.TEMP_FOLDER, 'render_cache')
+        render_cache = RenderCache(Config.PDF_RENDER_CACHE_BYTES, disk_folder,
+                                   Config.PDF_RENDER_DISK_CACHE_BYTES)
+    return render_cache
@@ -0,0 +1,87 @@
+"""
+Background garbage collection of superseded PDF versions
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from config import Config
+from services.pdf_storage_service import PDFStorageService
+
+# Superseded versions younger than this are never collected, so reads that
+# resolved the previous file_id just before an edit can still finish
+MIN_VERSION_AGE_SECONDS = 60
+
+class VersionCollector:
+    """Reclaims superseded GridFS versions off the request path.
+
+    Edits only flip a document's file_id to the new version; deleting the
+    old file happens here, every interval seconds, for versions outside the
+    retention policy (the newest keep per document, none older than max_age
+    seconds). Files shared with other documents are only released, and
+    deleted once their reference count drops to zero.
+    """
+
+    def __init__(self, interval: float, keep: int, max_age: float):
+        self.interval = interval
+        self.keep = keep
+        self.max_age = max_age
+        self._storage_service = PDFStorageService()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.collected = 0
+        self.last_run: Optional[datetime] = None
+
+    def start(self) -> None:
+        """Start the collector thread if it is not running yet"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='pdf-version-gc', daemon=True)
+            self._thread.start()
+
+    def collect(self) -> int:
+        """Run one collection pass; returns the number of versions reclaimed"""
+        collected = self._storage_service.collect_versions(self.keep, self.max_age, MIN_VERSION_AGE_SECONDS)
+        with self._lock:
+            self.runs += 1
+            self.collected += collected
+            self.last_run = datetime.now()
+        return collected
+
+    def stats(self) -> Dict[str, Any]:
+        """Return collector counters"""
+        with self._lock:
+            return {
+                'running': self._thread is not None,
+                'interval': self.interval,
+                'keep': self.keep,
+                'max_age': self.max_age,
+                'runs': self.runs,
+                'collected': self.collected,
+                'last_run': self.last_run.isoformat() if self.last_run else None
+            }
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"❌ Version collection failed: {e}")
+
+# Global version collector (lazy initialization)
+version_collector: Optional[VersionCollector] = None
+
+def get_version_collector() -> VersionCollector:
+    """Get the global version collector"""
+    global version_collector
+    if version_collector is None:
+        version_collector = VersionCollector(
+            Config.PDF_VERSION_GC_INTERVAL,
+            Config.PDF_VERSION_KEEP,
+            Config.PDF_VERSION_MAX_AGE
+        )
+    return version_collector
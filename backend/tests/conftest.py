@@ -0,0 +1,77 @@
+"""
+Shared fixtures for the backend unit tests
+"""
+import io
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# motor imports gridfs, so it has to be loaded before mongomock patches it
+from utils import database
+import mongomock
+import mongomock.gridfs
+import fitz
+
+mongomock.gridfs.enable_gridfs_integration()
+
+@pytest.fixture
+def sessions(monkeypatch):
+    """A document session manager backed by an in-memory MongoDB"""
+    import services.document_session as document_session
+
+    db_manager = database.DatabaseManager('mongodb://localhost', 'portifier_test')
+    db_manager.client = mongomock.MongoClient()
+    db_manager.db = db_manager.client[db_manager.database_name]
+    db_manager.create_indexes()
+    monkeypatch.setattr(database, 'db_manager', db_manager)
+    monkeypatch.setattr(document_session, 'document_sessions', None)
+    return document_session.get_document_sessions()
+
+@pytest.fixture
+def client(sessions, monkeypatch):
+    """A Flask test client for the PDF routes, using the in-memory MongoDB"""
+    from flask import Flask
+    import services.ingest_service as ingest_service
+    import routes.pdf_routes as pdf_routes
+
+    monkeypatch.setattr(pdf_routes, 'storage_service', sessions.storage_service)
+    monkeypatch.setattr(ingest_service, 'ingestion_pipeline', None)
+    app = Flask(__name__)
+    app.register_blueprint(pdf_routes.pdf_bp)
+    return app.test_client()
+
+def make_pdf(*lines: str) -> bytes:
+    """A one-page PDF with each line of text drawn 30pt below the previous one"""
+    pdf_doc = fitz.open()
+    page = pdf_doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((72, 72 + 30 * i), line, fontsize=12)
+    data = pdf_doc.tobytes()
+    pdf_doc.close()
+    return data
+
+def upload(sessions, data: bytes, filename: str = 'test.pdf') -> dict:
+    """Store a PDF the way the upload route does; returns the storage result"""
+    storage_service = sessions.storage_service
+    result = storage_service.store_pdf_stream(io.BytesIO(data), filename, keep_data=True)
+    assert result['success'], result
+
+    pdf_service = sessions.create()
+    pdf_service.document_pool.adopt(result['file_id'], result.pop('file_data'))
+    if not result.get('source_document_id'):
+        assert pdf_service.load_stored_pdf(result['document_id'], filename, result['file_size'], result['file_id'])
+        storage_service.store_pdf_document(pdf_service.current_document)
+        pdf_service.cache_current_document()
+    return result
+
+def wait_until(condition, timeout: float = 5) -> None:
+    """Poll condition until it holds, failing the test once timeout seconds pass"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail(f'Timed out after {timeout}s waiting for {condition}')
+        time.sleep(0.001)
@@ -0,0 +1,39 @@
+"""
+Tests for the parsed document cache
+"""
+from datetime import datetime
+
+from models.pdf_models import PDFDocument
+from services.document_cache import DocumentCache, estimate_document_size
+
+def _document(document_id):
+    now = datetime.now()
+    return PDFDocument(document_id=document_id, filename='a.pdf', file_path='mongodb://a.pdf',
+                       file_size=1, page_count=1, text_elements=[], images=[], fonts=[], colors=[],
+                       metadata={}, created_at=now, updated_at=now, extracted_pages=[])
+
+def test_document_cache_is_keyed_by_version():
+    cache = DocumentCache(max_bytes=10 ** 6)
+    document = _document('a')
+    cache.put(document, 'v1')
+    assert cache.get('a', 'v1') is document
+    assert cache.get('a', 'v2') is None
+
+    # A new version replaces the old one
+    cache.put(document, 'v2')
+    assert cache.get('a', 'v1') is None
+    assert cache.stats()['entries'] == 1
+
+    cache.invalidate('a')
+    assert cache.get('a', 'v2') is None
+    assert cache.stats()['bytes'] == 0
+
+def test_document_cache_evicts_least_recently_used():
+    size = estimate_document_size(_document('a'))
+    cache = DocumentCache(max_bytes=size * 2)
+    for document_id in 'abc':
+        cache.put(_document(document_id), 'v1')
+        cache.get('a', 'v1')
+    assert cache.get('a', 'v1') is not None
+    assert cache.get('b', 'v1') is None
+    assert cache.stats()['evictions'] == 1
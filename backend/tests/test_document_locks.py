@@ -0,0 +1,76 @@
+"""
+Tests for the per-document reader/writer locks
+"""
+import threading
+
+import pytest
+
+from conftest import wait_until
+from services.document_locks import DocumentLockManager, DocumentLockTimeout
+
+def _in_thread(target):
+    result = {}
+    def run():
+        try:
+            result['value'] = target()
+        except Exception as e:
+            result['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(5)
+    return result
+
+def _read(locks, document_id='a'):
+    with locks.read(document_id):
+        return True
+
+def _write(locks, document_id='a'):
+    with locks.write(document_id):
+        return True
+
+def test_readers_share_and_writer_excludes():
+    locks = DocumentLockManager(timeout=0.05)
+    with locks.read('a'):
+        assert _in_thread(lambda: _read(locks)) == {'value': True}
+    with locks.write('a'):
+        assert isinstance(_in_thread(lambda: _read(locks))['error'], DocumentLockTimeout)
+    assert locks.stats()['timeouts'] == {'read': 1, 'write': 0}
+
+def test_documents_are_independent():
+    locks = DocumentLockManager(timeout=0.05)
+    with locks.write('a'):
+        assert _in_thread(lambda: _write(locks, 'b')) == {'value': True}
+
+def test_reentrant_and_upgradable_by_sole_reader():
+    locks = DocumentLockManager(timeout=0.05)
+    with locks.write('a'):
+        with locks.write('a'), locks.read('a'):
+            pass
+    with locks.read('a'):
+        with locks.write('a'):
+            pass
+    assert locks.stats()['documents'] == 0
+
+def test_waiting_writer_blocks_new_readers():
+    locks = DocumentLockManager(timeout=1)
+    reading = threading.Event()
+    release = threading.Event()
+
+    def reader():
+        with locks.read('a'):
+            reading.set()
+            release.wait(5)
+    holder = threading.Thread(target=reader)
+    holder.start()
+    reading.wait(5)
+
+    writer = threading.Thread(target=_write, args=(locks,))
+    writer.start()
+    wait_until(lambda: locks.stats()['contended']['write'] > 0)
+    with pytest.raises(DocumentLockTimeout):
+        with locks.read('a', timeout=0.05):
+            pass
+    release.set()
+    holder.join(5)
+    writer.join(5)
+    assert locks.stats()['acquired']['write'] == 1
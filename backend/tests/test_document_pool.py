@@ -0,0 +1,79 @@
+"""
+Tests for the pool of open PDF documents
+"""
+import threading
+import time
+
+from conftest import make_pdf, wait_until
+from services.document_pool import DocumentPool
+
+def _pool():
+    return DocumentPool(max_bytes=10 ** 7, idle_timeout=60)
+
+def _text(pool, file_id, data=None):
+    with pool.acquire(file_id, lambda: data) as pdf_doc:
+        return pdf_doc[0].get_text().strip()
+
+def test_acquire_loads_once_and_shares():
+    pool = _pool()
+    loads = []
+    data = make_pdf('Hello')
+    for _ in range(3):
+        with pool.acquire('f1', lambda: loads.append(1) or data):
+            pass
+    assert len(loads) == 1
+    assert pool.stats()['hits'] == 2
+    assert pool.get_bytes('f1') is data
+
+def test_rekey_moves_edited_handle():
+    pool = _pool()
+    pool.adopt('f1', make_pdf('Hello'))
+    with pool.acquire('f1', lambda: None) as pdf_doc:
+        pdf_doc[0].insert_text((72, 200), 'Edited')
+    pool.rekey('f1', 'f2')
+
+    assert 'Edited' in _text(pool, 'f2')
+    assert pool.get_bytes('f2') is None
+    # The old version is loaded afresh
+    assert _text(pool, 'f1', make_pdf('Hello')) == 'Hello'
+
+def test_discard_closes_once_released():
+    pool = _pool()
+    pool.adopt('f1', make_pdf('Hello'))
+    with pool.acquire('f1', lambda: None) as pdf_doc:
+        pool.discard('f1')
+        assert not pdf_doc.is_closed
+    assert pdf_doc.is_closed
+    assert pool.stats()['open_documents'] == 0
+
+def test_waiter_skips_handle_discarded_while_it_waited():
+    pool = _pool()
+    pool.adopt('f1', make_pdf('Hello'))
+    seen = []
+    waiting = threading.Event()
+
+    def reader():
+        waiting.set()
+        seen.append(_text(pool, 'f1', make_pdf('Fresh')))
+
+    with pool.acquire('f1', lambda: None) as pdf_doc:
+        thread = threading.Thread(target=reader)
+        thread.start()
+        waiting.wait(5)
+        wait_until(lambda: pool.stats()['hits'] >= 2)
+        pdf_doc[0].insert_text((72, 200), 'Unsaved')
+        pool.discard('f1')
+    thread.join(5)
+    assert seen == ['Fresh']
+
+def test_close_idle_skips_handles_in_use():
+    pool = DocumentPool(max_bytes=10 ** 7, idle_timeout=0.01)
+    pool.adopt('f1', make_pdf('Hello'))
+    pool.adopt('f2', make_pdf('World'))
+    with pool.acquire('f1', lambda: None):
+        time.sleep(0.02)
+        assert pool.close_idle() == 1
+    assert pool.stats()['open_documents'] == 1
+    time.sleep(0.02)
+    assert pool.close_idle() == 1
+    assert pool.stats()['open_documents'] == 0
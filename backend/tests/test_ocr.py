@@ -0,0 +1,110 @@
+"""
+Tests for OCR of images and scanned pages
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+import services.ocr_service as ocr_service
+from conftest import make_pdf, upload
+from services.ocr_service import OCREngine, preprocess_image
+
+def _png(width=40, height=20):
+    return cv2.imencode('.png', np.full((height, width, 3), 255, dtype=np.uint8))[1].tobytes()
+
+@pytest.fixture
+def engine(sessions, monkeypatch):
+    """The global OCR engine with Tesseract replaced by counting fakes run on threads"""
+    engine = OCREngine(workers=1, cache_entries=8, storage_service=sessions.storage_service)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(engine, '_get_pool', lambda: executor)
+    monkeypatch.setattr(ocr_service, 'ocr_engine', engine)
+    engine.calls = []
+
+    def image_to_string(img_array, lang, config):
+        engine.calls.append(img_array.shape)
+        return f' {img_array.shape[1]}x{img_array.shape[0]} '
+    monkeypatch.setattr(ocr_service.pytesseract, 'image_to_string', image_to_string)
+    yield engine
+    executor.shutdown()
+
+def test_preprocess_grays_downscales_and_binarizes():
+    color = np.random.default_rng(0).integers(0, 256, (100, 400, 3), dtype=np.uint8)
+    result = preprocess_image(color, max_dimension=200)
+    assert result.shape == (50, 200)
+    assert set(np.unique(result)) <= {0, 255}
+
+def test_ocr_images_runs_each_distinct_image_once(engine, sessions):
+    small, large = _png(40, 20), _png(3000, 100)
+    assert engine.ocr_images([small, large, small]) == ['40x20', '2000x66', '40x20']
+    assert len(engine.calls) == 2
+    assert engine.ocr_images([large]) == ['2000x66']
+    assert engine.stats()['hits'] == 1 and engine.stats()['misses'] == 2
+
+    # Results are mirrored to MongoDB, so a fresh engine does not run Tesseract again
+    fresh = OCREngine(workers=1, cache_entries=8, storage_service=sessions.storage_service)
+    fresh._get_pool = lambda: pytest.fail('Tesseract ran for a stored result')
+    assert fresh.ocr_images([small]) == ['40x20']
+
+    # Other settings are a different result
+    assert engine.ocr_images([small], lang='deu') == ['40x20']
+    assert len(engine.calls) == 3
+
+def test_ocr_images_skips_failed_items(engine):
+    assert engine.ocr_images([b'not an image', _png()]) == [None, '40x20']
+
+@pytest.mark.parametrize('body', [
+    {'dpi': 'high'},
+    {'dpi': [300]},
+    {'pages': [0, 'one']},
+    {'pages': [1.5]},
+    {'pages': 0},
+])
+def test_ocr_pages_rejects_bad_input(client, sessions, body):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    response = client.post('/api/pdf/ocr/pages', json=dict(body, document_id=document_id))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def _scanned_pdf():
+    pdf_doc = fitz.open()
+    page = pdf_doc.new_page()
+    page.draw_rect(fitz.Rect(72, 72, 200, 100), color=(0, 0, 0))
+    data = pdf_doc.tobytes()
+    pdf_doc.close()
+    return data
+
+def test_ocr_pages_adds_words_to_pages_without_text(engine, sessions, monkeypatch):
+    document_id = upload(sessions, _scanned_pdf())['document_id']
+    calls = []
+
+    def image_to_data(img_array, lang, config, output_type):
+        calls.append(img_array.shape)
+        return {'text': ['', 'Scanned', 'words'], 'conf': ['-1', '91.5', '88'],
+                'block_num': [0, 1, 1], 'par_num': [0, 1, 1], 'line_num': [0, 1, 1],
+                'word_num': [0, 1, 2], 'left': [0, 144, 300], 'top': [0, 144, 144],
+                'width': [0, 120, 100], 'height': [0, 40, 40]}
+    monkeypatch.setattr(ocr_service.pytesseract, 'image_to_data', image_to_data)
+
+    pdf_service = sessions.open(document_id)
+    pages = pdf_service.ocr_pages([0], dpi=144)
+    # Pages are rasterized at the DPI and not downscaled again
+    assert calls == [(1684, 1190)]
+    assert pages[0]['text'] == 'Scanned words'
+    first = pages[0]['text_elements'][0]
+    assert first['element_id'] == 'p0_b1_l0_w1'
+    assert tuple(first['bbox']) == (72, 72, 132, 92)
+
+    # The words became the page's text layer, stored for later loads
+    pdf_service.document_cache.clear()
+    reloaded = sessions.open(document_id)
+    assert [e['text'] for e in reloaded.get_page_elements(0)['text_elements']] == ['Scanned', 'words']
+
+    # Results are stored per page and settings
+    assert reloaded.ocr_pages([0], dpi=144)[0]['text'] == 'Scanned words'
+    assert len(calls) == 1
+    stored = sessions.storage_service.pages_collection.find_one({'document_id': document_id, 'page_num': 0})
+    assert len(stored['text_elements']) == 2
@@ -0,0 +1,61 @@
+"""
+Tests for streaming PDF downloads
+"""
+from conftest import make_pdf, upload
+
+def _download(client, document_id, **headers):
+    return client.get(f'/api/pdf/download?document_id={document_id}', headers=headers)
+
+def test_download_streams_current_file(client, sessions):
+    data = make_pdf('Hello World')
+    document_id = upload(sessions, data)['document_id']
+
+    response = _download(client, document_id)
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Disposition'].startswith('inline')
+    assert 'Content-Range' not in response.headers
+
+    etag = response.headers['ETag']
+    assert _download(client, document_id, **{'If-None-Match': etag}).status_code == 304
+
+    saved = client.get(f'/api/pdf/save?document_id={document_id}')
+    assert saved.data == data
+    assert saved.headers['Content-Disposition'].startswith('attachment')
+
+def test_download_range_requests(client, sessions):
+    data = make_pdf('Hello World')
+    document_id = upload(sessions, data)['document_id']
+    length = len(data)
+
+    response = _download(client, document_id, Range='bytes=0-99')
+    assert response.status_code == 206
+    assert response.data == data[:100]
+    assert response.headers['Content-Range'] == f'bytes 0-99/{length}'
+    assert response.headers['Content-Length'] == '100'
+
+    response = _download(client, document_id, Range='bytes=-50')
+    assert response.status_code == 206
+    assert response.data == data[-50:]
+    assert response.headers['Content-Range'] == f'bytes {length - 50}-{length - 1}/{length}'
+
+    response = _download(client, document_id, Range=f'bytes={length + 10}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{length}'
+
+def test_download_if_range(client, sessions):
+    data = make_pdf('Hello World')
+    document_id = upload(sessions, data)['document_id']
+    etag = _download(client, document_id).headers['ETag']
+
+    fresh = _download(client, document_id, Range='bytes=0-9', **{'If-Range': etag})
+    assert fresh.status_code == 206
+    assert fresh.data == data[:10]
+
+    stale = _download(client, document_id, Range='bytes=0-9', **{'If-Range': '"stale"'})
+    assert stale.status_code == 200
+    assert stale.data == data
+
+    dated = _download(client, document_id, Range='bytes=0-9', **{'If-Range': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+    assert dated.status_code == 200
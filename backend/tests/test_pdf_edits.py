@@ -0,0 +1,103 @@
+"""
+Tests for journaled text edits and how they are written into the PDF
+"""
+import fitz
+
+from conftest import make_pdf, upload
+from services.pdf_service import PDFService
+
+def _page_texts(pdf_service, page_num=0):
+    return {element['element_id']: element['text']
+            for element in pdf_service.current_document.text_elements.page_to_dicts(page_num)}
+
+def test_edit_replaces_old_text_and_keeps_ids(sessions):
+    document_id = upload(sessions, make_pdf('Hello World', 'Second line'))['document_id']
+    pdf_service = sessions.open(document_id)
+    pdf_service.ensure_pages_extracted([0])
+    ids = _page_texts(pdf_service)
+    assert sorted(ids.values()) == ['Hello World', 'Second line']
+    edited_id = next(element_id for element_id, text in ids.items() if text == 'Hello World')
+
+    assert pdf_service.apply_text_edits([{'element_id': edited_id, 'new_text': 'Bye'}])[0]['success']
+    pdf_service.materialize()
+
+    expected = dict(ids, **{edited_id: 'Bye'})
+    assert _page_texts(pdf_service) == expected
+    with pdf_service.open_document() as pdf_doc:
+        text = pdf_doc[0].get_text()
+    assert 'Hello' not in text and 'Bye' in text and 'Second line' in text
+
+    # The stored page follows the file too
+    stored = sessions.storage_service.pages_collection.find_one({'document_id': document_id, 'page_num': 0})
+    assert {element['element_id']: element['text'] for element in stored['text_elements']} == expected
+    assert pdf_service.search_and_replace('Hello', 'Hi') == 0
+
+def test_failed_save_discards_pooled_document(sessions, monkeypatch):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    pdf_service = sessions.open(document_id)
+    assert pdf_service.apply_text_edits([{'element_id': 'p0_b0_l0_w0', 'new_text': 'Bye'}])[0]['success']
+
+    def fail(document_id, pdf_doc):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(pdf_service.pdf_writer, 'serialize', fail)
+    pdf_service.materialize()
+    assert sessions.storage_service.get_journal_state(document_id)['pending_edits'] == 1
+
+    # Readers get the stored file, not the half-written pooled copy
+    file_id = sessions.storage_service.get_file_version(document_id)
+    with pdf_service.document_pool.acquire(
+            file_id, lambda: sessions.storage_service.retrieve_pdf_file(file_id)) as pdf_doc:
+        assert 'Hello World' in pdf_doc[0].get_text()
+
+def test_failed_edit_leaves_no_marks(sessions, monkeypatch):
+    document_id = upload(sessions, make_pdf('Hello World', 'Second line'))['document_id']
+    pdf_service = sessions.open(document_id)
+    pdf_service.ensure_pages_extracted([0])
+    ids = {text: element_id for element_id, text in _page_texts(pdf_service).items()}
+
+    apply_text_edit = PDFService._apply_text_edit
+    def flaky(self, pdf_doc, element, new_text, *args):
+        if new_text == 'Broken':
+            pdf_doc[element.page_num].draw_rect(fitz.Rect(element.bbox), fill=(1, 1, 1))
+            raise RuntimeError('font missing')
+        return apply_text_edit(self, pdf_doc, element, new_text, *args)
+    monkeypatch.setattr(PDFService, '_apply_text_edit', flaky)
+
+    pdf_service.apply_text_edits([{'element_id': ids['Hello World'], 'new_text': 'Bye'},
+                                  {'element_id': ids['Second line'], 'new_text': 'Broken'}])
+    pdf_service.materialize()
+
+    data = sessions.storage_service.retrieve_pdf_file(sessions.storage_service.get_file_version(document_id))
+    with fitz.open(stream=data, filetype='pdf') as pdf_doc:
+        assert 'Bye' in pdf_doc[0].get_text()
+        assert pdf_doc[0].get_drawings() == []
+
+def test_pending_edits_survive_cache_eviction(sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    pdf_service = sessions.open(document_id)
+    assert pdf_service.apply_text_edits([{'element_id': 'p0_b0_l0_w0', 'new_text': 'Bye'}])[0]['success']
+
+    pdf_service.document_cache.clear()
+    pdf_service = sessions.open(document_id)
+    assert [e['text'] for e in pdf_service.get_page_elements(0)['text_elements']] == ['Bye']
+
+    # The next edit journals what the element shows now, so undo goes back to it
+    assert pdf_service.apply_text_edits([{'element_id': 'p0_b0_l0_w0', 'new_text': 'Ciao'}])[0]['success']
+    assert sessions.storage_service.get_edit_journal(document_id)[-1]['old_text'] == 'Bye'
+    pdf_service.document_cache.clear()
+    pdf_service = sessions.open(document_id)
+    assert pdf_service.undo_last_edit() == 'p0_b0_l0_w0'
+    assert [e['text'] for e in pdf_service.get_page_elements(0)['text_elements']] == ['Bye']
+
+def test_fold_keeps_count_of_edits_being_appended(sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    storage_service = sessions.storage_service
+    entry = {'element_id': 'p0_b0_l0_w0', 'new_text': 'Bye', 'new_font_size': None, 'new_color': None,
+             'old_text': 'Hello World', 'old_font_size': 12.0, 'old_color': [0, 0, 0]}
+    assert storage_service.append_edit_journal(document_id, [entry])
+
+    # Another append has reserved its sequence number but not inserted its entry yet
+    storage_service.collection.update_one({'document_id': document_id},
+                                          {'$inc': {'journal_seq': 1, 'pending_edits': 1}})
+    storage_service.fold_edit_journal(document_id, 1)
+    assert storage_service.get_journal_state(document_id)['pending_edits'] == 1
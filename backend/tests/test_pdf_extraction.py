@@ -0,0 +1,44 @@
+"""
+Tests for serial and parallel page extraction
+"""
+import fitz
+
+from config import Config
+from services.pdf_extraction import extract_page, extract_pages, extract_pages_parallel
+
+def _multi_page_pdf(page_count=5):
+    pdf_doc = fitz.open()
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 4, 4), False)
+    pixmap.clear_with(200)
+    for page_num in range(page_count):
+        page = pdf_doc.new_page()
+        page.insert_text((72, 72), f'Page {page_num} heading', fontsize=14)
+        page.insert_text((72, 110), f'Body text of page {page_num}', fontsize=10, color=(1, 0, 0))
+        page.insert_image(fitz.Rect(72, 200, 144, 272), pixmap=pixmap)
+    data = pdf_doc.tobytes()
+    pdf_doc.close()
+    return data
+
+def test_parallel_extraction_matches_serial():
+    data = _multi_page_pdf()
+    with fitz.open(stream=data, filetype='pdf') as pdf_doc:
+        serial = [extract_page(pdf_doc, page_num) for page_num in range(5)]
+
+    parallel = extract_pages_parallel(data, [4, 0, 2, 1, 3], workers=2)
+    assert parallel == serial
+    assert [len(result['images']) for result in parallel] == [1] * 5
+
+def test_extract_pages_goes_parallel_for_enough_pages(monkeypatch):
+    data = _multi_page_pdf()
+    monkeypatch.setattr(Config, 'PDF_EXTRACT_WORKERS', 2)
+    monkeypatch.setattr(Config, 'PDF_PARALLEL_EXTRACT_MIN_PAGES', 3)
+    loads = []
+
+    with fitz.open(stream=data, filetype='pdf') as pdf_doc:
+        serial = extract_pages(pdf_doc, [0, 1], lambda: loads.append(1) or data)
+        assert loads == []
+        assert extract_pages(pdf_doc, range(5), lambda: loads.append(1) or data)[:2] == serial
+        assert loads == [1]
+
+        # Without the bytes the pages are still extracted serially
+        assert extract_pages(pdf_doc, range(5), lambda: None)[:2] == serial
@@ -0,0 +1,32 @@
+"""
+Tests for the document summary served by /info
+"""
+from conftest import make_pdf, upload
+
+def test_info_counts_without_elements(client, sessions):
+    document_id = upload(sessions, make_pdf('Hello World', 'Second line'))['document_id']
+    sessions.open(document_id).ensure_pages_extracted([0])
+
+    info = client.get(f'/api/pdf/info?document_id={document_id}').get_json()
+    assert {k: info[k] for k in ('filename', 'page_count', 'pages', 'text_elements_count',
+                                 'images_count', 'extracted_pages')} == {
+        'filename': 'test.pdf', 'page_count': 1, 'pages': 1, 'text_elements_count': 2,
+        'images_count': 0, 'extracted_pages': 1
+    }
+    assert not {'_id', 'file_id', 'text_elements', 'images'} & set(info)
+
+def test_info_counts_elements_of_older_records(client, sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    # Records from before per-page storage embed their elements and have no counters
+    sessions.storage_service.collection.update_one({'document_id': document_id}, {
+        '$set': {'text_elements': [{}, {}, {}], 'images': [{}]},
+        '$unset': {'text_element_count': '', 'image_count': ''}
+    })
+
+    info = client.get(f'/api/pdf/info?document_id={document_id}').get_json()
+    assert (info['text_elements_count'], info['images_count']) == (3, 1)
+    assert 'text_elements' not in info
+
+def test_info_of_unknown_document(client, sessions):
+    assert client.get('/api/pdf/info?document_id=missing').status_code == 404
+    assert client.get('/api/pdf/info').status_code == 400
@@ -0,0 +1,62 @@
+"""
+Tests for the PDF routes
+"""
+import io
+import time
+
+import fitz
+
+from conftest import make_pdf
+
+def _upload(client, data: bytes, filename: str):
+    response = client.post('/api/pdf/upload', data={'file': (io.BytesIO(data), filename)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    result = response.get_json()
+
+    # Let background ingestion finish so it does not race the test
+    deadline = time.monotonic() + 10
+    while result['job_id'] and time.monotonic() < deadline:
+        if client.get(f"/api/pdf/jobs/{result['job_id']}").get_json()['status'] in ('completed', 'failed'):
+            break
+        time.sleep(0.02)
+    return result
+
+def test_upload_reuses_identical_document(client):
+    data = make_pdf('Hello World')
+    first = _upload(client, data, 'first.pdf')
+    assert first['deduplicated'] is False
+
+    second = _upload(client, data, 'second.pdf')
+    assert second['deduplicated'] is True
+    assert second['document_id'] != first['document_id']
+    assert second['document_info']['filename'] == 'second.pdf'
+    assert second['page_count'] == 1
+
+def test_page_read_does_not_fold_journal(client, sessions):
+    document_id = _upload(client, make_pdf('Hello World'), 'a.pdf')['document_id']
+    storage_service = sessions.storage_service
+    for text in ('Bye', 'Good bye'):
+        response = client.post('/api/pdf/update-text', json={
+            'document_id': document_id, 'element_id': 'p0_b0_l0_w0', 'new_text': text
+        })
+        assert response.status_code == 200, response.get_json()
+
+    page = client.get(f'/api/pdf/page/0?document_id={document_id}').get_json()
+    assert storage_service.get_journal_state(document_id)['pending_edits'] == 2
+    assert [e['text'] for e in page['text_elements']] == ['Good bye']
+
+    image = client.get(page['page_image'])
+    assert image.status_code == 200
+    assert image.headers['Cache-Control'] == 'private, max-age=31536000, immutable'
+    assert storage_service.get_journal_state(document_id)['pending_edits'] == 0
+    with fitz.open(stream=storage_service.retrieve_pdf_file(storage_service.get_file_version(document_id)),
+                   filetype='pdf') as pdf_doc:
+        assert pdf_doc[0].get_text().split() == ['Good', 'bye']
+
+    # Once folded, the version is the new file and revalidation skips rendering
+    page = client.get(f'/api/pdf/page/0?document_id={document_id}').get_json()
+    assert f"v={storage_service.get_file_version(document_id)}" in page['page_image']
+    image = client.get(page['page_image'])
+    revalidated = client.get(page['page_image'], headers={'If-None-Match': image.headers['ETag']})
+    assert revalidated.status_code == 304
@@ -0,0 +1,60 @@
+"""
+Tests for the MongoDB storage of page elements
+"""
+import base64
+
+from conftest import make_pdf, upload
+from models.pdf_models import ImageElement, TextElementStore
+
+PNG = base64.b64encode(bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082'
+)).decode()
+
+def _image_blobs(storage_service):
+    return storage_service.files_collection.count_documents({'kind': 'page_image'})
+
+def _append_page(storage_service, pdf_document):
+    image = ImageElement(image_id='img_0_0', page=0, bbox=(0, 0, 1, 1), data=PNG, xref=5, width=1, height=1)
+    return storage_service.append_page_elements(pdf_document, [0], TextElementStore(), [image])
+
+def test_existing_page_does_not_store_image_again(sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    storage_service = sessions.storage_service
+    pdf_document = sessions.open(document_id).current_document
+
+    assert _append_page(storage_service, pdf_document)
+    assert _append_page(storage_service, pdf_document)
+    assert _image_blobs(storage_service) == 1
+    assert storage_service.get_document_summary(document_id)['images_count'] == 1
+
+def test_duplicate_page_releases_its_image(sessions, monkeypatch):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    storage_service = sessions.storage_service
+    pdf_document = sessions.open(document_id).current_document
+    assert _append_page(storage_service, pdf_document)
+
+    # Another worker inserted the page after this one looked for it
+    monkeypatch.setattr(storage_service.pages_collection, 'distinct', lambda *args, **kwargs: [])
+    assert _append_page(storage_service, pdf_document)
+    assert _image_blobs(storage_service) == 1
+
+def test_existing_page_text_is_only_appended_when_merging(sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    storage_service = sessions.storage_service
+    pdf_service = sessions.open(document_id)
+    pdf_service.ensure_pages_extracted([0])
+    pdf_document = pdf_service.current_document
+    stored_count = storage_service.collection.find_one({'document_id': document_id})['text_element_count']
+
+    # A second worker extracting the same page stores nothing
+    assert storage_service.append_page_elements(pdf_document, [0], pdf_document.text_elements, [])
+    page = storage_service.pages_collection.find_one({'document_id': document_id, 'page_num': 0})
+    assert len(page['text_elements']) == stored_count == 1
+    assert storage_service.collection.find_one({'document_id': document_id})['text_element_count'] == 1
+
+    assert storage_service.append_page_elements(pdf_document, [0], pdf_document.text_elements, [],
+                                                merge_text=True)
+    page = storage_service.pages_collection.find_one({'document_id': document_id, 'page_num': 0})
+    assert len(page['text_elements']) == 2
+    assert storage_service.collection.find_one({'document_id': document_id})['text_element_count'] == 2
@@ -0,0 +1,40 @@
+"""
+Tests for the page thumbnail sprite sheet
+"""
+import io
+
+from PIL import Image
+
+from conftest import make_pdf, upload
+from services.pdf_service import PDFService
+
+def test_thumbnail_sprite_layout(client, sessions, monkeypatch):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    layout = client.get(f'/api/pdf/thumbnails?document_id={document_id}').get_json()
+    assert layout['columns'] == 1
+    assert layout['pages'] == [{'page_num': 0, 'x': 0, 'y': 0,
+                                'width': layout['cell_width'], 'height': layout['cell_height']}]
+
+    response = client.get(layout['sprite_url'])
+    assert response.status_code == 200
+    sprite = Image.open(io.BytesIO(response.data))
+    assert (sprite.format, sprite.size) == ('JPEG', (layout['width'], layout['height']))
+    assert response.headers['Cache-Control'] == 'private, max-age=31536000, immutable'
+
+    # Sprites are stored per file, so later requests do not render again
+    monkeypatch.setattr(PDFService, '_render_thumbnail_sprite', None)
+    assert client.get(layout['sprite_url']).data == response.data
+    assert client.get(layout['sprite_url'], headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+def test_thumbnails_follow_edits(client, sessions):
+    document_id = upload(sessions, make_pdf('Hello World', 'Second line'))['document_id']
+    first = client.get(f'/api/pdf/thumbnails?document_id={document_id}').get_json()
+    response = client.post('/api/pdf/update-text', json={
+        'document_id': document_id, 'element_id': 'p0_b0_l0_w0', 'new_text': 'Bye'
+    })
+    assert response.status_code == 200
+
+    # The layout request writes the edit in, so the sprite is of the new version
+    second = client.get(f'/api/pdf/thumbnails?document_id={document_id}').get_json()
+    assert second['sprite_url'] != first['sprite_url']
+    assert client.get(second['sprite_url']).status_code == 200
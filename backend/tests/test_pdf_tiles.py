@@ -0,0 +1,36 @@
+"""
+Tests for deep-zoom page tiles
+"""
+import io
+
+from PIL import Image
+
+from config import Config
+from conftest import make_pdf, upload
+
+def _image(response):
+    assert response.status_code == 200, response.get_json()
+    return Image.open(io.BytesIO(response.data))
+
+def test_tile_grid_and_edge_tiles(client, sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    grid = client.get(f'/api/pdf/page/0/tiles?document_id={document_id}&zoom=1').get_json()
+    assert Config.PDF_TILE_SIZE == 256
+    assert (grid['width'], grid['height'], grid['columns'], grid['rows']) == (595, 842, 3, 4)
+
+    tile = _image(client.get(grid['tile_url'].format(x=0, y=0)))
+    assert tile.size == (256, 256)
+    # Tiles on the right and bottom edges are cropped to the page
+    assert _image(client.get(grid['tile_url'].format(x=2, y=3))).size == (83, 74)
+    assert client.get(grid['tile_url'].format(x=3, y=0)).status_code == 404
+
+def test_tiles_zoom_past_full_pages(client, sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+    grid = client.get(f'/api/pdf/page/0/tiles?document_id={document_id}&zoom=100').get_json()
+    assert grid['zoom'] == Config.PDF_TILE_MAX_ZOOM
+    assert grid['columns'] == -(-595 * int(Config.PDF_TILE_MAX_ZOOM) // 256)
+
+    # A tile deep inside the page costs the same as any other
+    tile = _image(client.get(grid['tile_url'].format(x=10, y=10) + '&format=jpeg'))
+    assert (tile.format, tile.size) == ('JPEG', (256, 256))
+    assert client.get(f'/api/pdf/page/5/tiles?document_id={document_id}').status_code == 400
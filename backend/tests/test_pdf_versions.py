@@ -0,0 +1,31 @@
+"""
+Tests for copy-on-write PDF versions
+"""
+from datetime import datetime
+
+from conftest import make_pdf, upload
+from models.pdf_models import PDFDocument
+
+def test_from_dict_accepts_stored_datetimes():
+    pdf_document = PDFDocument.from_dict({
+        'document_id': 'doc', 'filename': 'a.pdf', 'file_path': 'mongodb://a.pdf',
+        'file_size': 1, 'page_count': 1, 'fonts': [], 'colors': [], 'metadata': {},
+        'created_at': '2024-01-02T03:04:05', 'updated_at': datetime(2024, 1, 3)
+    })
+    assert pdf_document.created_at == datetime(2024, 1, 2, 3, 4, 5)
+    assert pdf_document.updated_at == datetime(2024, 1, 3)
+
+def test_restore_version_after_edit(sessions):
+    document_id = upload(sessions, make_pdf('Hello World'))['document_id']
+
+    pdf_service = sessions.open(document_id)
+    assert pdf_service.apply_text_edits([{'element_id': 'p0_b0_l0_w0', 'new_text': 'Bye'}])[0]['success']
+    edited_file_id = pdf_service.materialize()
+    assert [v['version'] for v in sessions.storage_service.list_versions(document_id)] == [1, 0]
+
+    assert sessions.open(document_id).restore_version(0)
+
+    pdf_service = sessions.open(document_id)
+    assert pdf_service.materialize() != edited_file_id
+    with pdf_service.open_document() as pdf_doc:
+        assert 'Hello World' in pdf_doc[0].get_text()
@@ -0,0 +1,49 @@
+"""
+Tests for the rendered page cache
+"""
+import os
+
+from services.render_cache import RenderCache, page_zoom
+
+def test_render_cache_buckets_zoom_and_evicts_by_bytes():
+    cache = RenderCache(max_bytes=10)
+    cache.put('a', 'f1', 0, 1.1, b'12345')
+    assert cache.get('a', 'f1', 0, 1.0) == b'12345'
+    assert cache.get('a', 'f2', 0, 1.0) is None
+    assert page_zoom(100) == 4.0
+
+    cache.put('a', 'f1', 1, 1.0, b'67890')
+    cache.put('a', 'f1', 2, 1.0, b'abcde')
+    assert cache.get('a', 'f1', 0, 1.0) is None
+    assert cache.stats()['bytes'] == 10
+
+def test_render_cache_invalidate_keeps_current_version(tmp_path):
+    cache = RenderCache(max_bytes=100, disk_folder=str(tmp_path))
+    cache.put('a', 'old', 0, 1.0, b'old')
+    cache.put('a', 'new', 0, 1.0, b'new', tile=(1, 2))
+    cache.invalidate('a', keep_file_id='new')
+
+    assert cache.get('a', 'old', 0, 1.0) is None
+    assert not (tmp_path / 'a' / 'old').exists()
+
+    # Renders of the kept version survive on disk too
+    fresh = RenderCache(max_bytes=100, disk_folder=str(tmp_path))
+    assert fresh.get('a', 'new', 0, 1.0, tile=(1, 2)) == b'new'
+    assert fresh.stats()['disk_hits'] == 1
+
+def test_render_cache_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(max_bytes=100, disk_folder=str(tmp_path), disk_max_bytes=10)
+    cache.put('a', 'f1', 0, 1.0, b'0000')
+    cache.put('a', 'f1', 1, 1.0, b'1111')
+    os.utime(tmp_path / 'a' / 'f1' / 'p0_z1.png', (1, 1))
+    os.utime(tmp_path / 'a' / 'f1' / 'p1_z1.png', (2, 2))
+
+    # A disk hit makes page 0 the most recently used
+    fresh = RenderCache(max_bytes=100, disk_folder=str(tmp_path), disk_max_bytes=10)
+    assert fresh.stats()['disk_bytes'] == 8
+    assert fresh.get('a', 'f1', 0, 1.0) == b'0000'
+    fresh.put('a', 'f1', 2, 1.0, b'2222')
+
+    assert sorted(p.name for p in (tmp_path / 'a' / 'f1').iterdir()) == ['p0_z1.png', 'p2_z1.png']
+    assert fresh.stats()['disk_bytes'] == 8
+    assert fresh.stats()['disk_evictions'] == 1
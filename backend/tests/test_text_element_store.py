@@ -0,0 +1,61 @@
+"""
+Tests for the columnar text element store
+"""
+from models.pdf_models import TextElementStore
+
+def _span(store, text, page_num, block_num=0, line_num=0, word_num=0, font_name='Helvetica'):
+    store.append_span(text, (0.0, 0.0, 10.0, 10.0), font_name, 12.0, 0, 0x102030,
+                      page_num, block_num, line_num, word_num)
+
+def _store(*pages):
+    store = TextElementStore()
+    for page_num, texts in pages:
+        for word_num, text in enumerate(texts):
+            _span(store, text, page_num, word_num=word_num)
+    return store
+
+def test_indexes_follow_appends():
+    store = _store((0, ['a', 'b']), (1, ['c']))
+    assert store.find('p0_b0_l0_w1').text == 'b'
+    assert store.find('p1_b0_l0_w0').color == (0x10, 0x20, 0x30)
+    assert store.find('p2_b0_l0_w0') is None
+    assert store.page_rows(0) == range(0, 2)
+    assert [e['text'] for e in store.page_to_dicts(1)] == ['c']
+
+def test_non_contiguous_page_falls_back_to_row_list():
+    store = _store((0, ['a']), (1, ['b']))
+    _span(store, 'c', 0, word_num=1)
+    assert list(store.page_rows(0)) == [0, 2]
+    assert [e['text'] for e in store.page_to_dicts(0)] == ['a', 'c']
+
+def test_replace_page_swaps_rows_and_reindexes():
+    store = _store((0, ['a', 'b']), (1, ['c', 'd']), (2, ['e']))
+    page = TextElementStore()
+    _span(page, 'x', 1, block_num=3, font_name='Courier')
+    store.replace_page(1, page)
+
+    assert store.texts == ['a', 'b', 'x', 'e']
+    assert store.find('p1_b3_l0_w0').font_name == 'Courier'
+    assert store.find('p1_b0_l0_w0') is None
+    assert store.find('p2_b0_l0_w0').text == 'e'
+    assert store.page_rows(1) == range(2, 3)
+    assert store.page_rows(2) == range(3, 4)
+
+def test_replace_page_of_non_contiguous_page():
+    store = _store((0, ['a']), (1, ['b']))
+    _span(store, 'c', 0, word_num=1)
+    page = TextElementStore()
+    _span(page, 'y', 0)
+    store.replace_page(0, page)
+
+    assert store.texts == ['y', 'b']
+    assert [e['text'] for e in store.page_to_dicts(0)] == ['y']
+    assert store.find('p0_b0_l0_w1') is None
+
+def test_replace_missing_page_appends():
+    store = _store((0, ['a']))
+    page = TextElementStore()
+    _span(page, 'z', 4)
+    store.replace_page(4, page)
+    assert store.texts == ['a', 'z']
+    assert store.find('p4_b0_l0_w0').text == 'z'
@@ -100,10 +100,40 @@ class DatabaseManager:
             # PDF documents collection indexes
             print("📋 Creating PDF documents collection indexes...")
             pdf_collection = self.get_collection('pdf_documents')
+            pdf_collection.create_index('document_id')
             pdf_collection.create_index('user_id')
+            pdf_collection.create_index([('user_id', 1), ('created_at', -1)])
             pdf_collection.create_index('created_at')
             pdf_collection.create_index('file_hash')
             
+            # Per-page element documents
+            pages_collection = self.get_collection('pdf_pages')
+            pages_collection.create_index([('document_id', 1), ('page_num', 1)], unique=True)
+            
+            # Superseded file versions kept for undo until collected
+            versions_collection = self.get_collection('pdf_versions')
+            versions_collection.create_index([('document_id', 1), ('version', -1)], unique=True)
+            
+            # Journaled text edits not yet written into a PDF version
+            journal_collection = self.get_collection('pdf_edit_journal')
+            journal_collection.create_index([('document_id', 1), ('seq', 1)], unique=True)
+            pdf_collection.create_index('pending_edits', sparse=True)
+            
+            # PDF ingestion jobs collection indexes
+            print("⚙️ Creating PDF jobs collection indexes...")
+            jobs_collection = self.get_collection('pdf_jobs')
+            jobs_collection.create_index('job_id', unique=True)
+            jobs_collection.create_index('document_id')
+            
+            # OCR result cache indexes
+            print("🔤 Creating PDF OCR cache indexes...")
+            ocr_collection = self.get_collection('pdf_ocr_cache')
+            ocr_collection.create_index('key', unique=True)
+            page_ocr_collection = self.get_collection('pdf_page_ocr')
+            page_ocr_collection.create_index(
+                [('document_id', 1), ('settings_key', 1), ('page_num', 1)], unique=True
+            )
+            
             # Resume analyses collection indexes
             print("🔍 Creating resume analyses collection indexes...")
             analyses_collection = self.get_collection('resume_analyses')
@@ -97,6 +97,12 @@ class APIClient {
     return this.request(url);
   }
   
+  getThumbnails() {
+    const documentId = this.getStoredDocumentId();
+    const url = documentId ? `/api/pdf/thumbnails?document_id=${documentId}` : '/api/pdf/thumbnails';
+    return this.request(url);
+  }
+  
   updateText(elementId, newText, fontSize, color) {
     const documentId = this.getStoredDocumentId();
     return this.request('/api/pdf/update-text', {
@@ -112,21 +118,27 @@ class APIClient {
   }
   
   extractImageText() {
-    return this.request('/api/pdf/ocr');
+    const documentId = this.getStoredDocumentId();
+    const url = documentId ? `/api/pdf/ocr?document_id=${documentId}` : '/api/pdf/ocr';
+    return this.request(url);
   }
   
   searchReplace(searchTerm, replaceWith) {
+    const documentId = this.getStoredDocumentId();
     return this.request('/api/pdf/search-replace', {
       method: 'POST',
       body: {
         search_term: searchTerm,
         replace_with: replaceWith,
+        document_id: documentId,
       },
     });
   }
   
   downloadPDF() {
-    return this.request('/api/pdf/save');
+    const documentId = this.getStoredDocumentId();
+    const url = documentId ? `/api/pdf/save?document_id=${documentId}` : '/api/pdf/save';
+    return this.request(url);
   }
   
   // Code execution (placeholder - would need to be implemented in backend)